@@ -5,10 +5,12 @@
 # https://rasa.com/docs/rasa/custom-actions
 
 from typing import Any, Text, Dict, List
+import functools
+import inspect
 import json
 import logging
+import time
 from datetime import date
-import yaml
 
 from rasa_sdk import Action, Tracker, FormValidationAction
 from rasa_sdk.events import AllSlotsReset, SlotSet, BotUttered
@@ -17,12 +19,55 @@ from rasa_sdk.types import DomainDict
 
 import info_api
 import declension
+import metrics
+import motd
+import name_index
+import warmup
 
 # TODO: consider creating object classes e.g. for contacts, so that we don't need to rely on the structure of the
 # TODO: sparql-query results in the actions (like 'r.name' etc.)
 
 logger = logging.getLogger(__name__)
 
+# preload the lookups and report readiness, if enabled via ACTION_SERVER_WARMUP
+warmup.start()
+
+ACTION_DURATION = metrics.histogram('action_duration_seconds', 'Duration of action runs', ['action'])
+ACTION_ERRORS = metrics.counter('action_errors_total', 'Action runs that raised an exception', ['action'])
+
+
+def measured(run):
+    """Decorator for the run() methods of the actions, recording their duration and errors by action name."""
+    def record(action: Action, start: float, failed: bool):
+        if failed:
+            ACTION_ERRORS.inc(action=action.name())
+        ACTION_DURATION.observe(time.perf_counter() - start, action=action.name())
+
+    if inspect.iscoroutinefunction(run):
+        @functools.wraps(run)
+        async def async_wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = await run(self, *args, **kwargs)
+            except Exception:
+                record(self, start, True)
+                raise
+            record(self, start, False)
+            return result
+        return async_wrapper
+
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = run(self, *args, **kwargs)
+        except Exception:
+            record(self, start, True)
+            raise
+        record(self, start, False)
+        return result
+    return wrapper
+
 
 class ActionGetMOTD(Action):
     """Retrieve message-of-the-day greeting from external file.
@@ -31,6 +76,7 @@ class ActionGetMOTD(Action):
     def name(self) -> Text:
         return "action_get_motd"
 
+    @measured
     async def run(
         self,
         dispatcher: "CollectingDispatcher",
@@ -40,27 +86,8 @@ class ActionGetMOTD(Action):
 
         today = date.today()
         language = tracker.get_slot('language')
-        motd_list = []
-        output_dict = {}
-        default_message_list = []
         logger.info(f"{self.name()} retrieving MOTD for date: {today}")
-        with open('data/motd/motd.yml', 'r') as stream:
-            motd_dict = yaml.safe_load(stream)
-        for item in motd_dict['motd']:
-            if 'date_range' in item:
-                if item['date_range']['start'] <= today <= item['date_range']['end']:
-                    for message in item['messages'][language]:
-                        motd_list.append(message)
-            elif 'default' in item:
-                for message in item['messages'][language]:
-                    default_message_list.append(message)
-        # If no messages are found for the current date,
-        # use the default message for the given language.
-        if len(motd_list) != 0:
-            output_dict["motd"] = {"language": language, "motd": motd_list}
-        else:
-            output_dict["motd"] = {"language": language, "motd": default_message_list}
-        return [BotUttered(json.dumps(output_dict, ensure_ascii=False).encode('utf8').decode())]
+        return [BotUttered(motd.get_motd(today, language))]
 
 
 class ActionDefaultAskAffirmation(Action):
@@ -99,6 +126,7 @@ class ActionDefaultAskAffirmation(Action):
 
         return entities
 
+    @measured
     def run(
         self,
         dispatcher: "CollectingDispatcher",
@@ -134,6 +162,7 @@ class ActionDeactivateLoop(Action):
     def name(self) -> Text:
         return "action_deactivate_loop"
 
+    @measured
     def run(
         self,
         dispatcher: "CollectingDispatcher",
@@ -157,9 +186,11 @@ class ActionGetInfoForContact(Action):
     def name(self) -> Text:
         return "action_get_contact_info"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[str, Any]]:
+    @measured
+    @info_api.with_turn_budget
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[str, Any]]:
 
         contact = tracker.get_slot('contact')
         contact_name = contact
@@ -179,12 +210,17 @@ class ActionGetInfoForContact(Action):
         # If we have a pronoun, we have stored the contact from the previous dialogue turn.
         # If not, and we have a contact, either there was no previous 'who-is' turn or the contact
         # has been overridden by the new 'request-contact' intent.
-        if subject:
-            res = info_api.get_contact_from_subject(subject.title())
-            info_object = subject
-        elif contact:
-            res = info_api.get_info_for_contact(contact)
-            info_object = contact
+        try:
+            if subject:
+                res = await info_api.get_contact_from_subject_async(subject.title())
+                info_object = subject
+            elif contact:
+                res = await info_api.get_info_for_contact_async(contact)
+                info_object = contact
+        except info_api.FusekiUnavailable as e:
+            logger.error(f"{self.name()} knowledge base unavailable: {e}")
+            dispatcher.utter_message(response="utter_service_unavailable")
+            return []
 
         # nothing found
         if not res:
@@ -221,9 +257,11 @@ class ActionGetWhoIs(Action):
     def name(self) -> Text:
         return "action_get_whois"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[str, Any]]:
+    @measured
+    @info_api.with_turn_budget
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[str, Any]]:
 
         """Check if we have a title in the tracker, if yes, retrieve information on that title.
         Otherwise, check for name and retrieve the title for a given contact, if found,
@@ -242,19 +280,21 @@ class ActionGetWhoIs(Action):
         logger.info(f"{self.name()} Title: {title}")
         logger.info(f"{self.name()} Subject: {subject}")
 
-        if title:
-            info_object = title
-            res = info_api.get_name_for_title(title)
-        elif subject:
-            info_object = subject
-            res = info_api.get_contact_from_subject(subject.title())
-        elif name:
-            info_object = name
-            nom_names = declension.get_nominative_name(name.title())
-            for nom_name in nom_names:
-                res = info_api.get_info_for_contact(nom_name)
-                if res:
-                    break
+        try:
+            if title:
+                info_object = title
+                res = await info_api.get_name_for_title_async(title)
+            elif subject:
+                info_object = subject
+                res = await info_api.get_contact_from_subject_async(subject.title())
+            elif name:
+                info_object = name
+                nom_names = declension.get_nominative_name(name.title())
+                res = await info_api.resolve_contact_async(nom_names)
+        except info_api.FusekiUnavailable as e:
+            logger.error(f"{self.name()} knowledge base unavailable: {e}")
+            dispatcher.utter_message(response="utter_service_unavailable")
+            return []
 
         # nothing found
         if not res:
@@ -300,14 +340,21 @@ class ActionGetOperator(Action):
     def name(self) -> Text:
         return "action_get_operator"
 
-    def run(
+    @measured
+    @info_api.with_turn_budget
+    async def run(
         self,
         dispatcher: "CollectingDispatcher",
         tracker: Tracker,
         domain: "DomainDict",
     ) -> List[Dict[Text, Any]]:
 
-        res = info_api.get_office_contact_info()
+        # the office contact is served from the cache or the snapshot of the knowledge base, if Fuseki is unavailable
+        try:
+            res = await info_api.get_office_contact_info_async()
+        except info_api.FusekiUnavailable as e:
+            logger.error(f"{self.name()} knowledge base unavailable: {e}")
+            res = []
         if res:
             r = res[0]
             if r.phone and r.email:
@@ -330,6 +377,15 @@ class ValidateRequestContactForm(FormValidationAction):
     def name(self) -> Text:
         return "validate_request_contact_form"
 
+    @measured
+    async def run(
+            self,
+            dispatcher: "CollectingDispatcher",
+            tracker: "Tracker",
+            domain: "DomainDict",
+    ) -> List[Dict[Text, Any]]:
+        return await super().run(dispatcher, tracker, domain)
+
     async def required_slots(
             self,
             domain_slots: List[Text],
@@ -351,16 +407,17 @@ class ValidateRequestContactForm(FormValidationAction):
             return updated_slots
 
     @staticmethod
-    def subject_list() -> List[Text]:
+    async def subject_list() -> List[Text]:
         """List of possible subjects to inquire about."""
-        return info_api.get_valid_subjects()
+        return await info_api.get_valid_subjects_async()
 
     @staticmethod
-    def contact_list() -> List[Text]:
+    async def contact_list() -> List[Text]:
         """List of possible contacts from RDF graph."""
-        return info_api.get_all_names()
+        return await info_api.get_all_names_async()
 
-    def validate_subject(
+    @info_api.with_turn_budget
+    async def validate_subject(
             self, slot_value: Any,
             dispatcher: CollectingDispatcher,
             tracker: Tracker,
@@ -371,7 +428,13 @@ class ValidateRequestContactForm(FormValidationAction):
 
         validation_fails = tracker.get_slot('validation_fails')
         if slot_value:
-            if slot_value.title() in self.subject_list():
+            try:
+                subjects = await self.subject_list()
+            except info_api.FusekiUnavailable as e:
+                logger.error(f"{self.name()} knowledge base unavailable: {e}")
+                dispatcher.utter_message(response="utter_service_unavailable")
+                return {'subject': None}
+            if slot_value.title() in subjects:
                 return {'subject': slot_value}
             else:
                 validation_fails += 1
@@ -381,7 +444,8 @@ class ValidateRequestContactForm(FormValidationAction):
         validation_fails += 1
         return {'contact': None, 'subject': None, 'validation_fails': validation_fails}
 
-    def validate_contact(self,
+    @info_api.with_turn_budget
+    async def validate_contact(self,
         slot_value: Any,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -391,17 +455,29 @@ class ValidateRequestContactForm(FormValidationAction):
         candidates = []
         logger.info(f"{self.name()} validating contact: {slot_value}")
         validation_fails = tracker.get_slot('validation_fails')
+        try:
+            all_contacts = await self.contact_list()
+        except info_api.FusekiUnavailable as e:
+            logger.error(f"{self.name()} knowledge base unavailable: {e}")
+            dispatcher.utter_message(response="utter_service_unavailable")
+            return {'contact': None}
         if tracker.get_slot('contacts_found'):
             contacts = tracker.get_slot('contacts')
         else:
-            contacts = self.contact_list()
-
-        nominative_names = declension.get_nominative_name(slot_value.title())
-        for name in nominative_names:
-            for contact in contacts:
-                for part_name in contact.split():
-                    if name == part_name or name == contact:
-                        candidates.append(contact)
+            contacts = all_contacts
+
+        # Look up the (possibly declined) input in the index of all inflected forms of the contact names first,
+        # only if that fails, retrieve the nominative forms via BÍN and compare them against all contacts.
+        inflection_index = name_index.get_inflection_index(all_contacts)
+        allowed_contacts = set(contacts)
+        for contact in inflection_index.lookup(slot_value):
+            if contact in allowed_contacts:
+                candidates.append(contact)
+
+        if not candidates:
+            nominative_names = declension.get_nominative_name(slot_value.title())
+            token_index = name_index.get_token_index(all_contacts)
+            candidates = token_index.match(nominative_names, restrict_to=contacts)
 
         candidates = [*set(candidates)]
         if len(candidates) == 1:
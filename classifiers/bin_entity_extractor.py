@@ -8,8 +8,12 @@
 #
 # Note: This entity extractor does not rely on any featurizer as it extracts features on its own.
 
-from typing import Dict, Text, Any, List
+from functools import lru_cache
+from typing import Dict, Text, Any, List, Optional, Set, Tuple
+import hashlib
+import json
 import logging
+import os
 import string
 import re
 import yaml
@@ -19,20 +23,82 @@ from rasa.engine.recipes.default_recipe import DefaultV1Recipe
 from rasa.engine.storage.resource import Resource
 from rasa.engine.storage.storage import ModelStorage
 from rasa.shared.nlu.training_data.message import Message
+from rasa.shared.nlu.training_data.training_data import TrainingData
+from rasa.shared.nlu.constants import TEXT, INTENT, ENTITIES, ENTITY_ATTRIBUTE_START, ENTITY_ATTRIBUTE_END
 from rasa.shared.exceptions import InvalidConfigException
 from rasa.nlu.extractors.extractor import EntityExtractorMixin
+from rasa.nlu.constants import TOKENS_NAMES
 from rasa.shared.core.domain import Domain
+import rasa.shared.utils.io
 
 from islenska import Bin
 
+from classifiers.gazetteer import Gazetteer, GAZETTEER_ENTITIES
+
 # see https://bin.arnastofnun.is/gogn/storasnid/ord/
 ALL_BIN_TAGS = ["heö", "alm", "ism", "föð", "móð", "fyr", "bibl", "gæl", "lönd", "gras", "efna", "tölv", "lækn",
                 "örn", "tón", "natt", "göt", "lög", "íþr", "málfr", "tími", "við", "fjár", "bíl", "ffl", "mat",
                 "bygg", "tung", "erl", "hetja", "bær", "þor", "mvirk", "brag", "jard", "stærð", "hug", "erm",
                 "mæl", "titl", "gjald", "stja", "dýr", "hann", "ætt", "ob", "entity", "spurn"]
 
+# Labelled entities in training examples, e.g. '[Ástu Jónu](contact)' or '[email]{"entity": "email_or_phone"}'
+LABEL_REGEX = re.compile(r'\[(.*?)\][\{\(](.*?)[\)\}]')
+# Replacement of labelled entities in the training example templates
+REPLACE_PATTERN = '(.*)'
+# Templates consisting only of match-all regexes, or with adjacent match-all regexes, match everything
+_replace_pattern = re.escape(REPLACE_PATTERN)
+INVALID_TEMPLATE = re.compile(fr'^\s*{_replace_pattern}\s*$|{_replace_pattern}\s+{_replace_pattern}')
+
+# Maximum number of tokens whose BÍN category is cached across messages and requests
+TAG_CACHE_SIZE = 8192
+
+DOMAIN_FILE = "domain.yml"
+
 logger = logging.getLogger(__name__)
 
+# Entities of the domain, keyed by domain_key() of the domain file they were read from
+_domain_entities = {}
+# Hashes of the configurations that passed validate_component_config(), see validation_key()
+_validated_configs = set()
+
+# BÍN handle shared by all extractor instances, created on first use
+_bin = None
+
+
+def get_bin() -> Bin:
+    global _bin
+    if _bin is None:
+        _bin = Bin()
+    return _bin
+
+
+@lru_cache(maxsize=TAG_CACHE_SIZE)
+def bin_category(token: Text) -> Optional[Text]:
+    """BÍN category ('hluti', e.g. 'ism') of the first BÍN entry of the lowercased 'token', None if the token is
+    not in BÍN. Independent of the configuration, so the cache is shared by all extractor instances."""
+    w, attr = get_bin().lookup(token, False, True)
+    return attr[0].hluti if attr else None
+
+
+def domain_key(path: Text = DOMAIN_FILE) -> Tuple[Text, Optional[float]]:
+    """Identifies a version of the domain file: its absolute path and modification time."""
+    return os.path.abspath(path), os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def domain_entities(path: Text = DOMAIN_FILE) -> List:
+    """Entities of the domain. The domain is only parsed on first use and whenever the domain file changes."""
+    key = domain_key(path)
+    if key not in _domain_entities:
+        _domain_entities.clear()
+        _domain_entities[key] = Domain.load(path).as_dict()["entities"]
+    return _domain_entities[key]
+
+
+def validation_key(component_config: Dict[Text, Any]) -> Text:
+    """Hash of a component configuration together with the version of the domain it is validated against."""
+    config = json.dumps(component_config, sort_keys=True, default=str)
+    return hashlib.sha256(f"{config}{domain_key()}".encode()).hexdigest()
+
 
 @DefaultV1Recipe.register(
     [DefaultV1Recipe.ComponentType.ENTITY_EXTRACTOR], is_trainable=False
@@ -42,7 +108,30 @@ class BinEntityExtractor(GraphComponent, EntityExtractorMixin):
     def __init__(self, component_config: Dict[Text, Any]) -> None:
         self.component_config = component_config
         self.validate_component_config(component_config=self.component_config)
-        self.domain = Domain.load("domain.yml")
+        self.stop_words = frozenset(component_config.get("stop_words", []))
+        self.tag_entities = self.reverse_entity_mappings(component_config.get("entity_mappings", {}))
+        # training example templates per intent, compiled once instead of for every message
+        self.templates = {}
+        if component_config.get("match_training_data"):
+            self.templates = self.compile_templates(self.nlu_examples())
+        self.gazetteer = self.create_gazetteer(component_config)
+
+    @staticmethod
+    def create_gazetteer(component_config: Dict[Text, Any]) -> Optional[Gazetteer]:
+        """The gazetteer over the knowledge graph, if 'match_knowledge_graph' is enabled."""
+        if not component_config.get("match_knowledge_graph"):
+            return None
+        return Gazetteer.from_knowledge_graph(component_config["knowledge_graph"], get_bin())
+
+    @staticmethod
+    def reverse_entity_mappings(entity_mappings: Dict[Text, List[Text]]) -> Dict[Text, Text]:
+        """Map each BÍN tag of 'entity_mappings' to its entity. If a tag is listed for more than one entity, the
+        first entity wins."""
+        tag_entities = {}
+        for entity, tags in entity_mappings.items():
+            for tag in tags:
+                tag_entities.setdefault(tag, entity)
+        return tag_entities
 
     @staticmethod
     def nlu_examples() -> Dict:
@@ -50,6 +139,49 @@ class BinEntityExtractor(GraphComponent, EntityExtractorMixin):
             examples = yaml.safe_load(stream)
         return examples['nlu']
 
+    @staticmethod
+    def compile_templates(nlu_examples: List[Dict]) -> Dict[Text, List[re.Pattern]]:
+        """Compile the training examples with labelled entities into regex templates, grouped by intent. Each
+        labelled entity is replaced by a match-all regex, templates that would match everything are left out.
+        See nlu_example_match() for an example."""
+        templates = {}
+        for nlu_entry in nlu_examples:
+            if 'intent' not in nlu_entry:
+                continue
+            intent_templates = templates.setdefault(nlu_entry['intent'], [])
+            for intent_example in nlu_entry['examples'].split('\n'):
+                if not LABEL_REGEX.search(intent_example):
+                    continue
+                # replace the entity label with a matchall regex, so that we can match the entity values
+                # in the user message
+                training_string = LABEL_REGEX.sub(REPLACE_PATTERN, intent_example)
+                # remove leading dash and trailing question mark from training example
+                training_string = training_string.removeprefix('- ').rstrip("?").rstrip()
+
+                # training_string must not only contain match-all regexes, otherwise it will match
+                # everything.
+                # For example, if the training example is:
+                #   "[email]{"entity": "email_or_phone", "value": "email"} [Ástu Jónu](contact)?"
+                # training_string will be "(.*) (.*)", which will match everything.
+                # Therefore, skip occurrences of match-all - only regex in training_string.
+                template = BinEntityExtractor.compile_template(training_string)
+                if template:
+                    intent_templates.append(template)
+        return templates
+
+    @staticmethod
+    def compile_template(training_string: Text) -> Optional[re.Pattern]:
+        """Compile a training example with labelled entities replaced by REPLACE_PATTERN. Returns None for
+        templates matching everything or invalid regexes."""
+        if INVALID_TEMPLATE.match(training_string):
+            return None
+        try:
+            return re.compile(training_string)
+        except re.error:
+            logger.warning(f"BÍN Entity extractor: skipping training example '{training_string}', "
+                           f"it is not a valid template")
+            return None
+
     @classmethod
     def create(
             cls,
@@ -65,6 +197,10 @@ class BinEntityExtractor(GraphComponent, EntityExtractorMixin):
         if "enable" not in component_config or not component_config["enable"]:
             logger.info("BÍN Entity extractor: disabled")
             return
+        # the same configuration is validated only once, e.g. for repeated graph instantiations in 'rasa test'
+        key = validation_key(component_config)
+        if key in _validated_configs:
+            return
 
         if "match_training_data" not in component_config:
             raise InvalidConfigException(
@@ -115,21 +251,38 @@ class BinEntityExtractor(GraphComponent, EntityExtractorMixin):
             )
         logger.info("BÍN Entity extractor: extraction mode: " + str(component_config["extraction_mode"]))
 
+        if component_config.get("match_knowledge_graph", False) not in [True, False]:
+            raise InvalidConfigException(
+                f"the section 'match_knowledge_graph' of your configuration should have a value of true or false. "
+                f"Please specify whether the extractor should match the staff names, titles and roles of the "
+                f"knowledge graph instead of BÍN categories."
+            )
+        if component_config.get("match_knowledge_graph"):
+            if not os.path.isfile(component_config.get("knowledge_graph", "")):
+                raise InvalidConfigException(
+                    f"your configuration should contain the section 'knowledge_graph' with the path of the RDF file "
+                    f"of the knowledge graph, if 'match_knowledge_graph' is set to true."
+                )
+            for entity in GAZETTEER_ENTITIES:
+                if entity not in domain_entities():
+                    raise InvalidConfigException(
+                        f"{entity} is extracted from the knowledge graph but is not a valid entity in your domain."
+                    )
+
         bin_entity_tags = component_config["entity_mappings"]
-        for key in bin_entity_tags.keys():
-            domain = Domain.load("domain.yml")
-            domain_dict = domain.as_dict()
-            if key not in domain_dict["entities"]:
+        for entity in bin_entity_tags.keys():
+            if entity not in domain_entities():
                 raise InvalidConfigException(
-                    f"{key} is listed as a slot mapping in your configuration "
+                    f"{entity} is listed as a slot mapping in your configuration "
                     f"but not as a valid slot in your domain."
                 )
-            for tag in bin_entity_tags[key]:
+            for tag in bin_entity_tags[entity]:
                 if tag not in ALL_BIN_TAGS:
                     raise InvalidConfigException(
                         f"{tag} is listed as a possible tag in your configuration "
                         f"but does not exist in the Bin tagset."
                     )
+        _validated_configs.add(key)
 
     @classmethod
     def find_entity_with_value(cls, dicts: List[Dict[Text, Any]], value: Text):
@@ -143,21 +296,14 @@ class BinEntityExtractor(GraphComponent, EntityExtractorMixin):
         if not is_enabled:
             return messages
 
-        stop_words = self.component_config.get("stop_words", [])
         extraction_mode = self.component_config.get("extraction_mode")
 
-        for message in messages:
-            # logger.info("BÍN Entity extractor: processing message: " + str(message.data))
-            tokens = message.data["text_tokens"]
-            intent = message.get("intent")
-            message_text = message.get("text")
+        if self.gazetteer:
+            message_entities = [self._match_gazetteer(message.data["text_tokens"]) for message in messages]
+        else:
+            message_entities = self._match_bin_entities(messages)
 
-            # Check whether user message matches example in training data exactly,
-            # but with labeled entity replaced with new entity
-            if self.component_config["match_training_data"]:
-                # overwrite tokens with detected tokens from training examples
-                tokens = self.nlu_example_match(tokens, intent, message_text)
-            extracted = self._match_entities(tokens, stop_words)
+        for message, extracted in zip(messages, message_entities):
             if extracted:
                 if extraction_mode == 'append':
                     message.set("entities", message.get("entities", []) + extracted, add_to_output=True)
@@ -175,14 +321,65 @@ class BinEntityExtractor(GraphComponent, EntityExtractorMixin):
                         message.set("entities", message.get("entities", []) + extracted, add_to_output=True)
         return messages
 
-    def _match_entities(self, tokens: List, stop_words: List) -> List:
+    def _match_bin_entities(self, messages: List[Message]) -> List[List]:
+        """Entities of each message according to the BÍN categories of its tokens."""
+        stop_words = self.stop_words
+        message_tokens = []
+        for message in messages:
+            # logger.info("BÍN Entity extractor: processing message: " + str(message.data))
+            tokens = message.data["text_tokens"]
+            intent = message.get("intent")
+            message_text = message.get("text")
+
+            # Check whether user message matches example in training data exactly,
+            # but with labeled entity replaced with new entity
+            if self.component_config["match_training_data"]:
+                # overwrite tokens with detected tokens from training examples
+                tokens = self.nlu_example_match(tokens, intent, message_text)
+            message_tokens.append(tokens)
+
+        # look up each distinct token of the whole batch only once
+        token_tags = self.lookup_tags({token.text for tokens in message_tokens for token in tokens
+                                       if token.text not in stop_words})
+
+        return [self._match_entities(tokens, stop_words, token_tags) for tokens in message_tokens]
+
+    def _match_gazetteer(self, tokens: List) -> List:
+        """Entities of the longest spans of 'tokens' found in the knowledge graph, with their canonical values."""
+        extracted_entities = []
+        for first, last, entity, value in self.gazetteer.match(tokens):
+            extracted_entities.append({
+                "start": tokens[first].start,
+                "end": tokens[last].end,
+                "value": value,
+                "confidence_entity": 1.0,
+                "entity": entity,
+                "extractor": self.name
+            })
+        return extracted_entities
+
+    def lookup_tags(self, token_texts: Set[Text]) -> Dict[Text, Tuple[Any, Any]]:
+        """Entity tags and confidences of the given tokens as returned by bin_lookup_tag(), keyed by the
+        lowercased token."""
+        token_tags = {}
+        for text in token_texts:
+            key = text.lower()
+            if key not in token_tags:
+                token_tags[key] = self.bin_lookup_tag(key)
+        return token_tags
+
+    def _match_entities(self, tokens: List, stop_words: Set[Text],
+                        token_tags: Optional[Dict[Text, Tuple[Any, Any]]] = None) -> List:
         extracted_entities = []
         matched_tag = None
         tag = None
         confidence = 0.0
         for token in tokens:
             if token.text not in stop_words:
-                tag, confidence = self.bin_lookup_tag(token.text)
+                if token_tags is not None:
+                    tag, confidence = token_tags[token.text.lower()]
+                else:
+                    tag, confidence = self.bin_lookup_tag(token.text)
             if tag:
                 # Check whether the last token was also matched as an entity with the same tag,
                 # in that case assume a multi-word token and concatenate.
@@ -224,51 +421,145 @@ class BinEntityExtractor(GraphComponent, EntityExtractorMixin):
     # @return: List of tokens that match entities in the user message according to the training data
     def nlu_example_match(self, tokens: List, intent: Any, message_text: Text) -> List:
         entity_tokens = []
-        LABEL_REGEX = r'\[(.*?)\][\{\(](.*?)[\)\}]'
-        REPLACE_PATTERN = '(.*)'
-        replace_pattern = re.escape(REPLACE_PATTERN)
-        invalid_pattern = re.compile(fr'^\s*{replace_pattern}\s*$|{replace_pattern}\s+{replace_pattern}')
-        for nlu_entry in self.nlu_examples():
-            if 'intent' in nlu_entry and nlu_entry['intent'] == intent['name']:
-                for intent_example in nlu_entry['examples'].split('\n'):
-                    if re.findall(LABEL_REGEX, intent_example):
-                        # replace the entity label with a matchall regex, so that we can match the entity values
-                        # in the user message
-                        training_string = re.sub(LABEL_REGEX, REPLACE_PATTERN, intent_example)
-                        # remove leading dash and trailing question mark from training example
-                        training_string = training_string.removeprefix('- ').rstrip("?").rstrip()
-
-                        # training_string must not only contain match-all regexes, otherwise it will match
-                        # everything.
-                        # For example, if the training example is:
-                        #   "[email]{"entity": "email_or_phone", "value": "email"} [Ástu Jónu](contact)?"
-                        # training_string will be "(.*) (.*)", which will match everything.
-                        # Therefore, skip occurrences of match-all - only regex in training_string.
-                        if invalid_pattern.match(training_string):
-                            continue
-
-                        re_match = re.search(training_string, message_text)
-                        if re_match:
-                            for i, match in enumerate(re_match.groups()):
-                                start = message_text[:re_match.start(i + 1)].count(' ')
-                                end = start + match.count(' ') + 1
-                                matched_tokens = tokens[start:end]
-                                for token in matched_tokens:
-                                    entity_tokens.append(token)
-                            return entity_tokens
+        for template in self.templates.get(intent['name'], []):
+            re_match = template.search(message_text)
+            if re_match:
+                for i, match in enumerate(re_match.groups()):
+                    start = message_text[:re_match.start(i + 1)].count(' ')
+                    end = start + match.count(' ') + 1
+                    matched_tokens = tokens[start:end]
+                    for token in matched_tokens:
+                        entity_tokens.append(token)
+                return entity_tokens
         return entity_tokens
 
     def bin_lookup_tag(self, token: Text) -> Any:
-        b = Bin()
-        attributes = []
-        bin_entity_tags = self.component_config["entity_mappings"]
-        # find all possible BÍN attributes for the token
-        w, attr = b.lookup(token.lower(), False, True)
-        if attr:
-            attributes.append(attr)
-        confidence = 1.0 / len(attributes) if attributes else 1.0
-        for key in bin_entity_tags.keys():
-            for entry in attributes:
-                if entry[0].hluti in bin_entity_tags[key]:
-                    return key, confidence
+        # the entity of the BÍN category of the token
+        entity = self.tag_entities.get(bin_category(token.lower()))
+        if entity:
+            return entity, 1.0
         return None, None
+
+
+@DefaultV1Recipe.register(
+    [DefaultV1Recipe.ComponentType.ENTITY_EXTRACTOR], is_trainable=True
+)
+class TrainableBinEntityExtractor(BinEntityExtractor):
+    """BÍN entity extractor that prepares everything it needs at training time: the templates of the training
+    examples, the BÍN tags of all training data tokens for the configured entity mappings and the stop words are
+    persisted in the model archive. At inference, neither the NLU data nor the domain are read, tokens not seen in
+    the training data are looked up in BÍN as usual.
+
+    Use 'classifiers.bin_entity_extractor.TrainableBinEntityExtractor' instead of 'BinEntityExtractor' in the
+    pipeline config, the configuration is the same."""
+
+    ARTIFACTS_FILE = "bin_entity_extractor.json"
+
+    def __init__(
+            self,
+            component_config: Dict[Text, Any],
+            model_storage: ModelStorage,
+            resource: Resource,
+            templates: Optional[Dict[Text, List[Text]]] = None,
+            token_tags: Optional[Dict[Text, Optional[Text]]] = None,
+            stop_words: Optional[List[Text]] = None,
+    ) -> None:
+        self.component_config = component_config
+        self._model_storage = model_storage
+        self._resource = resource
+        self.template_strings = templates or {}
+        self.templates = {}
+        for intent, training_strings in self.template_strings.items():
+            compiled = [self.compile_template(training_string) for training_string in training_strings]
+            self.templates[intent] = [template for template in compiled if template]
+        # BÍN tag of lowercased tokens, None for tokens without a tag of the entity mappings
+        self.token_tags = token_tags or {}
+        self.stop_words = frozenset(stop_words if stop_words is not None else component_config.get("stop_words", []))
+        self.tag_entities = self.reverse_entity_mappings(component_config.get("entity_mappings", {}))
+        self.gazetteer = self.create_gazetteer(component_config)
+
+    @classmethod
+    def create(
+            cls,
+            config: Dict[Text, Any],
+            model_storage: ModelStorage,
+            resource: Resource,
+            execution_context: ExecutionContext,
+    ) -> GraphComponent:
+        cls.validate_component_config(component_config=config)
+        return cls(config, model_storage, resource)
+
+    @classmethod
+    def load(
+            cls,
+            config: Dict[Text, Any],
+            model_storage: ModelStorage,
+            resource: Resource,
+            execution_context: ExecutionContext,
+            **kwargs: Any,
+    ) -> GraphComponent:
+        try:
+            with model_storage.read_from(resource) as model_dir:
+                artifacts = rasa.shared.utils.io.read_json_file(model_dir / cls.ARTIFACTS_FILE)
+        except (ValueError, FileNotFoundError):
+            logger.warning(f"BÍN Entity extractor: failed to load artifacts of '{resource.name}', "
+                           f"the component was probably not trained")
+            return cls(config, model_storage, resource)
+        return cls(config, model_storage, resource,
+                   templates=artifacts["templates"],
+                   token_tags=artifacts["token_tags"],
+                   stop_words=artifacts["stop_words"])
+
+    @staticmethod
+    def template_from_message(message: Message) -> Optional[Text]:
+        """The template of a training example: its text with the labelled entities replaced by REPLACE_PATTERN,
+        the same template compile_templates() creates from the example in the NLU data."""
+        entities = message.get(ENTITIES) or []
+        if not entities:
+            return None
+        text = message.get(TEXT)
+        training_string = ''
+        end = 0
+        for entity in sorted(entities, key=lambda e: e[ENTITY_ATTRIBUTE_START]):
+            training_string += text[end:entity[ENTITY_ATTRIBUTE_START]] + REPLACE_PATTERN
+            end = entity[ENTITY_ATTRIBUTE_END]
+        training_string += text[end:]
+        return training_string.rstrip("?").rstrip()
+
+    def train(self, training_data: TrainingData) -> Resource:
+        templates = {}
+        token_tags = {}
+        for message in training_data.intent_examples:
+            training_string = self.template_from_message(message)
+            if training_string and self.compile_template(training_string):
+                intent_templates = templates.setdefault(message.get(INTENT), [])
+                if training_string not in intent_templates:
+                    intent_templates.append(training_string)
+        for message in training_data.training_examples:
+            for token in message.get(TOKENS_NAMES[TEXT], []):
+                key = token.text.lower()
+                if key not in token_tags:
+                    token_tags[key], _ = super().bin_lookup_tag(key)
+
+        self.template_strings = templates
+        self.templates = {intent: [re.compile(t) for t in strings] for intent, strings in templates.items()}
+        self.token_tags = token_tags
+        self.stop_words = frozenset(self.component_config.get("stop_words", []))
+        self.persist()
+        return self._resource
+
+    def persist(self) -> None:
+        artifacts = {
+            "templates": self.template_strings,
+            "token_tags": self.token_tags,
+            "stop_words": sorted(self.stop_words),
+        }
+        with self._model_storage.write_to(self._resource) as model_dir:
+            rasa.shared.utils.io.dump_obj_as_json_to_file(model_dir / self.ARTIFACTS_FILE, artifacts)
+
+    def bin_lookup_tag(self, token: Text) -> Any:
+        key = token.lower()
+        if key in self.token_tags:
+            tag = self.token_tags[key]
+            return (tag, 1.0) if tag else (None, None)
+        return super().bin_lookup_tag(token)
@@ -0,0 +1,169 @@
+# Knowledge-graph gazetteer for the BÍN entity extractor. The staff names, titles and roles of the municipality RDF
+# knowledge graph are inflected via BÍN and stored in a token trie. A message is then matched in one left-to-right
+# pass, always taking the longest span that is found in the trie, and each span is labelled with the canonical
+# value from the knowledge graph, e.g. 'Birni Jónssyni' -> contact 'Björn Jónsson'.
+
+from typing import Dict, Iterable, List, Optional, Text, Tuple
+import itertools
+import logging
+import string
+
+from islenska import Bin
+import rdflib
+from rdflib.namespace import FOAF
+
+logger = logging.getLogger(__name__)
+
+# Entities emitted by the gazetteer, they have to be defined in the domain
+CONTACT = "contact"
+TITLE = "title"
+SUBJECT = "subject"
+GAZETTEER_ENTITIES = [CONTACT, TITLE, SUBJECT]
+
+# org:role, the org prefix of the knowledge graph has no trailing separator
+ORG_ROLE = rdflib.URIRef("https://www.w3.org/TR/vocab-orgrole")
+
+CASES = ["NF", "ÞF", "ÞGF", "EF"]
+# BÍN categories of person names: given names, patronyms, matronyms and family names
+NAME_CATEGORIES = ["ism", "föð", "móð", "ætt"]
+
+# Key of the value stored at the trie node where an entry ends
+_END = None
+
+
+def normalize_token(token: Text) -> Text:
+    """Lowercase 'token' and strip surrounding punctuation, e.g. 'umhverfissviðs?' -> 'umhverfissviðs'."""
+    return token.strip(string.punctuation).lower()
+
+
+def load_knowledge_graph(rdf_file: Text) -> Dict[Text, List[Text]]:
+    """Read the staff names, titles and roles of the knowledge graph. Returns a dict mapping each of
+    GAZETTEER_ENTITIES to the sorted list of its canonical values."""
+    graph = rdflib.Graph()
+    graph.parse(rdf_file)
+    values = {CONTACT: set(), TITLE: set(), SUBJECT: set()}
+    for person in graph.subjects(rdflib.RDF.type, FOAF.Person):
+        for name in graph.objects(person, FOAF.name):
+            values[CONTACT].add(str(name))
+        for title in graph.objects(person, FOAF.title):
+            values[TITLE].add(str(title))
+        for role in graph.objects(person, ORG_ROLE):
+            values[SUBJECT].add(str(role))
+    return {entity: sorted(v) for entity, v in values.items()}
+
+
+class Gazetteer:
+    """Token trie over all inflected forms of the knowledge-graph values."""
+
+    def __init__(self, bin_db: Optional[Bin] = None):
+        self._bin = bin_db or Bin()
+        self._trie = {}
+        self.size = 0
+
+    @classmethod
+    def from_knowledge_graph(cls, rdf_file: Text, bin_db: Optional[Bin] = None) -> "Gazetteer":
+        gazetteer = cls(bin_db)
+        values = load_knowledge_graph(rdf_file)
+        # full names first: if an inflected form is ambiguous, the entry added first wins
+        for name in values[CONTACT]:
+            gazetteer.add_name(name)
+        for title in values[TITLE]:
+            gazetteer.add_phrase(TITLE, title)
+        for role in values[SUBJECT]:
+            gazetteer.add_phrase(SUBJECT, role)
+        for name in values[CONTACT]:
+            for part in name.split():
+                gazetteer.add_name_part(part)
+        logger.info(f"BÍN Entity extractor: gazetteer with {gazetteer.size} entries from {rdf_file}")
+        return gazetteer
+
+    def name_forms(self, name: Text) -> Dict[Text, List[Text]]:
+        """Singular forms of one name part per case. Patro-/matronyms not in BÍN are inflected according to
+        'son'/'dóttir', other unknown names are used unchanged."""
+        forms = {case: [] for case in CASES}
+        for case in CASES:
+            for entry in self._bin.lookup_variants(name, "no", (case, "ET")):
+                if entry.hluti in NAME_CATEGORIES and entry.bmynd not in forms[case]:
+                    forms[case].append(entry.bmynd)
+        if any(forms.values()):
+            for case in CASES:
+                if not forms[case]:
+                    forms[case].append(name)
+            return forms
+        if name.endswith("dóttir"):
+            stem = name[:-len("dóttir")]
+            return {"NF": [name], "ÞF": [stem + "dóttur"], "ÞGF": [stem + "dóttur"], "EF": [stem + "dóttur"]}
+        if name.endswith("son"):
+            stem = name[:-len("son")]
+            return {"NF": [name], "ÞF": [name], "ÞGF": [stem + "syni"], "EF": [stem + "sonar"]}
+        return {case: [name] for case in CASES}
+
+    def word_forms(self, word: Text) -> List[Text]:
+        """All forms of a noun in any case or number, or only 'word' itself if it is not found in BÍN."""
+        forms = [word]
+        for case in CASES:
+            for entry in self._bin.lookup_variants(word, "no", case):
+                if entry.bmynd not in forms:
+                    forms.append(entry.bmynd)
+        return forms
+
+    def add_name(self, name: Text):
+        """Add a full name in each case, with all name parts in the same case. If the name has more than two parts,
+        the first and the last name part are also added, e.g. 'Önnu Árnadóttur' for 'Anna Jóna Árnadóttir'."""
+        parts = name.split()
+        part_forms = [self.name_forms(part) for part in parts]
+        variants = [part_forms]
+        if len(parts) > 2:
+            variants.append([part_forms[0], part_forms[-1]])
+        for variant in variants:
+            sequences = []
+            for case in CASES:
+                sequences.extend(itertools.product(*[forms[case] for forms in variant]))
+            self.add_forms(CONTACT, name, sequences)
+
+    def add_name_part(self, part: Text):
+        """Add a single name part in each case, e.g. 'Birni' for 'Björn'. Its canonical value is the name part in
+        nominative, as it might refer to more than one contact."""
+        self.add_forms(CONTACT, part, [[form] for forms in self.name_forms(part).values() for form in forms])
+
+    def add_phrase(self, entity: Text, phrase: Text):
+        """Add a title or role: its first word in all forms, followed by the rest of the phrase unchanged, e.g.
+        'sviðsstjóra skóla- og frístundasviðs' for 'sviðsstjóri skóla- og frístundasviðs'."""
+        words = phrase.split()
+        self.add_forms(entity, phrase, [[form] + words[1:] for form in self.word_forms(words[0])])
+
+    def add_forms(self, entity: Text, value: Text, sequences: Iterable[Iterable[Text]]):
+        """Add each token sequence of 'sequences' as a surface form of 'value'."""
+        for sequence in sequences:
+            keys = [key for key in (normalize_token(token) for token in sequence) if key]
+            if not keys:
+                continue
+            node = self._trie
+            for key in keys:
+                node = node.setdefault(key, {})
+            if _END not in node:
+                node[_END] = (entity, value)
+                self.size += 1
+
+    def match(self, tokens: List) -> List[Tuple[int, int, Text, Text]]:
+        """Longest-match pass over 'tokens' (objects with a 'text' attribute). Returns a list of tuples
+        (first token index, last token index, entity, canonical value) of the matched spans."""
+        keys = [normalize_token(token.text) for token in tokens]
+        spans = []
+        i = 0
+        while i < len(keys):
+            node = self._trie
+            longest = None
+            j = i
+            while j < len(keys) and keys[j] in node:
+                node = node[keys[j]]
+                if _END in node:
+                    longest = (j, node[_END])
+                j += 1
+            if longest:
+                j, (entity, value) = longest
+                spans.append((i, j, entity, value))
+                i = j + 1
+            else:
+                i += 1
+        return spans
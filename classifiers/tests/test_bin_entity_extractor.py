@@ -2,11 +2,16 @@
 
 import pytest
 
+from rasa.shared.core.domain import Domain
 from rasa.shared.exceptions import InvalidConfigException
+from rasa.engine.storage.local_model_storage import LocalModelStorage
+from rasa.engine.storage.resource import Resource
 from rasa.shared.nlu.training_data.message import Message
+from rasa.shared.nlu.training_data.training_data import TrainingData
 from rasa.nlu.tokenizers.tokenizer import Token
 
-from classifiers.bin_entity_extractor import BinEntityExtractor
+from classifiers import bin_entity_extractor
+from classifiers.bin_entity_extractor import BinEntityExtractor, TrainableBinEntityExtractor
 
 config = {
     "enable": True,
@@ -100,6 +105,19 @@ def test_validate_component_config():
         BinEntityExtractor.validate_component_config(invalid_config)
 
 
+def test_domain_loaded_once(monkeypatch):
+    calls = []
+    load = Domain.load
+    monkeypatch.setattr(Domain, "load", lambda path: calls.append(path) or load(path))
+    monkeypatch.setattr(bin_entity_extractor, "_domain_entities", {})
+    monkeypatch.setattr(bin_entity_extractor, "_validated_configs", set())
+
+    BinEntityExtractor(config)
+    BinEntityExtractor(config)
+    BinEntityExtractor.validate_component_config(dict(config, extraction_mode='skip'))
+    assert calls == ["domain.yml"]
+
+
 def test_match_entities():
     extractor = BinEntityExtractor(config)
     message = messages[0]
@@ -110,6 +128,12 @@ def test_match_entities():
     assert actual_result == expected_result, "The _match_entities function did not return the expected result."
 
 
+def test_lookup_tags():
+    extractor = BinEntityExtractor(config)
+    actual_result = extractor.lookup_tags({'Steinari', 'steinari', 'hjá'})
+    assert actual_result == {'steinari': ('contact', 1.0), 'hjá': (None, None)}
+
+
 def test_nlu_example_match():
     extractor = BinEntityExtractor(config)
     message = messages[0]
@@ -137,3 +161,40 @@ def test_process():
     actual_result = processed_messages[0].get('entities')
     expected_result = processing_result[0].get('entities')
     assert actual_result == expected_result, "The process function did not return the expected result."
+
+
+def test_train_and_load(tmp_path):
+    model_storage = LocalModelStorage.create(tmp_path)
+    resource = Resource("bin_entity_extractor")
+    training_example = Message(data={
+        'text': 'netfang hjá Ástu Jónu?',
+        'text_tokens': [Token('netfang', 0, 7), Token('hjá', 8, 11), Token('Ástu', 12, 16), Token('Jónu', 17, 21)],
+        'intent': 'request_contact',
+        'entities': [
+            {'entity': 'email_or_phone', 'start': 0, 'end': 7, 'value': 'email'},
+            {'entity': 'contact', 'start': 12, 'end': 21, 'value': 'Ástu Jónu'}
+        ]
+    })
+    extractor = TrainableBinEntityExtractor.create(
+        config=config,
+        model_storage=model_storage,
+        resource=resource,
+        execution_context=None
+    )
+    extractor.train(TrainingData([training_example]))
+
+    loaded = TrainableBinEntityExtractor.load(
+        config=config,
+        model_storage=model_storage,
+        resource=resource,
+        execution_context=None
+    )
+    assert [t.pattern for t in loaded.templates['request_contact']] == ['(.*) hjá (.*)']
+    assert loaded.token_tags['ástu'] == 'contact'
+    assert loaded.token_tags['hjá'] is None
+    assert loaded.stop_words == set(config['stop_words'])
+
+    message = messages[0]
+    tokens = message.get("text_tokens")
+    actual_result = loaded.nlu_example_match(tokens, message.get("intent"), message.get("text"))
+    assert actual_result == nlu_example_match_result[0]
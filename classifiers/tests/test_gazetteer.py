@@ -0,0 +1,39 @@
+"""Unit tests for the knowledge-graph gazetteer """
+
+import pytest
+
+from classifiers.gazetteer import Gazetteer, CONTACT, TITLE, SUBJECT
+
+
+class Token:
+    def __init__(self, text):
+        self.text = text
+
+
+def tokenize(text):
+    return [Token(t) for t in text.split()]
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return Gazetteer.from_knowledge_graph("src/municipal_info_api/offices_staff.rdf")
+
+
+def test_declined_full_name(gazetteer):
+    assert gazetteer.match(tokenize("netfang Önnu Jónu Árnadóttur")) == [(1, 3, CONTACT, 'Anna Jóna Árnadóttir')]
+    assert gazetteer.match(tokenize("netfang önnu árnadóttur")) == [(1, 2, CONTACT, 'Anna Jóna Árnadóttir')]
+
+
+def test_name_part(gazetteer):
+    assert gazetteer.match(tokenize("ég vil tala við Ingibjörgu")) == [(4, 4, CONTACT, 'Ingibjörg')]
+
+
+def test_title_and_role(gazetteer):
+    assert gazetteer.match(tokenize("hver er bæjarstjórinn?")) == [(2, 2, TITLE, 'bæjarstjóri')]
+    assert gazetteer.match(tokenize("sviðsstjóra skóla- og frístundasviðs")) == \
+        [(0, 3, TITLE, 'sviðsstjóri Skóla- og frístundasviðs')]
+    assert gazetteer.match(tokenize("hver sér um skólamál")) == [(3, 3, SUBJECT, 'Skólamál')]
+
+
+def test_no_match(gazetteer):
+    assert gazetteer.match(tokenize("hvernig er veðrið í dag")) == []
@@ -10,4 +10,10 @@ if [ -z "$RDF_FILE" ]; then
 fi
 
 mkdir -p databases/DB2
-tdb2.tdbloader --loc databases/DB2 "$RDF_FILE"
\ No newline at end of file
+tdb2.tdbloader --loc databases/DB2 "$RDF_FILE"
+# materialize the lookup keys of the contacts and titles and the contact cards, see lookup_keys.ru and
+# contact_cards.ru in src/municipal_info_api. Both can be re-run, e.g. after info_api.update_db() has replaced the data.
+tdb2.tdbupdate --loc databases/DB2 --update "$(dirname "$0")/lookup_keys.ru" --update "$(dirname "$0")/contact_cards.ru"
+# (re)build the full-text index of the titles, roles and names, see configuration/config.ttl
+rm -rf databases/DB2/text
+"$JAVA_HOME/bin/java" -cp "$JENA_HOME/$FUSEKI_JAR" jena.textindexer --desc=configuration/config.ttl
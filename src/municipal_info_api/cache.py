@@ -0,0 +1,87 @@
+"""
+Caches for results of knowledge base lookups, shared across the requests of the action server.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+# Returned by TTLCache.get() for keys without a valid entry, as None or empty lists are valid cached values
+MISSING = object()
+
+
+class TTLCache:
+    """Size bounded LRU cache where each entry expires 'ttl' seconds after it has been stored.
+    The cache is versioned: invalidate() bumps the version, which discards all entries at once. A value loaded
+    while the cache is invalidated, e.g. from a dataset that has just been replaced, is not stored, because it was
+    requested for an older version. Expired entries are kept until they are evicted, so that get_stale() can still
+    return them, e.g. if the knowledge base is unavailable."""
+
+    def __init__(self, maxsize: int = 128, ttl: float = 300, timer: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expiry time, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value for 'key' or MISSING."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > self.timer():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+            self.misses += 1
+            return MISSING
+
+    def get_stale(self, key: Hashable) -> Any:
+        """Return the value for 'key' even if it has expired, or MISSING. Entries of the current version only."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float = None, version: int = None):
+        """Store 'value' for 'key'. If 'version' is given and the cache has been invalidated since, the value
+        is outdated and will not be stored."""
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._entries[key] = (self.timer() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], negative_ttl: float = None) -> Any:
+        """Return the cached value for 'key', or call 'loader' to get the value and cache it. If 'negative_ttl'
+        is given, empty values, e.g. lookups without results, expire after 'negative_ttl' seconds instead."""
+        value = self.get(key)
+        if value is MISSING:
+            version = self.version
+            value = loader()
+            ttl = negative_ttl if negative_ttl is not None and not value else None
+            self.set(key, value, ttl=ttl, version=version)
+        return value
+
+    def invalidate(self, match: Callable[[Hashable, Any], bool] = None):
+        """Discard all entries, or only those for which 'match(key, value)' is true, and bump the version of the
+        cache. Values being loaded meanwhile are not stored, as they might be outdated, too."""
+        with self._lock:
+            if match is None:
+                self._entries.clear()
+            else:
+                for key in [key for key, (_, value) in self._entries.items() if match(key, value)]:
+                    del self._entries[key]
+            self.version += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {'size': len(self._entries), 'version': self.version, 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / total if total else 0.0}
@@ -0,0 +1,91 @@
+from cache import TTLCache, MISSING
+import unittest
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = TTLCache(maxsize=2, ttl=10, timer=self.timer)
+
+    def test_expiry(self):
+        self.cache.set('names', ['Jón Sigurðsson'])
+        self.timer.now = 9
+        self.assertEqual(['Jón Sigurðsson'], self.cache.get('names'))
+        self.timer.now = 10
+        self.assertIs(MISSING, self.cache.get('names'))
+        self.assertEqual(1, self.cache.stats()['hits'])
+        self.assertEqual(1, self.cache.stats()['misses'])
+
+    def test_get_stale(self):
+        self.cache.set('office', ['499 1000'])
+        self.timer.now = 20
+        self.assertIs(MISSING, self.cache.get('office'))
+        self.assertEqual(['499 1000'], self.cache.get_stale('office'))
+        self.cache.invalidate()
+        self.assertIs(MISSING, self.cache.get_stale('office'))
+
+    def test_empty_results_are_cached(self):
+        self.cache.set('subjects', [])
+        self.assertEqual([], self.cache.get('subjects'))
+
+    def test_maxsize(self):
+        """The least recently used entry is discarded first."""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIs(MISSING, self.cache.get('b'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_get_or_load(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return ['Skólamál']
+
+        self.assertEqual(['Skólamál'], self.cache.get_or_load('subjects', loader))
+        self.assertEqual(['Skólamál'], self.cache.get_or_load('subjects', loader))
+        self.assertEqual(1, len(calls))
+
+    def test_negative_ttl(self):
+        self.cache.get_or_load('Guðm', lambda: [], negative_ttl=2)
+        self.cache.get_or_load('Hildur', lambda: ['hildur@andabaer.is'], negative_ttl=2)
+        self.timer.now = 2
+        self.assertIs(MISSING, self.cache.get('Guðm'))
+        self.assertEqual(['hildur@andabaer.is'], self.cache.get('Hildur'))
+
+    def test_invalidate(self):
+        self.cache.set('names', ['Jón Sigurðsson'])
+        self.cache.invalidate()
+        self.assertIs(MISSING, self.cache.get('names'))
+        self.assertEqual(1, self.cache.version)
+
+    def test_invalidate_matching(self):
+        self.cache.set('Hildur', ['hildur@andabaer.is'])
+        self.cache.set('Anna', ['anna.jona@andabaer.is'])
+        self.cache.invalidate(lambda key, value: 'hildur@andabaer.is' in value)
+        self.assertIs(MISSING, self.cache.get('Hildur'))
+        self.assertEqual(['anna.jona@andabaer.is'], self.cache.get('Anna'))
+        self.assertEqual(1, self.cache.version)
+
+    def test_outdated_value_is_not_stored(self):
+        """A value loaded before the cache was invalidated must not be stored afterwards."""
+        version = self.cache.version
+        self.cache.invalidate()
+        self.cache.set('names', ['Jón Sigurðsson'], version=version)
+        self.assertIs(MISSING, self.cache.get('names'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,12 @@
-from islenska import Bin
+from functools import lru_cache
 import itertools
+import os
+import threading
+import unicodedata
+
+from islenska import Bin
+
+import metrics
 
 NOMINATIVE_SG = 'NFET'
 ACCUSATIVE_SG = 'ÞFET'
@@ -15,8 +22,74 @@ MALE = 'kk'
 UNKNOWN = 'unknown'
 GENDERS = [FEM, MALE]
 
-# TODO: should we create a class where the Bin() object can live? As for now a new Bin() is created each time
-# TODO: a public method in this script is called.
+CASES_SG = [NOMINATIVE_SG, ACCUSATIVE_SG, DATIVE_SG, GENITIVE_SG]
+# BÍN categories of person names: given names, patronyms, matronyms and family names
+NAME_CATEGORIES = ['ism', 'föð', 'móð', 'ætt']
+
+# Maximum number of cached results for each of the BÍN lookup functions below
+BIN_CACHE_SIZE = int(os.environ.get('BIN_CACHE_SIZE', '4096'))
+
+BIN_DURATION = metrics.histogram('bin_lookup_duration_seconds', 'Duration of name declensions with BÍN',
+                                 ['function'])
+
+_bin = None
+_bin_lock = threading.Lock()
+
+
+def get_bin() -> Bin:
+    """The BÍN handle shared by all functions of this module, created on first use."""
+    global _bin
+    if _bin is None:
+        with _bin_lock:
+            if _bin is None:
+                _bin = Bin()
+    return _bin
+
+
+def normalize(word: str) -> str:
+    """Normalize a word form for BÍN lookups and as a cache key: NFC and without surrounding whitespace."""
+    return unicodedata.normalize('NFC', word).strip()
+
+
+# Cached BÍN lookups. Staff names repeat constantly across conversations, so the results are memoized on the
+# normalized word form. Results are returned as tuples, so that callers can't modify the cached values.
+
+def lookup_lemmas_and_cats(word: str) -> tuple:
+    return _lookup_lemmas_and_cats(normalize(word))
+
+
+@lru_cache(maxsize=BIN_CACHE_SIZE)
+def _lookup_lemmas_and_cats(word: str) -> tuple:
+    return tuple(get_bin().lookup_lemmas_and_cats(word))
+
+
+def lookup(word: str, at_sentence_start: bool = False, auto_uppercase: bool = False) -> tuple:
+    """Returns a tuple (search_word, entries) like Bin.lookup()"""
+    return _lookup(normalize(word), at_sentence_start, auto_uppercase)
+
+
+@lru_cache(maxsize=BIN_CACHE_SIZE)
+def _lookup(word: str, at_sentence_start: bool, auto_uppercase: bool) -> tuple:
+    w, entries = get_bin().lookup(word, at_sentence_start, auto_uppercase)
+    return w, tuple(entries)
+
+
+@lru_cache(maxsize=BIN_CACHE_SIZE)
+def lookup_id(bin_id: int) -> tuple:
+    return tuple(get_bin().lookup_id(bin_id))
+
+
+def cache_info() -> dict:
+    """Hits, misses and sizes of the BÍN lookup caches."""
+    return {'lookup_lemmas_and_cats': _lookup_lemmas_and_cats.cache_info()._asdict(),
+            'lookup': _lookup.cache_info()._asdict(),
+            'lookup_id': lookup_id.cache_info()._asdict()}
+
+
+def clear_caches():
+    _lookup_lemmas_and_cats.cache_clear()
+    _lookup.cache_clear()
+    lookup_id.cache_clear()
 
 
 def get_nominative_and_gender(name: str) -> list:
@@ -40,19 +113,19 @@ def get_nominative_and_gender(name: str) -> list:
     return return_list
 
 
+@BIN_DURATION.time(function='nominative_name')
 def get_nominative_name(name: str) -> list:
     """Retrieves nominative forms of Icelandic names. Returns word forms unchanged where neither a BÍN-lookup exists
     nor a generated nominative based on the ending (e.g. 'dóttur', 'syni').
     Returns multiple possible names where more than one nominative form exists, e.g.
     'Birni Jónssyni' could mean 'Björn Jónsson' or 'Birnir Jónsson.' """
 
-    b = Bin()
     first_name_candidates = []
     latter_name_candidates = []
     candidates = []
     name_arr = name.split()
 
-    bin_candidates = b.lookup_lemmas_and_cats(name_arr[0].title())
+    bin_candidates = lookup_lemmas_and_cats(name_arr[0].title())
     if len(bin_candidates) == 0:
         first_name, g = extract_nominative_unknown_candidate(name_arr[0])
         first_name_candidates.append(first_name)
@@ -62,7 +135,7 @@ def get_nominative_name(name: str) -> list:
 
     if len(name_arr) > 1:
         for latter_name in name_arr[1:]:
-            bin_candidates = b.lookup_lemmas_and_cats(latter_name)
+            bin_candidates = lookup_lemmas_and_cats(latter_name)
             if len(bin_candidates) == 0:
                 latter_name, g = extract_nominative_unknown_candidate(latter_name)
                 latter_name_candidates.append(latter_name)
@@ -99,6 +172,45 @@ def extract_nominative_unknown_candidate(name: str) -> tuple:
     return nominative, gender
 
 
+def generate_unknown_forms(name: str) -> dict:
+    """Generate the singular case forms of a name in nominative that is not in BÍN, the inverse of
+    extract_nominative_unknown_candidate(). Patro-/matronyms are inflected according to 'son'/'dóttir', all other
+    names are returned unchanged for each case. Return a dict mapping each case of CASES_SG to a list of forms."""
+
+    if name.endswith('dóttir'):
+        stem = name[:-len('dóttir')]
+        return {NOMINATIVE_SG: [name], ACCUSATIVE_SG: [stem + 'dóttur'],
+                DATIVE_SG: [stem + 'dóttur'], GENITIVE_SG: [stem + 'dóttur']}
+    if name.endswith('son'):
+        stem = name[:-len('son')]
+        return {NOMINATIVE_SG: [name], ACCUSATIVE_SG: [name],
+                DATIVE_SG: [stem + 'syni'], GENITIVE_SG: [stem + 'sonar']}
+    return {case: [name] for case in CASES_SG}
+
+
+def get_name_forms(name: str) -> dict:
+    """Generate the singular case forms of a name (one name part, e.g. 'Björn' or 'Jónsson') in nominative.
+    Return a dict mapping each case of CASES_SG to a list of forms, e.g. for 'Björn':
+        {'NFET': ['Björn'], 'ÞFET': ['Björn'], 'ÞGFET': ['Birni'], 'EFET': ['Bjarnar', 'Björns']}
+    Only BÍN entries for names with 'name' as lemma are used, names not in BÍN are handled by
+    generate_unknown_forms()."""
+
+    w, entries = lookup(name)
+    lemma_ids = sorted({e.bin_id for e in entries if e.ord == name and e.hluti in NAME_CATEGORIES})
+    if not lemma_ids:
+        return generate_unknown_forms(name)
+
+    forms = {case: [] for case in CASES_SG}
+    forms[NOMINATIVE_SG].append(name)
+    for lemma_id in lemma_ids:
+        for entry in lookup_id(lemma_id):
+            # variants are marked with a trailing number, e.g. 'EFET2'
+            case = entry.mark.rstrip('0123456789')
+            if case in forms and entry.bmynd not in forms[case]:
+                forms[case].append(entry.bmynd)
+    return forms
+
+
 def create_name_gender_tuples(gender_dict: {}, name_candidates: list) -> list:
     """name_candidates is a list of tuples of the form [(first_name1, family_name), (first_name2, family_name)] where
     e.g. we can have different first names as a result of a BÍN-lookup, each combined with the family name (of which
@@ -141,11 +253,10 @@ def generate_candidates(gender_dict: dict, name: str) -> list:
     'name' might be a full name, in which case we iterate through each element of the name (first name(s),
     family name)"""
 
-    b = Bin()
     name_candidates = []
     for name_part in name.split(' '):
         name_part_candidates = []
-        bin_candidates = b.lookup_lemmas_and_cats(name_part.title())
+        bin_candidates = lookup_lemmas_and_cats(name_part.title())
         if not bin_candidates:
             candidate_tuple = extract_nominative_unknown_candidate(name_part.title())
             name_part_candidates.append(candidate_tuple[0])
@@ -159,6 +270,7 @@ def generate_candidates(gender_dict: dict, name: str) -> list:
     return name_candidates
 
 
+@BIN_DURATION.time(function='declined_form')
 def get_declined_form(name: str, form: str) -> str:
     """Retrieves the form 'form' for 'name'. The parameter might consist of given name(s) and surname or only
      one name. Return a string with the name in the given form, or, if not found, the original name. """
@@ -177,10 +289,9 @@ def get_declined_form(name: str, form: str) -> str:
 def get_form(token: str, form: str) -> str:
     """Return the correct word form of 'token' according to 'form'.
     TODO: is this sufficient or are we likely to get multiple results here? """
-    b = Bin()
-    w, attr = b.lookup(token.title())
+    w, attr = lookup(token.title())
     lemma_id = attr[0].bin_id
-    bin_entry = b.lookup_id(lemma_id)
+    bin_entry = lookup_id(lemma_id)
     for entry in bin_entry:
         if entry.mark == form:
             return entry.bmynd
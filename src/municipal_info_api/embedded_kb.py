@@ -0,0 +1,148 @@
+"""
+In-process backend for the municipality RDF-knowledge base. The graph is loaded into an rdflib Graph inside the
+action server and the SPARQL queries of 'sparql_queries' are answered locally, without a round-trip to Fuseki.
+Results are returned in the same form as the JSON results of Fuseki, so 'info_api' can process them identically.
+The graph is reloaded as soon as one of its source files changes, e.g. when a new Fuseki dump is written, which may
+be gzip-compressed (see 'rdf_stream'). Like in Fuseki, the lookup keys of 'lookup_keys.ru' and the contact cards of
+'contact_cards.ru' are materialized into the graph when it is loaded, and the full-text search text:query is
+evaluated by 'text_index' instead of a Lucene index.
+"""
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+
+from rdflib import Graph, BNode, Literal
+from rdflib.plugins.sparql import prepareQuery, prepareUpdate
+
+import rdf_stream
+import sparql_queries
+import text_index
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for changed source files
+RELOAD_CHECK_INTERVAL = float(os.environ.get('KB_RELOAD_CHECK_INTERVAL', '1'))
+
+# The SPARQL parser of rdflib is not thread-safe, queries are parsed one at a time
+_parse_lock = threading.Lock()
+
+text_index.register()
+
+
+@lru_cache(maxsize=256)
+def _prepare(query: str):
+    """Parsing a SPARQL query is more costly than evaluating it against our small graph, so prepared queries
+    are kept around."""
+    with _parse_lock:
+        return prepareQuery(text_index.rdflib_query(query))
+
+
+@lru_cache(maxsize=16)
+def _prepare_update(update: str):
+    with _parse_lock:
+        return prepareUpdate(update)
+
+
+def materialize(graph: Graph):
+    """Materialize the lookup keys and contact cards of 'sparql_queries' in 'graph', see 'lookup_keys.ru' and
+    'contact_cards.ru'."""
+    graph.update(_prepare_update(sparql_queries.get_materialization_update()))
+
+
+def _to_binding(term) -> dict:
+    """Convert an rdflib term into the SPARQL JSON results format used by Fuseki."""
+    if isinstance(term, Literal):
+        binding = {'type': 'literal', 'value': str(term)}
+        if term.language:
+            binding['xml:lang'] = term.language
+        elif term.datatype:
+            binding['datatype'] = str(term.datatype)
+        return binding
+    if isinstance(term, BNode):
+        return {'type': 'bnode', 'value': str(term)}
+    return {'type': 'uri', 'value': str(term)}
+
+
+class EmbeddedKnowledgeBase:
+    """The knowledge graph loaded from the most recently modified of 'source_files'. Files that don't exist
+    are ignored, until they are created. 'on_reload' is called after the graph has been replaced by a new version."""
+
+    def __init__(self, source_files: list, check_interval: float = RELOAD_CHECK_INTERVAL, on_reload=None):
+        self.source_files = [f for f in source_files if f]
+        self.check_interval = check_interval
+        self.on_reload = on_reload
+        self.graph = Graph()
+        self.loaded_file = None
+        self._loaded_mtime = None
+        # mtime of the files that failed to load, by path
+        self._failed = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reload_if_changed(force=True)
+
+    def _sources(self) -> list:
+        """(path, mtime) of the existing source files, the most recently modified first."""
+        sources = []
+        for path in self.source_files:
+            try:
+                sources.append((path, os.stat(path).st_mtime))
+            except OSError:
+                continue
+        return sorted(sources, key=lambda source: -source[1])
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Reload the graph if a source file has changed since it was loaded. Returns True if it was reloaded.
+        A file that can't be loaded, e.g. a partially written dump, is skipped until it is modified again: the current
+        graph is kept, or initially, the graph is loaded from the next most recently modified file."""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+        with self._lock:
+            self._last_check = now
+            sources = self._sources()
+            if not sources:
+                if force:
+                    raise FileNotFoundError(f"None of the knowledge base files exist: {', '.join(self.source_files)}")
+                return False
+            error = None
+            for path, mtime in sources:
+                if path == self.loaded_file and mtime == self._loaded_mtime:
+                    return False
+                if self._failed.get(path) != mtime:
+                    try:
+                        graph = rdf_stream.load_graph(path)
+                        materialize(graph)
+                        break
+                    except Exception as e:
+                        logger.error(f"Failed to load the knowledge base from {path}: {e}")
+                        self._failed[path] = mtime
+                        error = e
+                if self.loaded_file is not None:
+                    return False
+            else:
+                raise error
+            # replace the graph as a whole, queries running concurrently keep using the old one
+            self.graph = graph
+            reloaded = self.loaded_file is not None
+            self.loaded_file = path
+            self._loaded_mtime = mtime
+            logger.info(f"Loaded knowledge base from {path}: {len(graph)} triples")
+        if reloaded and self.on_reload:
+            self.on_reload()
+        return True
+
+    def query(self, query: str) -> list:
+        """Run a SPARQL SELECT query and return the list of result bindings."""
+        self.reload_if_changed()
+        result = self.graph.query(_prepare(query))
+        bindings = []
+        for row in result:
+            binding = {}
+            for var in result.vars:
+                term = row[var]
+                if term is not None:
+                    binding[str(var)] = _to_binding(term)
+            bindings.append(binding)
+        return bindings
@@ -0,0 +1,89 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import sparql_queries
+from embedded_kb import EmbeddedKnowledgeBase
+
+SOURCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'offices_staff.rdf')
+NEW_PERSON = ('<https://grammatek.com/munic/andabaer#GunnarGunnarsson> '
+              '<http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://xmlns.com/foaf/0.1/Person> .\n'
+              '<https://grammatek.com/munic/andabaer#GunnarGunnarsson> '
+              '<http://xmlns.com/foaf/0.1/name> "Gunnar Gunnarsson" .\n')
+
+
+class TestEmbeddedKnowledgeBase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source_file = os.path.join(self.directory, 'offices_staff.rdf')
+        shutil.copy(SOURCE_FILE, self.source_file)
+        self.dump_file = os.path.join(self.directory, 'kb.nt')
+        self.reloads = 0
+        self.kb = EmbeddedKnowledgeBase([self.source_file, self.dump_file], check_interval=0,
+                                        on_reload=self.on_reload)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def on_reload(self):
+        self.reloads += 1
+
+    def names(self) -> list:
+        return [r['name']['value'] for r in self.kb.query(sparql_queries.get_all_names_query())]
+
+    def write_dump(self, data: str, mtime_offset: float = 10):
+        with open(self.dump_file, 'w', encoding='utf-8') as f:
+            f.write(data)
+        mtime = os.stat(self.source_file).st_mtime + mtime_offset
+        os.utime(self.dump_file, (mtime, mtime))
+
+    def test_reload(self):
+        self.assertIn('Hildur Hallsdóttir', self.names())
+        self.write_dump(NEW_PERSON)
+        self.assertEqual(['Gunnar Gunnarsson'], self.names())
+        self.assertEqual(self.dump_file, self.kb.loaded_file)
+        self.assertEqual(1, self.reloads)
+        # unchanged files are not reloaded
+        self.names()
+        self.assertEqual(1, self.reloads)
+
+    def test_bad_file(self):
+        """A partially written dump is skipped, the graph of the other file is kept until the dump is complete."""
+        self.write_dump(NEW_PERSON + '<https://grammatek.com/munic/andabaer#Gunnar')
+        self.assertIn('Hildur Hallsdóttir', self.names())
+        self.assertEqual(self.source_file, self.kb.loaded_file)
+        self.assertEqual(0, self.reloads)
+
+        self.write_dump(NEW_PERSON, mtime_offset=20)
+        self.assertEqual(['Gunnar Gunnarsson'], self.names())
+        self.assertEqual(1, self.reloads)
+
+    def test_bad_file_after_reload(self):
+        self.write_dump(NEW_PERSON)
+        self.assertEqual(['Gunnar Gunnarsson'], self.names())
+        self.write_dump('<https://grammatek.com/munic/andabaer#Gunnar', mtime_offset=20)
+        self.assertEqual(['Gunnar Gunnarsson'], self.names())
+        # the bad dump is not parsed again, and the older source file isn't loaded instead
+        with self.assertNoLogs('embedded_kb', level='ERROR'):
+            self.assertEqual(['Gunnar Gunnarsson'], self.names())
+        self.assertEqual(1, self.reloads)
+
+    def test_no_loadable_file(self):
+        with open(self.source_file, 'w') as f:
+            f.write('<rdf:RDF')
+        with self.assertRaises(Exception):
+            EmbeddedKnowledgeBase([self.source_file])
+
+    def test_backend_selection(self):
+        """KB_BACKEND=embedded answers the lookups of 'info_api' from the embedded knowledge base."""
+        self.write_dump(NEW_PERSON)
+        script = 'import info_api; print(type(info_api._backend).__name__, info_api.get_all_names()[0])'
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(SOURCE_FILE),
+                                env={**os.environ, 'KB_BACKEND': 'embedded', 'KB_SOURCE_FILE': self.dump_file,
+                                     'KB_DUMP_FILE': ''})
+        self.assertEqual('EmbeddedKnowledgeBase Gunnar Gunnarsson', result.stdout.strip())
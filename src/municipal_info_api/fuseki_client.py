@@ -0,0 +1,265 @@
+"""
+HTTP client for the Fuseki endpoints of the municipality RDF-knowledge base.
+One client instance is shared by all lookups in 'info_api', so that connections to Fuseki are pooled and kept
+alive between queries instead of opening a new TCP connection per query. All requests are sent with connect
+and read timeouts. Blocking calls can be awaited from the async action server via 'aquery' and 'run', which
+execute them in a bounded worker pool, so one slow SPARQL query does not stall the event loop.
+Queries fail fast with FusekiUnavailable when the time budget of the current turn (see time_budget()) is used up, or
+when Fuseki has failed repeatedly and the circuit breaker of the client is open.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Timeouts in seconds. The read timeout applies to queries, the data timeout to downloading or uploading a whole
+# dataset via the graph store protocol. The read timeout is kept below the time budget of a turn (KB_TURN_BUDGET in
+# 'info_api'), so that a query of a turn isn't cut short by the budget before Fuseki counts as too slow.
+FUSEKI_CONNECT_TIMEOUT = float(os.environ.get('FUSEKI_CONNECT_TIMEOUT', '2'))
+FUSEKI_READ_TIMEOUT = float(os.environ.get('FUSEKI_READ_TIMEOUT', '3'))
+# Seconds a healthy Fuseki needs at most to answer a query. A query timing out after waiting at least that long counts
+# as a failure of Fuseki, even if its timeout was shortened to the rest of the time budget.
+FUSEKI_HEALTHY_QUERY_TIME = float(os.environ.get('FUSEKI_HEALTHY_QUERY_TIME', '1'))
+FUSEKI_DATA_TIMEOUT = float(os.environ.get('FUSEKI_DATA_TIMEOUT', '60'))
+# Maximum number of pooled keep-alive connections, also the number of worker threads for async calls
+FUSEKI_POOL_SIZE = int(os.environ.get('FUSEKI_POOL_SIZE', '10'))
+# Number of consecutive failed queries that open the circuit breaker, and seconds until a query is tried again
+FUSEKI_BREAKER_FAILURES = int(os.environ.get('FUSEKI_BREAKER_FAILURES', '5'))
+FUSEKI_BREAKER_RESET = float(os.environ.get('FUSEKI_BREAKER_RESET', '30'))
+
+REQUESTS = metrics.counter('fuseki_requests_total', 'Requests to Fuseki by operation and outcome',
+                           ['operation', 'outcome'])
+REQUEST_DURATION = metrics.histogram('fuseki_request_duration_seconds', 'Duration of requests to Fuseki',
+                                     ['operation'])
+PAYLOAD_SIZE = metrics.histogram('fuseki_payload_bytes', 'Size of query results and datasets sent to or '
+                                 'received from Fuseki', ['operation'], buckets=metrics.SIZE_BUCKETS)
+
+# Point in time (time.monotonic()) until which the lookups of the current turn have to be answered
+_deadline = contextvars.ContextVar('fuseki_deadline', default=None)
+
+
+class FusekiUnavailable(Exception):
+    """Fuseki could not answer a query: it is unreachable, too slow or returned an error, the time budget is used up,
+    or the circuit breaker is open."""
+
+
+@contextmanager
+def time_budget(seconds: float):
+    """Limit all queries inside the 'with' block, including those run via FusekiClient.run(), to 'seconds' in
+    total. A budget set by an enclosing block is never extended."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left of the current time budget, None if there is no budget."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class CircuitBreaker:
+    """Opens after 'failure_threshold' consecutive failures. While open, no requests are allowed until 'reset_timeout'
+    seconds have passed, then a single trial request is let through: its success closes the breaker again, its
+    failure keeps it open for another 'reset_timeout' seconds."""
+
+    def __init__(self, failure_threshold: int = FUSEKI_BREAKER_FAILURES, reset_timeout: float = FUSEKI_BREAKER_RESET,
+                 timer: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timer = timer
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial_running or self.timer() - self.opened_at < self.reset_timeout:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def release(self):
+        """End a request that says nothing about the health of Fuseki, e.g. one cut short by the time budget of a
+        turn, without changing the state of the breaker. A trial request may be sent again."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = self.timer()
+            self._trial_running = False
+
+
+class FusekiClient:
+    """Pooled keep-alive client for the SPARQL query and update endpoints and the graph store endpoint of a Fuseki
+    dataset."""
+
+    def __init__(self, query_endpoint: str, data_endpoint: str, update_endpoint: str = None,
+                 connect_timeout: float = FUSEKI_CONNECT_TIMEOUT,
+                 read_timeout: float = FUSEKI_READ_TIMEOUT,
+                 healthy_query_time: float = FUSEKI_HEALTHY_QUERY_TIME,
+                 data_timeout: float = FUSEKI_DATA_TIMEOUT,
+                 pool_size: int = FUSEKI_POOL_SIZE):
+        self.query_endpoint = query_endpoint
+        self.data_endpoint = data_endpoint
+        self.update_endpoint = update_endpoint
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.healthy_query_time = healthy_query_time
+        self.data_timeout = data_timeout
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='fuseki')
+        # number of requests sent to Fuseki, e.g. to check how many round-trips a lookup needs
+        self.round_trips = 0
+        self._count_lock = threading.Lock()
+        self.breaker = CircuitBreaker()
+
+    def _count_round_trip(self):
+        with self._count_lock:
+            self.round_trips += 1
+
+    def query(self, query: str) -> list:
+        """Run a SPARQL SELECT query and return the list of result bindings. Raises FusekiUnavailable if the query
+        could not be answered in time or the circuit breaker is open."""
+        read_timeout = self.read_timeout
+        remaining = remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                REQUESTS.inc(operation='query', outcome='rejected')
+                raise FusekiUnavailable("The time budget for knowledge base queries is used up")
+            read_timeout = min(read_timeout, remaining)
+        if not self.breaker.allow():
+            REQUESTS.inc(operation='query', outcome='rejected')
+            raise FusekiUnavailable("Fuseki failed repeatedly, the circuit breaker is open")
+
+        self._count_round_trip()
+        try:
+            with REQUEST_DURATION.time(operation='query'):
+                response = self.session.post(self.query_endpoint, data={'query': query},
+                                             timeout=(min(self.connect_timeout, read_timeout), read_timeout))
+            PAYLOAD_SIZE.observe(len(response.content), operation='query')
+            if response.status_code >= 500:
+                raise FusekiUnavailable(f"Fuseki answered with HTTP {response.status_code}")
+            response.raise_for_status()
+            bindings = response.json()['results']['bindings']
+        except requests.HTTPError:
+            # an error of the query itself is no sign of an unavailable Fuseki
+            REQUESTS.inc(operation='query', outcome='error')
+            self.breaker.record_success()
+            raise
+        except FusekiUnavailable:
+            REQUESTS.inc(operation='query', outcome='unavailable')
+            self.breaker.record_failure()
+            raise
+        except requests.ReadTimeout as e:
+            if read_timeout >= min(self.read_timeout, self.healthy_query_time):
+                REQUESTS.inc(operation='query', outcome='unavailable')
+                self.breaker.record_failure()
+                raise FusekiUnavailable(f"Query to Fuseki failed: {e}") from e
+            # the timeout was shortened to the rest of the time budget, below what a healthy Fuseki may need, which is
+            # no sign of an unavailable Fuseki
+            REQUESTS.inc(operation='query', outcome='rejected')
+            self.breaker.release()
+            raise FusekiUnavailable("The time budget for knowledge base queries is used up") from e
+        except (requests.RequestException, ValueError, KeyError) as e:
+            REQUESTS.inc(operation='query', outcome='unavailable')
+            self.breaker.record_failure()
+            raise FusekiUnavailable(f"Query to Fuseki failed: {e}") from e
+        REQUESTS.inc(operation='query', outcome='ok')
+        self.breaker.record_success()
+        return bindings
+
+    def get(self, endpoint: str, headers: dict, stream: bool = False) -> requests.Response:
+        """GET a dataset from a graph store endpoint. If 'stream' is set, the body is not read yet: iterate it via
+        iter_content() and close the response afterwards."""
+        self._count_round_trip()
+        with REQUEST_DURATION.time(operation='get'):
+            response = self.session.get(endpoint, headers=headers, stream=stream,
+                                        timeout=(self.connect_timeout, self.data_timeout))
+        REQUESTS.inc(operation='get', outcome='ok' if response.ok else 'error')
+        if not stream:
+            PAYLOAD_SIZE.observe(len(response.content), operation='get')
+        return response
+
+    @staticmethod
+    def iter_content(response: requests.Response, chunk_size: int) -> Iterator[bytes]:
+        """The body of a streamed response of get() in chunks of up to 'chunk_size' bytes."""
+        size = 0
+        for chunk in response.iter_content(chunk_size):
+            size += len(chunk)
+            yield chunk
+        PAYLOAD_SIZE.observe(size, operation='get')
+
+    def put(self, endpoint: str, headers: dict, data: Any) -> requests.Response:
+        """PUT a dataset to a graph store endpoint, replacing its contents. 'data' can also be a file object or an
+        iterator of chunks, which are uploaded with chunked transfer encoding."""
+        self._count_round_trip()
+        with REQUEST_DURATION.time(operation='put'):
+            response = self.session.put(endpoint, headers=headers, data=data,
+                                        timeout=(self.connect_timeout, self.data_timeout))
+        REQUESTS.inc(operation='put', outcome='ok' if response.ok else 'error')
+        if isinstance(data, (str, bytes)):
+            PAYLOAD_SIZE.observe(len(data), operation='put')
+        return response
+
+    def update(self, update: str, endpoint: str = None) -> requests.Response:
+        """Run a SPARQL update on 'endpoint', by default the update endpoint of the client, e.g. to materialize the
+        lookup keys after the dataset has been replaced."""
+        self._count_round_trip()
+        with REQUEST_DURATION.time(operation='update'):
+            response = self.session.post(endpoint or self.update_endpoint, data={'update': update},
+                                         timeout=(self.connect_timeout, self.data_timeout))
+        REQUESTS.inc(operation='update', outcome='ok' if response.ok else 'error')
+        return response
+
+    async def aquery(self, query: str) -> list:
+        """Async version of 'query'."""
+        return await self.run(self.query, query)
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Run a blocking call, e.g. a lookup function using this client, in the worker pool of the client
+        and wait for its result without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        # run in a copy of the current context, so that the time budget of the caller applies
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
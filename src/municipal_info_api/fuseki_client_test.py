@@ -0,0 +1,140 @@
+import os
+import time
+import unittest
+
+import requests
+
+from fuseki_client import CircuitBreaker, FusekiClient, FusekiUnavailable, time_budget, remaining_time
+from sparql_standin import SparqlStandin
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, timer=self.timer)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+
+    def test_single_trial_after_reset_timeout(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.timer.now = 10
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.timer.now = 20
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.is_open)
+
+    def test_release_trial(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.timer.now = 10
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertTrue(self.breaker.is_open)
+        self.assertTrue(self.breaker.allow())
+
+
+class TestFusekiClient(unittest.TestCase):
+
+    def setUp(self):
+        # nothing listens on the discard port
+        self.client = FusekiClient('http://localhost:9/ds/query', 'http://localhost:9/ds/data')
+        self.client.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_unreachable(self):
+        for _ in range(2):
+            with self.assertRaises(FusekiUnavailable):
+                self.client.query('SELECT * WHERE {?s ?p ?o}')
+        self.assertTrue(self.client.breaker.is_open)
+        round_trips = self.client.round_trips
+        with self.assertRaises(FusekiUnavailable):
+            self.client.query('SELECT * WHERE {?s ?p ?o}')
+        self.assertEqual(round_trips, self.client.round_trips)
+
+    def test_time_budget(self):
+        self.assertIsNone(remaining_time())
+        with time_budget(0):
+            time.sleep(0.001)
+            with self.assertRaises(FusekiUnavailable):
+                self.client.query('SELECT * WHERE {?s ?p ?o}')
+            with time_budget(10):
+                self.assertLess(remaining_time(), 0)
+        self.assertEqual(0, self.client.round_trips)
+
+    def test_time_budget_timeout(self):
+        """Queries timing out because the time budget is almost used up don't open the circuit breaker."""
+        standin = SparqlStandin(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'offices_staff.rdf'),
+                                latency=0.3)
+        standin.start()
+        client = FusekiClient(standin.query_endpoint, standin.data_endpoint)
+        client.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        try:
+            for _ in range(3):
+                with time_budget(0.1):
+                    with self.assertRaises(FusekiUnavailable):
+                        client.query('SELECT * WHERE {?s ?p ?o} LIMIT 1')
+            self.assertFalse(client.breaker.is_open)
+            self.assertEqual(1, len(client.query('SELECT * WHERE {?s ?p ?o} LIMIT 1')))
+        finally:
+            client.close()
+            standin.stop()
+
+    def test_slow_fuseki_under_time_budget(self):
+        """Queries timing out after waiting longer than a healthy Fuseki needs open the circuit breaker, even if their
+        timeout was shortened to the rest of the time budget."""
+        standin = SparqlStandin(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'offices_staff.rdf'),
+                                latency=1)
+        standin.start()
+        client = FusekiClient(standin.query_endpoint, standin.data_endpoint, read_timeout=0.5, healthy_query_time=0.2)
+        client.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        try:
+            for _ in range(2):
+                with time_budget(0.4):
+                    with self.assertRaises(FusekiUnavailable):
+                        client.query('SELECT * WHERE {?s ?p ?o} LIMIT 1')
+            self.assertTrue(client.breaker.is_open)
+            with time_budget(0.4):
+                with self.assertRaisesRegex(FusekiUnavailable, 'circuit breaker'):
+                    client.query('SELECT * WHERE {?s ?p ?o} LIMIT 1')
+            self.assertEqual(2, client.round_trips)
+        finally:
+            client.close()
+            standin.stop()
+
+    def test_connect_timeout_is_a_failure(self):
+        """A connect timeout counts as a failure of Fuseki, even under a short time budget."""
+        def post(*args, **kwargs):
+            raise requests.ConnectTimeout('Connection to Fuseki timed out')
+
+        self.client.session.post = post
+        self.client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        with time_budget(0.1):
+            with self.assertRaises(FusekiUnavailable):
+                self.client.query('SELECT * WHERE {?s ?p ?o} LIMIT 1')
+        self.assertTrue(self.client.breaker.is_open)
+
+if __name__ == '__main__':
+    unittest.main()
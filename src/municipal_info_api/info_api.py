@@ -1,60 +1,271 @@
+import functools
+import logging
 import os
-
-from rdflib import Graph
-import requests
+import threading
+import time
+import unicodedata
+
+from rdflib import Graph, URIRef
+from rdflib.namespace import FOAF, RDF
+from cache import TTLCache, MISSING
+from embedded_kb import EmbeddedKnowledgeBase
+from fuseki_client import FusekiClient, FusekiUnavailable, time_budget
+from singleflight import SingleFlight
+import metrics
+import rdf_delta
+import rdf_stream
 import sparql_queries
 
+logger = logging.getLogger(__name__)
+
 FUSEKI_HOST = os.environ.get('FUSEKI_NETWORK_HOST', 'fuseki')
 FUSEKI_PORT = os.environ.get('FUSEKI_NETWORK_PORT', '3030')
 FUSEKI_DATASET = 'ds'
 FUSEKI_QUERY_ENDPOINT = f'http://{FUSEKI_HOST}:{FUSEKI_PORT}/{FUSEKI_DATASET}/query'
 FUSEKI_DATA_ENDPOINT = f'http://{FUSEKI_HOST}:{FUSEKI_PORT}/{FUSEKI_DATASET}/data?default'
+FUSEKI_UPDATE_ENDPOINT = f'http://{FUSEKI_HOST}:{FUSEKI_PORT}/{FUSEKI_DATASET}/update'
+# Graph store endpoint for the whole dataset, used for dumps in a quad format
+FUSEKI_DATASET_ENDPOINT = f'http://{FUSEKI_HOST}:{FUSEKI_PORT}/{FUSEKI_DATASET}/data'
 
 # Info: append endpoint with "?graph=some_named_graph" instead of ?default to specify a named graph instead of the
 # default graph
 
+# Backend answering the lookups: 'fuseki' queries the Fuseki server, 'embedded' loads the knowledge graph into the
+# action server process (see embedded_kb.py). The embedded graph is loaded from KB_SOURCE_FILE or from
+# KB_DUMP_FILE, e.g. a dump written with get_db() or export_db() (also gzip-compressed, like 'kb.nt.gz'), whichever
+# has been modified last.
+KB_BACKEND = os.environ.get('KB_BACKEND', 'fuseki').lower()
+KB_SOURCE_FILE = os.environ.get('KB_SOURCE_FILE', os.path.join(os.path.dirname(__file__), 'offices_staff.rdf'))
+KB_DUMP_FILE = os.environ.get('KB_DUMP_FILE', '')
+
+# Seconds until the cached lists of all contact names and subjects are fetched again. The cache is also invalidated
+# explicitly when the dataset is replaced via update_db().
+KB_LIST_CACHE_TTL = float(os.environ.get('KB_LIST_CACHE_TTL', '300'))
+_list_cache = TTLCache(maxsize=16, ttl=KB_LIST_CACHE_TTL)
+
+# Results of contact, title and subject lookups are cached by lookup and normalized argument. Lookups without results
+# are cached for a shorter time, KB_NEGATIVE_CACHE_TTL, so that new entries show up sooner.
+KB_RESULT_CACHE_SIZE = int(os.environ.get('KB_RESULT_CACHE_SIZE', '1024'))
+KB_RESULT_CACHE_TTL = float(os.environ.get('KB_RESULT_CACHE_TTL', '300'))
+KB_NEGATIVE_CACHE_TTL = float(os.environ.get('KB_NEGATIVE_CACHE_TTL', '30'))
+_result_cache = TTLCache(maxsize=KB_RESULT_CACHE_SIZE, ttl=KB_RESULT_CACHE_TTL)
+
+# Concurrent identical lookups share one request to the knowledge base, keyed like the cache entries
+_flight = SingleFlight()
+
+# Seconds all knowledge base lookups of one action run may take together, see with_turn_budget()
+KB_TURN_BUDGET = float(os.environ.get('KB_TURN_BUDGET', '4'))
+# If Fuseki is unavailable, lookups without a cached result are answered from the embedded knowledge graph
+# (KB_SOURCE_FILE or KB_DUMP_FILE), which is only loaded when needed. The current data of Fuseki is written to
+# KB_DUMP_FILE at the warm-up and after each change, see save_snapshot(). Without KB_DUMP_FILE, the fallback is
+# disabled once the data has been changed, as KB_SOURCE_FILE is outdated then.
+KB_SNAPSHOT_FALLBACK = os.environ.get('KB_SNAPSHOT_FALLBACK', 'true').lower() in ('true', '1', 'yes')
+
+# Maximum number of matches per field of the full-text search of titles and roles, see search_titles_and_roles()
+KB_SEARCH_LIMIT = int(os.environ.get('KB_SEARCH_LIMIT', '10'))
+
+# Shared client for all requests to Fuseki, see fuseki_client.py for the connection and timeout settings
+_client = FusekiClient(FUSEKI_QUERY_ENDPOINT, FUSEKI_DATA_ENDPOINT, FUSEKI_UPDATE_ENDPOINT)
+_snapshot = None
+_snapshot_outdated = False
+_snapshot_lock = threading.Lock()
+
+if KB_BACKEND == 'embedded':
+    _backend = EmbeddedKnowledgeBase([KB_SOURCE_FILE, KB_DUMP_FILE], on_reload=lambda: invalidate_caches())
+elif KB_BACKEND == 'fuseki':
+    _backend = _client
+else:
+    raise ValueError(f"Unknown knowledge base backend '{KB_BACKEND}', use 'fuseki' or 'embedded'.")
+
+# Metrics of the lookups by kind: contact, abbreviated (contacts found with a missing or abbreviated middle or family
+# name), title, subject, search, names, roles and office. The durations include cache hits and the fallbacks of _load().
+LOOKUP_DURATION = metrics.histogram('kb_lookup_duration_seconds', 'Duration of knowledge base lookups', ['kind'])
+LOOKUP_ERRORS = metrics.counter('kb_lookup_errors_total', 'Failed knowledge base lookups', ['kind'])
+FALLBACKS = metrics.counter('kb_fallbacks_total', 'Lookups answered by a fallback while Fuseki is unavailable',
+                            ['source'])
+metrics.function_metric('kb_cache_hits_total', 'Hits of the lookup caches', ['cache'],
+                        lambda: {(name,): stats['hits'] for name, stats in _cache_stats()},
+                        type='counter')
+metrics.function_metric('kb_cache_misses_total', 'Misses of the lookup caches', ['cache'],
+                        lambda: {(name,): stats['misses'] for name, stats in _cache_stats()}, type='counter')
+metrics.function_metric('kb_cache_hit_ratio', 'Hit ratio of the lookup caches', ['cache'],
+                        lambda: {(name,): stats['hit_rate'] for name, stats in _cache_stats()})
+metrics.function_metric('kb_cache_entries', 'Number of entries of the lookup caches', ['cache'],
+                        lambda: {(name,): stats['size'] for name, stats in _cache_stats()})
+metrics.function_metric('kb_coalesced_lookups_total', 'Lookups that shared the request of a concurrent identical '
+                        'lookup', [], lambda: {(): _flight.shared}, type='counter')
+metrics.function_metric('fuseki_circuit_breaker_open', 'Whether the circuit breaker of the Fuseki client is open',
+                        [], lambda: {(): int(_client.breaker.is_open)})
+
 CONTENT_TYPES = {
         'rdf': 'application/rdf+xml',
         'turtle': 'text/turtle',
         'ntriples': 'application/n-triples',
         'jsonld': 'application/ld+json',
     }
+# Formats of export_db() and import_db(). Quad formats contain all graphs of the dataset.
+DUMP_CONTENT_TYPES = {
+        **CONTENT_TYPES,
+        'nquads': 'application/n-quads',
+    }
+QUAD_FORMATS = ('nquads',)
+
+# Predicates of persons that decide which lookups match them. If only other predicates of persons change, like their
+# email or phone number, update_db_delta() discards just the cached results containing these persons.
+MATCHED_PREDICATES = {RDF.type, FOAF.name, FOAF.firstName, FOAF.familyName, FOAF.title,
+                      URIRef('https://www.w3.org/TR/vocab-orgrole')}
 
 
 class Person:
-    def __init__(self, name=None, phone=None, email=None, department=None, title=None):
+    def __init__(self, name=None, phone=None, email=None, department=None, title=None, match_kind=None,
+                 score=None):
         self.name = name
         self.phone = phone
         self.email = email
         self.department = department
         self.title = title
+        # how the person was found by resolve_contact(), see sparql_queries.get_info_for_contact_candidates_query()
+        self.match_kind = match_kind
+        # relevance of a match of the full-text search, see search_titles_and_roles()
+        self.score = score
+
+
+def _measured(kind: str, result_kind=None):
+    """Decorator recording the duration and errors of a lookup of 'kind'. 'result_kind', if given, returns a more
+    specific kind for the result of the lookup."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                LOOKUP_ERRORS.inc(kind=kind)
+                LOOKUP_DURATION.observe(time.perf_counter() - start, kind=kind)
+                raise
+            LOOKUP_DURATION.observe(time.perf_counter() - start,
+                                    kind=result_kind(result) if result_kind else kind)
+            return result
+        return wrapper
+    return decorator
+
+
+def _contact_kind(contacts: list) -> str:
+    if contacts and contacts[0].match_kind == 'abbreviated':
+        return 'abbreviated'
+    return 'contact'
+
+
+def get_snapshot():
+    """The embedded knowledge graph used as fallback while Fuseki is unavailable, or None if there is no fallback."""
+    global _snapshot
+    if _backend is not _client or not KB_SNAPSHOT_FALLBACK:
+        return None
+    with _snapshot_lock:
+        if _snapshot_outdated:
+            return None
+        if _snapshot is None:
+            try:
+                _snapshot = EmbeddedKnowledgeBase([KB_SOURCE_FILE, KB_DUMP_FILE])
+            except Exception as e:
+                logger.error(f"No snapshot of the knowledge base available: {e}")
+                return None
+    return _snapshot
+
+
+def save_snapshot():
+    """Write the current data of Fuseki to KB_DUMP_FILE, if set, from which the snapshot is reloaded. The previous
+    dump is kept if the data cannot be exported."""
+    global _snapshot_outdated
+    if not KB_DUMP_FILE:
+        return
+    try:
+        export_db(KB_DUMP_FILE, _snapshot_format(KB_DUMP_FILE), validate=True)
+    except Exception as e:
+        logger.error(f"Could not write the snapshot of the knowledge base to {KB_DUMP_FILE}: {e}")
+        return
+    with _snapshot_lock:
+        _snapshot_outdated = False
+
+
+def _snapshot_format(path: str) -> str:
+    rdflib_format = rdf_stream.rdf_format(path)
+    return {'nt': 'ntriples', 'xml': 'rdf', 'json-ld': 'jsonld'}.get(rdflib_format, rdflib_format)
+
+
+def _after_change():
+    """Keep the snapshot up to date after the data of Fuseki has been changed."""
+    global _snapshot, _snapshot_outdated
+    if KB_DUMP_FILE:
+        save_snapshot()
+        return
+    with _snapshot_lock:
+        if not _snapshot_outdated:
+            logger.warning("The knowledge base has been changed and KB_DUMP_FILE is not set, the snapshot of "
+                           f"{KB_SOURCE_FILE} is not used as fallback anymore")
+        _snapshot = None
+        _snapshot_outdated = True
+
+
+def _load(cache: TTLCache, key: tuple, lookup, negative_ttl: float = None):
+    """Return the cached value for 'key', or the result of 'lookup(backend)' for the knowledge base backend.
+    Concurrent calls for the same 'key' share one call of 'lookup'. If Fuseki is unavailable, the last value of
+    'key' is returned even if it has expired, or if there is none, 'lookup' is answered from the snapshot."""
+    try:
+        return cache.get_or_load(key, lambda: _flight.do(key, lookup, _backend), negative_ttl=negative_ttl)
+    except FusekiUnavailable as e:
+        value = cache.get_stale(key)
+        if value is not MISSING:
+            logger.warning(f"Knowledge base unavailable ({e}), serving the last known result for {key}")
+            FALLBACKS.inc(source='stale')
+            return value
+        snapshot = get_snapshot()
+        if snapshot is None:
+            raise
+        logger.warning(f"Knowledge base unavailable ({e}), answering {key} from the snapshot")
+        FALLBACKS.inc(source='snapshot')
+        return lookup(snapshot)
+
+
+@_measured('names')
+def get_all_names() -> list:
+    """Full names of all contacts. The list is cached, see KB_LIST_CACHE_TTL."""
+    return list(_load(_list_cache, ('list', 'names'), _query_all_names))
 
 
-def get_all_names() -> list:
+def _query_all_names(backend) -> list:
     query = sparql_queries.get_all_names_query()
-    response = requests.post(FUSEKI_QUERY_ENDPOINT, data={'query': query})
-    results = response.json()['results']['bindings']
+    results = backend.query(query)
     contacts = []
     for r in results:
         contacts.append(r['name']['value'])
     return contacts
 
 
+@_measured('roles')
 def get_valid_subjects() -> list:
+    """All subjects (roles) contacts are responsible for. The list is cached, see KB_LIST_CACHE_TTL."""
+    return list(_load(_list_cache, ('list', 'subjects'), _query_valid_subjects))
+
+
+def _query_valid_subjects(backend) -> list:
     query = sparql_queries.get_all_roles_query()
-    response = requests.post(FUSEKI_QUERY_ENDPOINT, data={'query': query})
-    results = response.json()['results']['bindings']
+    results = backend.query(query)
     contacts = []
     for r in results:
         contacts.append(r['role']['value'])
     return contacts
 
 
+@_measured('office')
 def get_office_contact_info() -> list:
-    """Get the phone number and email of the main office."""
+    """Get the phone number and email of the main office. The office contact is cached like the lists above."""
+    return list(_load(_list_cache, ('list', 'office'), _query_office_contact_info))
+
+
+def _query_office_contact_info(backend) -> list:
     query = sparql_queries.get_office_contact_info_query()
-    response = requests.post(FUSEKI_QUERY_ENDPOINT, data={'query': query})
-    results = response.json()['results']['bindings']
+    results = backend.query(query)
     contacts = []
     for r in results:
         contact = Person()
@@ -68,85 +279,225 @@ def get_office_contact_info() -> list:
 
 def get_office_phone_number() -> str:
     """Get phone number of main office, to be returned as default phone number in contact searches."""
-    query = sparql_queries.get_office_contact_info_query()
-    response = requests.post(FUSEKI_QUERY_ENDPOINT, data={'query': query})
-    results = response.json()['results']['bindings']
     phone = ""
-    for r in results:
-        if 'phone' in r:
-            phone = r['phone']['value']
+    for contact in get_office_contact_info():
+        if contact.phone:
+            phone = contact.phone
     return phone
 
 
+def _to_persons(results: list) -> list:
+    """Create Person objects from the results of a contact query, i.e. from contact cards: contacts without a phone
+    number already have the phone number of the main office, and a missing email or title is an empty string,
+    see 'contact_cards.ru'."""
+    contacts = []
+    for r in results:
+        phone = r['phone']['value']
+        if r['email']['value']:
+            email = r['email']['value']
+        else:
+            email = None
+        if r['title']['value']:
+            title = r['title']['value']
+        else:
+            title = None
+        if 'match_kind' in r:
+            match_kind = r['match_kind']['value']
+        else:
+            match_kind = None
+        if 'score' in r:
+            score = float(r['score']['value'])
+        else:
+            score = None
+        contacts.append(Person(name=r['name']['value'], phone=phone, email=email, title=title,
+                               match_kind=match_kind, score=score))
+    return contacts
+
+
+def normalize_argument(argument: str) -> str:
+    """Normalize a lookup argument, so that it is queried and cached the same way regardless of Unicode form
+    and surrounding or repeated whitespace."""
+    return ' '.join(unicodedata.normalize('NFC', argument).split())
+
+
+def _cached_lookup(strategy: str, argument, lookup) -> list:
+    """Return the cached result of 'lookup(backend)' for 'strategy' and 'argument', see _load()."""
+    return list(_load(_result_cache, (strategy, argument), lookup, negative_ttl=KB_NEGATIVE_CACHE_TTL))
+
+
 def get_info_for_contact(contact: str) -> list:
     """Find the contact info for persons that match 'contact'. First, we try to find a match of the 'contact'
      as is, either a first name, first names or a full name. If nothing is found, we check if the 'contact'
      is missing a middle name or abbreviating it, e.g. 'Anna Árnadóttir' should give us results
      for 'Anna Jóna Árnadóttir', as should 'Anna J. Árnadóttir'."""
 
-    query = sparql_queries.get_info_for_contact_query(contact)
-    response = requests.post(FUSEKI_QUERY_ENDPOINT, data={'query': query})
-    results = response.json()['results']['bindings']
-    # Try another query if we don't have any results, however, only if we have more than one
-    # tokens in 'contact'. Querying with one token will not get another result than the above query.
-    if not results and len(contact.split()) > 1:
-        query = sparql_queries.get_info_for_contact_abbreviated_name_query(contact)
-        response = requests.post(FUSEKI_QUERY_ENDPOINT, data={'query': query})
-        results = response.json()['results']['bindings']
-    contacts = []
+    return resolve_contact([contact])
+
+
+@_measured('contact', result_kind=_contact_kind)
+def resolve_contact(candidates: list) -> list:
+    """Find the contact info for the first of 'candidates' that matches any persons, e.g. for the nominative
+    candidates of a declined name. All candidates and all match strategies of get_info_for_contact() are resolved
+    in a single query. For each candidate, exact and first name matches take precedence over matches with a
+    missing or abbreviated middle or family name, the latter are only tried for candidates with more than one
+    token, as querying with one token will not get another result."""
+
+    if not candidates:
+        return []
+    candidates = tuple(normalize_argument(c) for c in candidates)
+    return _cached_lookup('contact', candidates, lambda backend: _query_contact(backend, candidates))
+
+
+def _query_contact(backend, candidates: tuple) -> list:
+    query = sparql_queries.get_info_for_contact_candidates_query(list(candidates))
+    results = backend.query(query)
+
+    # order: index of the candidate, then exact/first name matches before abbreviated ones
+    ranked = {}
     for r in results:
-        if 'phone' in r:
-            phone = r['phone']['value']
-        else:
-            phone = get_office_phone_number()
-        if 'email' in r:
-            email = r['email']['value']
-        else:
-            email = None
-        contact = Person(name=r['name']['value'], phone=phone,
-                         email=email, title=r['title']['value'])
-        contacts.append(contact)
-    return contacts
+        rank = (candidates.index(r['candidate']['value']), r['match_kind']['value'] == 'abbreviated')
+        ranked.setdefault(rank, []).append(r)
+    if not ranked:
+        return []
+    # a person matching both as 'exact' and 'first_name' is returned once
+    return _to_persons(_distinct(ranked[min(ranked)]))
+
+
+def _distinct(results: list) -> list:
+    """The first of the 'results' of each person."""
+    distinct = []
+    seen = set()
+    for r in results:
+        key = tuple(r[var]['value'] if var in r else None for var in ('name', 'email', 'phone', 'title'))
+        if key not in seen:
+            seen.add(key)
+            distinct.append(r)
+    return distinct
 
 
+@_measured('subject')
 def get_contact_from_subject(subject: str) -> list:
+    """Persons responsible for 'subject' (org:role). If no role matches exactly, the roles are searched in the
+    full-text index, see search_titles_and_roles()."""
+    subject = normalize_argument(subject)
+    return _cached_lookup('subject', subject, lambda backend: _query_contact_from_subject(backend, subject))
+
+
+def _query_contact_from_subject(backend, subject: str) -> list:
     query = sparql_queries.get_contact_from_subject_query(subject)
-    response = requests.post(FUSEKI_QUERY_ENDPOINT, data={'query': query})
-    results = response.json()['results']['bindings']
-    contacts = []
-    for r in results:
-        if 'phone' in r:
-            phone = r['phone']['value']
-        else:
-            phone = get_office_phone_number()
-        if 'email' in r:
-            email = r['email']['value']
-        else:
-            email = None
-        contact = Person(name=r['name']['value'], phone=phone,
-                         email=email, title=r['title']['value'])
-        contacts.append(contact)
-    return contacts
+    results = backend.query(query)
+    return _to_persons(results) or _query_search(backend, subject, ('role',), KB_SEARCH_LIMIT)
 
 
+@_measured('title')
 def get_name_for_title(title: str) -> list:
+    """Persons with the title 'title', see sparql_queries.get_names_for_title_query(). If no title matches, the
+    titles are searched in the full-text index, see search_titles_and_roles()."""
+    title = normalize_argument(title)
+    return _cached_lookup('title', title, lambda backend: _query_name_for_title(backend, title))
+
+
+def _query_name_for_title(backend, title: str) -> list:
     query = sparql_queries.get_names_for_title_query(title)
-    response = requests.post(FUSEKI_QUERY_ENDPOINT, data={'query': query})
-    results = response.json()['results']['bindings']
-    contacts = []
-    for r in results:
-        if 'phone' in r:
-            phone = r['phone']['value']
-        else:
-            phone = get_office_phone_number()
-        if 'email' in r:
-            email = r['email']['value']
-        else:
-            email = None
-        contact = Person(name=r['name']['value'], phone=phone,
-                         email=email, title=r['title']['value'])
-        contacts.append(contact)
-    return contacts
+    results = backend.query(query)
+    return _to_persons(results) or _query_search(backend, title, ('title',), KB_SEARCH_LIMIT)
+
+
+@_measured('search')
+def search_titles_and_roles(text: str, fields: tuple = ('title', 'role'), limit: int = KB_SEARCH_LIMIT) -> list:
+    """Persons whose title or role (or any other of 'fields', see sparql_queries.SEARCH_FIELDS) matches 'text' in
+    the full-text index of the knowledge base, ranked by their score, the best match first. Unlike the exact
+    lookups, the search ignores case and tolerates inflections and typos, e.g. 'Verkefnastjórar' finds the
+    'verkefnastjóri' as well as the 'verkefnastjóri skjalamála'."""
+    text = normalize_argument(text)
+    fields = tuple(fields)
+    return _cached_lookup('search', (text, fields, limit),
+                          lambda backend: _query_search(backend, text, fields, limit))
+
+
+def _query_search(backend, text: str, fields: tuple, limit: int) -> list:
+    if not sparql_queries.lucene_query(text):
+        return []
+    query = sparql_queries.get_search_query(text, list(fields), limit)
+    results = backend.query(query)
+    # a person matching in several fields is returned once, with its best score
+    return _to_persons(_distinct(results))
+
+
+def invalidate_caches():
+    """Discard all cached lookup results, e.g. after the dataset has been replaced."""
+    _list_cache.invalidate()
+    _result_cache.invalidate()
+
+
+def cache_stats() -> dict:
+    """Sizes, hits, misses and hit rates of the caches, e.g. to tune their sizes and TTLs, and the number of
+    lookups that shared the request of a concurrent identical lookup."""
+    return {'lists': _list_cache.stats(), 'results': _result_cache.stats(), 'coalesced': _flight.shared}
+
+
+def _cache_stats() -> list:
+    return [('lists', _list_cache.stats()), ('results', _result_cache.stats())]
+
+
+def get_client() -> FusekiClient:
+    """The client shared by all knowledge base lookups of this module."""
+    return _client
+
+
+def with_turn_budget(func):
+    """Decorator for async action methods: all knowledge base lookups of one call share a time budget of
+    KB_TURN_BUDGET seconds. Lookups that would exceed it raise FusekiUnavailable or are answered by the fallbacks
+    of _load()."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with time_budget(KB_TURN_BUDGET):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+# Async versions of the lookups above, to be awaited from the actions. The blocking lookups are run in the worker
+# pool of the Fuseki client, so that the event loop of the action server keeps serving other conversations.
+# Concurrent identical lookups are coalesced before they are handed to the worker pool, so that they don't occupy
+# one worker each.
+
+async def _run_coalesced(key: tuple, func, *args) -> list:
+    return list(await _flight.ado(key, _client.run, func, *args))
+
+
+async def get_all_names_async() -> list:
+    return await _run_coalesced(('list', 'names'), get_all_names)
+
+
+async def get_valid_subjects_async() -> list:
+    return await _run_coalesced(('list', 'subjects'), get_valid_subjects)
+
+
+async def get_office_contact_info_async() -> list:
+    return await _run_coalesced(('list', 'office'), get_office_contact_info)
+
+
+async def get_info_for_contact_async(contact: str) -> list:
+    return await resolve_contact_async([contact])
+
+
+async def resolve_contact_async(candidates: list) -> list:
+    key = ('contact', tuple(normalize_argument(c) for c in candidates))
+    return await _run_coalesced(key, resolve_contact, candidates)
+
+
+async def get_contact_from_subject_async(subject: str) -> list:
+    return await _run_coalesced(('subject', normalize_argument(subject)), get_contact_from_subject, subject)
+
+
+async def get_name_for_title_async(title: str) -> list:
+    return await _run_coalesced(('title', normalize_argument(title)), get_name_for_title, title)
+
+
+async def search_titles_and_roles_async(text: str, fields: tuple = ('title', 'role'),
+                                        limit: int = KB_SEARCH_LIMIT) -> list:
+    key = ('search', (normalize_argument(text), tuple(fields), limit))
+    return await _run_coalesced(key, search_titles_and_roles, text, fields, limit)
 
 
 def get_db(format_type, endpoint=FUSEKI_DATA_ENDPOINT):
@@ -165,17 +516,12 @@ def get_db(format_type, endpoint=FUSEKI_DATA_ENDPOINT):
     accept_header = CONTENT_TYPES[format_type_lower]
     headers = {'Accept': accept_header}
 
-    response = requests.get(endpoint, headers=headers)
+    response = _client.get(endpoint, headers=headers)
     if response.status_code == 200:
         # Parse the response as the specified format for validation and then serialize it as a string
         # again
         response_data = response.content.decode('utf-8')
-
-        # Adaptions for rdflib
-        if format_type_lower == 'rdf':
-            format_type = 'xml'
-        if format_type_lower == 'jsonld':
-            format_type = 'json-ld'
+        format_type = _rdflib_format(format_type_lower)
 
         graph = Graph()
         graph.parse(data=response_data, format=format_type)
@@ -184,6 +530,15 @@ def get_db(format_type, endpoint=FUSEKI_DATA_ENDPOINT):
         raise Exception(f"Error: HTTP {response.status_code}: {response.text}")
 
 
+def _rdflib_format(format_type: str) -> str:
+    # Adaptions for rdflib
+    if format_type == 'rdf':
+        return 'xml'
+    if format_type == 'jsonld':
+        return 'json-ld'
+    return format_type
+
+
 def is_utf8_encoded(byte_array):
     try:
         byte_array.decode('utf-8')
@@ -194,13 +549,16 @@ def is_utf8_encoded(byte_array):
         return False
 
 
-def update_db(data_string, data_type, endpoint=FUSEKI_DATA_ENDPOINT):
+def update_db(data_string, data_type, endpoint=FUSEKI_DATA_ENDPOINT, update_endpoint=FUSEKI_UPDATE_ENDPOINT):
     """
     Sends db contents as string containing RDF data to a Fuseki endpoint using PUT, replacing the existing data.
+    Afterwards, the lookup keys and contact cards of the new data are materialized via the update endpoint, see
+    'lookup_keys.ru' and 'contact_cards.ru'.
 
     :param data_string: The RDF data as a string
     :param data_type: The data type ('rdf', 'turtle', 'ntriples', 'jsonld', 'rdfjson', 'trig', or 'nquads') as a string
     :param endpoint: The Fuseki endpoint (URL) as a string
+    :param update_endpoint: The Fuseki SPARQL update endpoint (URL) as a string
     """
     data_type_lower = data_type.lower()
     if data_type_lower not in CONTENT_TYPES:
@@ -213,6 +571,154 @@ def update_db(data_string, data_type, endpoint=FUSEKI_DATA_ENDPOINT):
     if not is_utf8_encoded(data_string):
         data_string = data_string.encode('utf-8')
 
-    response = requests.put(endpoint, headers=headers, data=data_string)
+    response = _client.put(endpoint, headers=headers, data=data_string)
+    _after_replace(response, update_endpoint)
+
+
+def _after_replace(response, update_endpoint: str):
+    """Materialize the lookup keys and contact cards after the dataset has been replaced by 'response', invalidate
+    the caches and update the snapshot."""
+    if response.status_code == 200:
+        response = _client.update(sparql_queries.get_materialization_update(), update_endpoint)
+    # the dataset might have been partially replaced even if the request failed
+    invalidate_caches()
+    if response.status_code not in (200, 204):
+        raise Exception(f"Error: HTTP {response.status_code}: {response.text}")
+    _after_change()
+
+
+def update_db_delta(data_string, data_type, endpoint=FUSEKI_DATA_ENDPOINT, update_endpoint=FUSEKI_UPDATE_ENDPOINT):
+    """
+    Updates the db contents to the RDF data of 'data_string', like update_db(), but only applies the differences to
+    the current data instead of replacing it: the triples removed and added by the new version are sent as one SPARQL
+    update, see 'rdf_delta'. The lookup keys and contact cards are re-materialized in the same request. If only
+    contact details of persons have changed (see MATCHED_PREDICATES), only the cached results containing these
+    persons are discarded, otherwise all caches are invalidated.
+
+    :param data_string: The new version of the RDF data as a string
+    :param data_type: The data type ('rdf', 'turtle', 'ntriples' or 'jsonld') as a string
+    :param endpoint: The Fuseki endpoint (URL) to retrieve the current data from as a string
+    :param update_endpoint: The Fuseki SPARQL update endpoint (URL) as a string
+
+    :return: The names of the changed persons, sorted
+    """
+    data_type_lower = data_type.lower()
+    if data_type_lower not in CONTENT_TYPES:
+        raise ValueError(f"The format type must be one of {', '.join(CONTENT_TYPES.keys())}.")
+
+    new = Graph()
+    new.parse(data=data_string, format=_rdflib_format(data_type_lower))
+    response = _client.get(endpoint, headers={'Accept': CONTENT_TYPES['ntriples']})
     if response.status_code != 200:
         raise Exception(f"Error: HTTP {response.status_code}: {response.text}")
+    current = Graph()
+    current.parse(data=response.content.decode('utf-8'), format='nt')
+
+    delta = rdf_delta.diff(current, new, sparql_queries.MATERIALIZED_NAMESPACES)
+    if not delta:
+        return []
+    persons = {s for s in delta.subjects if any((s, RDF.type, FOAF.Person) in graph for graph in (current, new))}
+    names = {str(name) for graph in (current, new) for person in persons for name in graph.objects(person, FOAF.name)}
+    logger.info(f"Updating the knowledge base: {len(delta.removed)} triples removed, {len(delta.added)} added, "
+                f"{len(persons)} persons changed")
+
+    response = _client.update(delta.to_update() + ' ;\n' + sparql_queries.get_materialization_update(),
+                              update_endpoint)
+    if persons == delta.subjects and not any(delta.changes[person] & MATCHED_PREDICATES for person in persons):
+        _result_cache.invalidate(lambda key, contacts: any(contact.name in names for contact in contacts))
+    else:
+        invalidate_caches()
+    if response.status_code not in (200, 204):
+        raise Exception(f"Error: HTTP {response.status_code}: {response.text}")
+    _after_change()
+    return sorted(names)
+
+
+def _dump_format(format_type: str) -> str:
+    format_type_lower = format_type.lower()
+    if format_type_lower not in DUMP_CONTENT_TYPES:
+        raise ValueError(f"The format type must be one of {', '.join(DUMP_CONTENT_TYPES.keys())}.")
+    return format_type_lower
+
+
+def _dump_endpoint(format_type: str) -> str:
+    return FUSEKI_DATASET_ENDPOINT if format_type in QUAD_FORMATS else FUSEKI_DATA_ENDPOINT
+
+
+def export_db(target, format_type='ntriples', compress=None, validate=False, endpoint=None,
+              chunk_size=rdf_stream.CHUNK_SIZE):
+    """
+    Streams the DB from a Fuseki endpoint in the specified format to a file, without holding the whole dataset in
+    memory like get_db(). The dump is written as received from Fuseki, in chunks of 'chunk_size' bytes.
+
+    :param target: The path of the dump file or a binary file object. A file is only replaced once the whole dump
+        has been written, e.g. for KB_DUMP_FILE, which is watched by the embedded knowledge base.
+    :param format_type: The desired format (one of DUMP_CONTENT_TYPES) as a string. 'nquads' dumps all graphs of
+        the dataset.
+    :param compress: Whether to gzip the dump, by default if 'target' is a path ending with '.gz'
+    :param validate: Whether to validate an 'ntriples' or 'nquads' dump while it is written. A ValueError is raised
+        for an invalid line, and a dump file is left unchanged. Only the lines before it have been written to a file
+        object.
+    :param endpoint: The Fuseki endpoint (URL) as a string, by default the one for the format
+
+    :return: The number of bytes of the (uncompressed) dump
+    """
+    format_type_lower = _dump_format(format_type)
+    headers = {'Accept': DUMP_CONTENT_TYPES[format_type_lower]}
+
+    response = _client.get(endpoint or _dump_endpoint(format_type_lower), headers=headers, stream=True)
+    with response:
+        if response.status_code != 200:
+            raise Exception(f"Error: HTTP {response.status_code}: {response.text}")
+        chunks = _client.iter_content(response, chunk_size)
+        if validate and format_type_lower in rdf_stream.LINE_FORMATS:
+            chunks = rdf_stream.validate_lines(rdf_stream.iter_lines(chunks), format_type_lower)
+        size = 0
+        with rdf_stream.open_target(target, compress) as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+    return size
+
+
+def import_db(source, format_type='ntriples', validate=True, endpoint=None, update_endpoint=FUSEKI_UPDATE_ENDPOINT,
+              chunk_size=rdf_stream.CHUNK_SIZE):
+    """
+    Uploads a dump to a Fuseki endpoint using PUT, replacing the existing data, like update_db(). The dump is read
+    and uploaded in chunks of 'chunk_size' bytes, so it is never held in memory as a whole, and gzip-compressed
+    dumps are decompressed on the fly.
+
+    :param source: The path of the dump file or a binary file object
+    :param format_type: The format of the dump (one of DUMP_CONTENT_TYPES) as a string. An 'nquads' dump replaces
+        all graphs of the dataset.
+    :param validate: Whether to validate an 'ntriples' or 'nquads' dump while it is uploaded. At the first invalid
+        line, a ValueError is raised and the upload is aborted, so Fuseki discards the partial upload. Dumps in
+        other formats are validated by Fuseki only.
+    :param endpoint: The Fuseki endpoint (URL) as a string, by default the one for the format
+    :param update_endpoint: The Fuseki SPARQL update endpoint (URL) as a string
+    """
+    format_type_lower = _dump_format(format_type)
+    headers = {'Content-Type': DUMP_CONTENT_TYPES[format_type_lower]}
+
+    with rdf_stream.open_source(source) as f:
+        chunks = rdf_stream.iter_chunks(f, chunk_size)
+        if validate and format_type_lower in rdf_stream.LINE_FORMATS:
+            chunks = _rechunk(rdf_stream.validate_lines(rdf_stream.iter_lines(chunks), format_type_lower),
+                              chunk_size)
+        response = _client.put(endpoint or _dump_endpoint(format_type_lower), headers=headers, data=chunks)
+    _after_replace(response, update_endpoint)
+
+
+def _rechunk(lines, chunk_size: int):
+    """Join 'lines' into chunks of about 'chunk_size' bytes, instead of uploading each line as a chunk."""
+    chunk = []
+    size = 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield b''.join(chunk)
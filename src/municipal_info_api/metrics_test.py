@@ -0,0 +1,68 @@
+import unittest
+
+import info_api
+import metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_counter(self):
+        counter = metrics.Counter('test_total', 'Test counter', ['kind'])
+        counter.inc(kind='a')
+        counter.inc(2, kind='a')
+        counter.inc(kind='b "quoted"')
+        self.assertEqual(3, counter.value(kind='a'))
+        self.assertEqual('# HELP test_total Test counter\n'
+                         '# TYPE test_total counter\n'
+                         'test_total{kind="a"} 3\n'
+                         'test_total{kind="b \\"quoted\\""} 1\n', counter.render())
+        with self.assertRaises(ValueError):
+            counter.inc(other='a')
+
+    def test_histogram(self):
+        histogram = metrics.Histogram('test_seconds', 'Test histogram', buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        self.assertEqual(['# HELP test_seconds Test histogram',
+                          '# TYPE test_seconds histogram',
+                          'test_seconds_bucket{le="0.1"} 1',
+                          'test_seconds_bucket{le="1"} 2',
+                          'test_seconds_bucket{le="+Inf"} 3',
+                          'test_seconds_sum 5.55',
+                          'test_seconds_count 3'], histogram.render().splitlines())
+
+    def test_histogram_time(self):
+        histogram = metrics.Histogram('test_seconds', 'Test histogram', ['function'])
+
+        @histogram.time(function='f')
+        def f():
+            return 1
+
+        self.assertEqual(1, f())
+        f()
+        with histogram.time(function='g'):
+            pass
+        self.assertEqual(2, histogram.count(function='f'))
+        self.assertEqual(1, histogram.count(function='g'))
+
+    def test_registry(self):
+        registry = metrics.Registry()
+        registry.register(metrics.FunctionMetric('test_size', 'Test gauge', ['cache'], lambda: {('a',): 2}))
+        self.assertEqual('# HELP test_size Test gauge\n# TYPE test_size gauge\ntest_size{cache="a"} 2\n',
+                         registry.render())
+        with self.assertRaises(ValueError):
+            registry.register(metrics.Counter('test_size', 'Test counter'))
+
+    def test_lookup_metrics(self):
+        count = info_api.LOOKUP_DURATION.count(kind='names')
+        info_api.get_all_names()
+        self.assertEqual(count + 1, info_api.LOOKUP_DURATION.count(kind='names'))
+        status, content_type, body = metrics.metrics_route()
+        self.assertEqual(200, status)
+        self.assertIn('kb_lookup_duration_seconds_count{kind="names"}', body)
+        self.assertIn('kb_cache_hits_total{cache="lists"}', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Message-of-the-day (MOTD) index for the action 'action_get_motd'. The MOTD file is read once into an index from
+(date, language) to the JSON payload of the action, expanded from the date ranges of the file, plus the payload of
+the default messages for each language. The index is rebuilt only when the modification time of the file changes.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import date, timedelta
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+MOTD_FILE = os.environ.get('MOTD_FILE', 'data/motd/motd.yml')
+
+
+def serialize(language: str, messages: list) -> str:
+    return json.dumps({"motd": {"language": language, "motd": messages}}, ensure_ascii=False)
+
+
+class MotdIndex:
+    """Pre-serialized MOTD payloads by date and language. All messages of the date ranges containing a date are
+    returned in the order of the MOTD file. Dates without such messages get the default messages."""
+
+    def __init__(self, path: str = MOTD_FILE):
+        self.path = path
+        self._mtime = None
+        self._payloads = {}     # (date, language) -> payload
+        self._defaults = {}     # language -> payload
+        self._lock = threading.Lock()
+
+    def _build(self, motd_dict: dict) -> tuple:
+        messages = {}
+        default_messages = {}
+        for item in motd_dict['motd']:
+            if 'date_range' in item:
+                day = item['date_range']['start']
+                while day <= item['date_range']['end']:
+                    for language, language_messages in item['messages'].items():
+                        messages.setdefault((day, language), []).extend(language_messages)
+                    day += timedelta(days=1)
+            elif 'default' in item:
+                for language, language_messages in item['messages'].items():
+                    default_messages.setdefault(language, []).extend(language_messages)
+        payloads = {key: serialize(key[1], m) for key, m in messages.items()}
+        defaults = {language: serialize(language, m) for language, m in default_messages.items()}
+        return payloads, defaults
+
+    def reload_if_changed(self) -> bool:
+        """Rebuild the index if the MOTD file has changed since it was read. Returns True if it was rebuilt."""
+        mtime = os.stat(self.path).st_mtime
+        if mtime == self._mtime:
+            return False
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            with open(self.path, 'r') as stream:
+                motd_dict = yaml.safe_load(stream)
+            self._payloads, self._defaults = self._build(motd_dict)
+            self._mtime = mtime
+            logger.info(f"Loaded MOTD index from {self.path}: {len(self._payloads)} dated entries")
+            return True
+
+    def get(self, day: date, language: str) -> str:
+        """The JSON payload with the MOTD for 'day' in 'language'."""
+        self.reload_if_changed()
+        payload = self._payloads.get((day, language))
+        if payload is None:
+            payload = self._defaults.get(language) or serialize(language, [])
+        return payload
+
+
+_index = MotdIndex()
+
+
+def get_motd(day: date, language: str) -> str:
+    return _index.get(day, language)
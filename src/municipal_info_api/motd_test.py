@@ -0,0 +1,66 @@
+from datetime import date
+import json
+import os
+import tempfile
+import unittest
+
+from motd import MotdIndex
+
+MOTD_YAML = """
+motd:
+  - date_range:
+      start: 2023-04-24
+      end: 2023-04-26
+    messages:
+      is-IS:
+        - Vika 1
+  - date_range:
+      start: 2023-04-26
+      end: 2023-04-26
+    messages:
+      is-IS:
+        - Miðvikudagur
+      en-EN:
+        - Wednesday
+  - default:
+    messages:
+      is-IS:
+        - Góðan dag!
+"""
+
+
+class TestMotdIndex(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.yml')
+        with os.fdopen(fd, 'w') as f:
+            f.write(MOTD_YAML)
+        self.index = MotdIndex(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def motd(self, day, language):
+        return json.loads(self.index.get(day, language))['motd']['motd']
+
+    def test_date_ranges(self):
+        self.assertEqual(['Vika 1'], self.motd(date(2023, 4, 25), 'is-IS'))
+        self.assertEqual(['Vika 1', 'Miðvikudagur'], self.motd(date(2023, 4, 26), 'is-IS'))
+        self.assertEqual(['Wednesday'], self.motd(date(2023, 4, 26), 'en-EN'))
+
+    def test_default(self):
+        self.assertEqual(['Góðan dag!'], self.motd(date(2023, 4, 27), 'is-IS'))
+        self.assertEqual([], self.motd(date(2023, 4, 27), 'en-EN'))
+
+    def test_reload_on_change(self):
+        self.assertEqual(['Vika 1'], self.motd(date(2023, 4, 24), 'is-IS'))
+        self.assertFalse(self.index.reload_if_changed())
+        with open(self.path, 'w') as f:
+            f.write(MOTD_YAML.replace('Vika 1', 'Vika 17'))
+        mtime = os.stat(self.path).st_mtime
+        os.utime(self.path, (mtime + 1, mtime + 1))
+        self.assertEqual(['Vika 17'], self.motd(date(2023, 4, 24), 'is-IS'))
+
+
+if __name__ == '__main__':
+    unittest.main()
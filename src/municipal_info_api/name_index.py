@@ -0,0 +1,132 @@
+"""
+Indexes over the staff names in the knowledge base, used to validate contacts:
+- InflectionIndex: reverse index from the inflected forms of staff names to the canonical full names. All singular
+  case forms of every name part are generated beforehand via BÍN and the patro-/matronym rules of 'declension', so
+  that resolving a declined name like 'Birni Jónssyni' is a single dictionary lookup.
+- TokenIndex: inverted index from full names and name tokens to contacts, to match nominative names against the
+  staff list without scanning it.
+"""
+import itertools
+import threading
+
+import declension
+
+
+def normalize_key(name: str) -> str:
+    return ' '.join(declension.normalize(name).lower().split())
+
+
+def generate_surface_forms(full_name: str) -> set:
+    """All surface forms under which 'full_name' is found: the full name in each case, with all parts in the
+    same case, and each name part on its own in any case. Forms are normalized via normalize_key()."""
+
+    part_forms = [declension.get_name_forms(part) for part in full_name.split()]
+    forms = set()
+    for case in declension.CASES_SG:
+        for combination in itertools.product(*[f[case] for f in part_forms]):
+            forms.add(normalize_key(' '.join(combination)))
+    for f in part_forms:
+        for case_forms in f.values():
+            for form in case_forms:
+                forms.add(normalize_key(form))
+    return forms
+
+
+class InflectionIndex:
+    """Maps surface forms to the set of full names they might refer to. Matches have the same semantics as the
+    original contact validation: a form either refers to a whole name or to one of its parts. The index can be
+    refreshed by one thread, e.g. the warm-up, while other threads look up names."""
+
+    def __init__(self):
+        self._names = {}     # full name -> its surface forms
+        self._forms = {}     # surface form -> full names
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, full_name: str):
+        with self._lock:
+            if full_name in self._names:
+                return
+            forms = generate_surface_forms(full_name)
+            self._names[full_name] = forms
+            for form in forms:
+                self._forms.setdefault(form, set()).add(full_name)
+
+    def remove(self, full_name: str):
+        with self._lock:
+            for form in self._names.pop(full_name, ()):
+                names = self._forms[form]
+                names.discard(full_name)
+                if not names:
+                    del self._forms[form]
+
+    def refresh(self, names: list) -> tuple:
+        """Update the index to contain exactly 'names'. Only names that have been added or removed since the last
+        refresh are processed. Returns the sets of added and removed names."""
+        with self._lock:
+            names = set(names)
+            added = names - self._names.keys()
+            removed = self._names.keys() - names
+            for name in removed:
+                self.remove(name)
+            for name in added:
+                self.add(name)
+            return added, removed
+
+    def lookup(self, surface_form: str) -> set:
+        """Full names 'surface_form' might refer to."""
+        key = normalize_key(surface_form)
+        with self._lock:
+            return set(self._forms.get(key, ()))
+
+
+class TokenIndex:
+    """Inverted index from full names and their whitespace separated tokens to contact IDs, the positions of the
+    contacts in the list the index is built from. A name matches a contact if it is equal to either the whole name
+    or any of its parts."""
+
+    def __init__(self, names: list):
+        self.names = list(names)
+        self._ids = {}
+        for contact_id, name in enumerate(self.names):
+            self._ids.setdefault(name, set()).add(contact_id)
+            for part_name in name.split():
+                self._ids.setdefault(part_name, set()).add(contact_id)
+
+    def ids(self, name: str) -> set:
+        return self._ids.get(name, set())
+
+    def match(self, names: list, restrict_to: list = None) -> list:
+        """Contacts matching any of 'names'. If 'restrict_to' is given, only those of its contacts are returned."""
+        ids = set()
+        for name in names:
+            ids |= self.ids(name)
+        if restrict_to is not None:
+            allowed = set()
+            for contact in restrict_to:
+                allowed |= {i for i in self.ids(contact) if self.names[i] == contact}
+            ids &= allowed
+        return [self.names[i] for i in sorted(ids)]
+
+
+_inflection_index = InflectionIndex()
+_token_index = TokenIndex([])
+
+
+def get_inflection_index(names: list) -> InflectionIndex:
+    """The inflection index shared by the actions, refreshed to contain exactly 'names', e.g. all contact names
+    of the knowledge base."""
+    _inflection_index.refresh(names)
+    return _inflection_index
+
+
+def get_token_index(names: list) -> TokenIndex:
+    """The token index shared by the actions, rebuilt if 'names' differ from the names it was built from."""
+    global _token_index
+    index = _token_index
+    if index.names != names:
+        index = TokenIndex(names)
+        _token_index = index
+    return index
@@ -0,0 +1,73 @@
+from name_index import InflectionIndex, TokenIndex
+import threading
+import unittest
+
+
+class TestInflectionIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = InflectionIndex()
+        self.index.refresh(['Björn Jónsson', 'Anna Jóna Árnadóttir', 'Ingibjörg Stefánsdóttir',
+                            'Ingibjörg Kristjánsdóttir'])
+
+    def test_declined_full_name(self):
+        self.assertEqual({'Björn Jónsson'}, self.index.lookup('Birni Jónssyni'))
+        self.assertEqual({'Björn Jónsson'}, self.index.lookup('bjarnar jónssonar'))
+        self.assertEqual({'Anna Jóna Árnadóttir'}, self.index.lookup('Önnu Jónu Árnadóttur'))
+
+    def test_declined_name_part(self):
+        self.assertEqual({'Ingibjörg Stefánsdóttir', 'Ingibjörg Kristjánsdóttir'}, self.index.lookup('Ingibjörgu'))
+        self.assertEqual({'Ingibjörg Stefánsdóttir'}, self.index.lookup('Stefánsdóttur'))
+
+    def test_partial_name(self):
+        """Like the contact validation, only whole names or single name parts are matched."""
+        self.assertEqual(set(), self.index.lookup('Önnu Jónu'))
+
+    def test_refresh(self):
+        added, removed = self.index.refresh(['Björn Jónsson', 'Hildur Hallsdóttir'])
+        self.assertEqual({'Hildur Hallsdóttir'}, added)
+        self.assertEqual({'Anna Jóna Árnadóttir', 'Ingibjörg Stefánsdóttir', 'Ingibjörg Kristjánsdóttir'}, removed)
+        self.assertEqual({'Hildur Hallsdóttir'}, self.index.lookup('Hildi'))
+        self.assertEqual(set(), self.index.lookup('Önnu'))
+        self.assertEqual(2, len(self.index))
+
+    def test_lookup_during_refresh(self):
+        """Lookups see the index either before or after a concurrent refresh."""
+        names = ['Ingibjörg Stefánsdóttir', 'Ingibjörg Kristjánsdóttir']
+        done = threading.Event()
+
+        def refresh():
+            for i in range(50):
+                self.index.refresh(names[:i % 2 + 1])
+            done.set()
+
+        thread = threading.Thread(target=refresh)
+        thread.start()
+        while not done.is_set():
+            self.assertIn(self.index.lookup('Ingibjörgu'), [set(names[:1]), set(names)])
+        thread.join()
+
+
+class TestTokenIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TokenIndex(['Anna Jóna Árnadóttir', 'Jóhanna Elín Björnsdóttir', 'Ingibjörg Stefánsdóttir',
+                                 'Ingibjörg Kristjánsdóttir'])
+
+    def test_match(self):
+        self.assertEqual(['Anna Jóna Árnadóttir'], self.index.match(['Jóna']))
+        self.assertEqual(['Anna Jóna Árnadóttir'], self.index.match(['Anna Jóna Árnadóttir']))
+        self.assertEqual(['Ingibjörg Stefánsdóttir', 'Ingibjörg Kristjánsdóttir'], self.index.match(['Ingibjörg']))
+        self.assertEqual([], self.index.match(['Anna Jóna', 'Jóh']))
+
+    def test_match_any_candidate(self):
+        self.assertEqual(['Anna Jóna Árnadóttir', 'Jóhanna Elín Björnsdóttir'],
+                         self.index.match(['Elín', 'Árnadóttir', 'Birnir']))
+
+    def test_restrict_to(self):
+        self.assertEqual(['Ingibjörg Kristjánsdóttir'],
+                         self.index.match(['Ingibjörg'], restrict_to=['Ingibjörg Kristjánsdóttir']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Triple-level differences between two versions of the knowledge graph, see info_api.update_db_delta(). The blank
+nodes of both versions, like the vcard:hasTelephone nodes of the contacts, are canonicalized first: each blank node
+is labelled with a hash of the triple it hangs from and of its own triples, so that an unchanged telephone node has
+the same label in both versions, and a changed one shows up as a removed and an added node.
+
+Blank nodes can't be deleted via DELETE DATA, and would be created anew by an INSERT DATA. The SPARQL update of a
+Delta therefore deletes removed blank nodes via a DELETE/WHERE pattern of their triples, everything else via
+DELETE DATA and INSERT DATA.
+"""
+import hashlib
+from collections import defaultdict
+
+from rdflib import BNode, Graph, URIRef
+
+# Label prefix of canonicalized blank nodes
+CANONICAL_PREFIX = 'c'
+
+
+def _canonical_labels(graph: Graph) -> dict:
+    """Canonical labels of the blank nodes of 'graph', by blank node. Blank nodes hanging from other blank nodes are
+    labelled by their own triples only."""
+    parents = defaultdict(list)
+    for s, p, o in graph:
+        if isinstance(o, BNode):
+            parents[o].append((s, p))
+    labels = {}
+
+    def label(node: BNode, path: tuple = ()) -> str:
+        if node in labels:
+            return labels[node]
+        if node in path:
+            # a cycle of blank nodes, the node is identified by its position in the cycle only
+            return f'{CANONICAL_PREFIX}cycle{path.index(node)}'
+        path = path + (node,)
+        content = sorted(f'{p.n3()} {label(o, path) if isinstance(o, BNode) else o.n3()}'
+                         for p, o in graph.predicate_objects(node))
+        anchors = sorted(f'{s.n3()} {p.n3()}' for s, p in parents[node] if not isinstance(s, BNode))
+        digest = hashlib.sha1('\n'.join(anchors + ['|'] + content).encode('utf-8')).hexdigest()
+        labels[node] = f'{CANONICAL_PREFIX}{digest}'
+        return labels[node]
+
+    for node in set(graph.all_nodes()):
+        if isinstance(node, BNode):
+            label(node)
+    return labels
+
+
+def canonical_triples(graph: Graph, ignore_namespaces: tuple = ()) -> set:
+    """The triples of 'graph' with canonicalized blank nodes, without those whose predicate is in one of
+    'ignore_namespaces'."""
+    labels = _canonical_labels(graph)
+    triples = set()
+    for s, p, o in graph:
+        if str(p).startswith(ignore_namespaces):
+            continue
+        triples.add((BNode(labels[s]) if isinstance(s, BNode) else s, p,
+                     BNode(labels[o]) if isinstance(o, BNode) else o))
+    return triples
+
+
+def _has_bnode(triple: tuple) -> bool:
+    return isinstance(triple[0], BNode) or isinstance(triple[2], BNode)
+
+
+class Delta:
+    """Canonical triples that are 'removed' from and 'added' to a graph. 'changes' are the predicates of the changed
+    triples by subject, a changed blank node counts as a change of the subject and the predicate it hangs from, e.g.
+    vcard:hasTelephone of a person."""
+
+    def __init__(self, removed: set, added: set):
+        self.removed = removed
+        self.added = added
+        self.changes = defaultdict(set)
+        for triples in (removed, added):
+            owners = self._owners(triples)
+            for s, p, o in triples:
+                if isinstance(s, BNode):
+                    if s in owners:
+                        subject, predicate = owners[s]
+                        self.changes[subject].add(predicate)
+                else:
+                    self.changes[s].add(p)
+
+    @staticmethod
+    def _owners(triples: set) -> dict:
+        """The first subject that isn't a blank node and its predicate, for the blank nodes of 'triples'."""
+        parents = {o: (s, p) for s, p, o in triples if isinstance(o, BNode)}
+        owners = {}
+        for node in parents:
+            s, p = parents[node]
+            seen = {node}
+            while isinstance(s, BNode) and s in parents and s not in seen:
+                seen.add(s)
+                s, p = parents[s]
+            if not isinstance(s, BNode):
+                owners[node] = (s, p)
+        return owners
+
+    def __bool__(self) -> bool:
+        return bool(self.removed or self.added)
+
+    @property
+    def subjects(self) -> set:
+        """The changed subjects, without blank nodes."""
+        return {s for s in self.changes if isinstance(s, URIRef)}
+
+    def to_update(self) -> str:
+        """The SPARQL update applying the delta. Empty if there are no changes."""
+        operations = []
+        removed_plain = sorted(t for t in self.removed if not _has_bnode(t))
+        if removed_plain:
+            operations.append('DELETE DATA {\n' + _triples(removed_plain) + '\n}')
+        operations += [_delete_pattern(triples) for triples in _bnode_groups(self.removed)]
+        if self.added:
+            operations.append('INSERT DATA {\n' + _triples(sorted(self.added)) + '\n}')
+        return ' ;\n'.join(operations)
+
+
+def _term(term, variables: dict = None) -> str:
+    if isinstance(term, BNode):
+        if variables is not None:
+            return variables.setdefault(term, f'?b{len(variables)}')
+        return f'_:{term}'
+    return term.n3()
+
+
+def _triples(triples: list, variables: dict = None) -> str:
+    return '\n'.join(f'    {_term(s, variables)} {_term(p)} {_term(o, variables)} .' for s, p, o in triples)
+
+
+def _bnode_groups(triples: set) -> list:
+    """The triples with blank nodes of 'triples', grouped by connected blank nodes, e.g. the triples of a telephone
+    node and the triple it hangs from."""
+    groups = []
+    for triple in sorted(t for t in triples if _has_bnode(t)):
+        nodes = {n for n in (triple[0], triple[2]) if isinstance(n, BNode)}
+        connected = [group for group in groups if group[0] & nodes]
+        merged = (nodes.union(*(group[0] for group in connected)),
+                  [t for group in connected for t in group[1]] + [triple])
+        groups = [group for group in groups if not any(group is c for c in connected)] + [merged]
+    return [sorted(group_triples) for _, group_triples in groups]
+
+
+def _delete_pattern(triples: list) -> str:
+    """DELETE/WHERE deleting the blank nodes of 'triples', matched via their triples."""
+    pattern = _triples(triples, {})
+    return 'DELETE {\n' + pattern + '\n}\nWHERE {\n' + pattern + '\n}'
+
+
+def diff(old: Graph, new: Graph, ignore_namespaces: tuple = ()) -> Delta:
+    """The Delta turning 'old' into 'new', ignoring triples whose predicate is in one of 'ignore_namespaces', e.g.
+    materialized triples."""
+    old_triples = canonical_triples(old, ignore_namespaces)
+    new_triples = canonical_triples(new, ignore_namespaces)
+    return Delta(old_triples - new_triples, new_triples - old_triples)
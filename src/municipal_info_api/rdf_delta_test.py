@@ -0,0 +1,68 @@
+import os
+import unittest
+
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import FOAF, Namespace
+
+import embedded_kb
+import rdf_delta
+import sparql_queries
+
+VCARD = Namespace('http://www.w3.org/2006/vcard/ns#')
+ANDABAER = Namespace('https://grammatek.com/munic/andabaer#')
+
+
+def load() -> Graph:
+    graph = Graph()
+    graph.parse(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'offices_staff.rdf'))
+    return graph
+
+
+class TestRdfDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.old = load()
+        self.new = load()
+
+    def diff(self) -> rdf_delta.Delta:
+        return rdf_delta.diff(self.old, self.new, sparql_queries.MATERIALIZED_NAMESPACES)
+
+    def person_with_phone(self) -> URIRef:
+        return self.new.value(predicate=FOAF.name, object=Literal('Erla Jónsdóttir'))
+
+    def test_unchanged(self):
+        """Blank nodes get the same canonical labels in both versions, materialized triples are ignored."""
+        embedded_kb.materialize(self.old)
+        delta = self.diff()
+        self.assertFalse(delta)
+        self.assertEqual('', delta.to_update())
+
+    def test_changed_phone(self):
+        person = self.person_with_phone()
+        self.new.set((self.new.value(person, VCARD.hasTelephone), VCARD.hasValue, Literal('555 1234')))
+        delta = self.diff()
+        self.assertEqual(2, len(delta.removed))
+        self.assertEqual(2, len(delta.added))
+        self.assertEqual({person}, delta.subjects)
+        self.assertEqual({VCARD.hasTelephone}, delta.changes[person])
+
+        self.old.update(delta.to_update())
+        self.assertFalse(self.diff())
+        self.assertEqual(len(self.new), len(self.old))
+
+    def test_changed_email_and_title(self):
+        hildur = ANDABAER.HildurHallsdottir
+        self.new.set((hildur, FOAF.mbox, Literal('hildur.hallsdottir@andabaer.is')))
+        self.new.add((hildur, FOAF.title, Literal('leikskólastjóri')))
+        erla = self.person_with_phone()
+        self.new.remove((self.new.value(erla, VCARD.hasTelephone), None, None))
+        self.new.remove((erla, None, None))
+        delta = self.diff()
+        self.assertEqual({FOAF.mbox, FOAF.title}, delta.changes[hildur])
+        self.assertIn('DELETE DATA', delta.to_update())
+
+        self.old.update(delta.to_update())
+        self.assertFalse(self.diff())
+        # the telephone node of the removed person is deleted as well
+        self.assertEqual(len(self.new), len(self.old))
+        self.assertEqual(5, len(list(self.old.subject_objects(VCARD.hasValue))))
@@ -0,0 +1,159 @@
+"""
+Streaming of knowledge base dumps, see info_api.export_db() and info_api.import_db(). Dumps are read and written in
+chunks, and gzip-compressed dumps are (de)compressed on the fly, so that backups and restores of large datasets run
+in bounded memory. Dumps in the line-based formats N-Triples and N-Quads can be validated while they stream, in
+batches of VALIDATION_BATCH_SIZE lines.
+"""
+import gzip
+import os
+import uuid
+from contextlib import contextmanager
+from typing import BinaryIO, Iterable, Iterator, Union
+
+from rdflib import ConjunctiveGraph, Graph
+from rdflib.util import guess_format
+
+CHUNK_SIZE = int(os.environ.get('KB_DUMP_CHUNK_SIZE', str(64 * 1024)))
+VALIDATION_BATCH_SIZE = 10000
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Line-based formats by the format types of info_api, and the corresponding rdflib formats
+LINE_FORMATS = {
+    'ntriples': 'nt',
+    'nquads': 'nquads',
+}
+
+
+def _is_gzip(file: BinaryIO) -> bool:
+    if hasattr(file, 'peek'):
+        return file.peek(len(GZIP_MAGIC))[:len(GZIP_MAGIC)] == GZIP_MAGIC
+    position = file.tell()
+    head = file.read(len(GZIP_MAGIC))
+    file.seek(position)
+    return head == GZIP_MAGIC
+
+
+@contextmanager
+def open_source(source: Union[str, BinaryIO]) -> Iterator[BinaryIO]:
+    """Open 'source', a path or a binary file object, for reading. Gzip-compressed data is decompressed, regardless
+    of the file name. File objects need to be seekable or support peek(), like io.BufferedReader."""
+    is_path = isinstance(source, (str, os.PathLike))
+    file = open(source, 'rb') if is_path else source
+    try:
+        if _is_gzip(file):
+            with gzip.GzipFile(fileobj=file, mode='rb') as decompressed:
+                yield decompressed
+        else:
+            yield file
+    finally:
+        if is_path:
+            file.close()
+
+
+@contextmanager
+def open_target(target: Union[str, BinaryIO], compress: bool = None) -> Iterator[BinaryIO]:
+    """Open 'target', a path or a binary file object, for writing. The data is gzip-compressed if 'compress' is set,
+    by default if 'target' is a path ending with '.gz'. A path is written via a temporary file in the same directory,
+    which replaces 'target' only once all data has been written, so that readers of 'target', like the embedded
+    knowledge base, never see a partially written file. On errors, the temporary file is removed."""
+    is_path = isinstance(target, (str, os.PathLike))
+    if compress is None:
+        compress = is_path and os.fspath(target).endswith('.gz')
+    if is_path:
+        temp_path = f'{os.fspath(target)}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+        file = open(temp_path, 'wb')
+    else:
+        file = target
+    try:
+        if compress:
+            with gzip.GzipFile(fileobj=file, mode='wb') as compressed:
+                yield compressed
+        else:
+            yield file
+        if is_path:
+            file.close()
+            os.replace(temp_path, target)
+    finally:
+        if is_path:
+            file.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def iter_chunks(file: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Split a stream of chunks into lines, including their line endings."""
+    rest = b''
+    for chunk in chunks:
+        lines = (rest + chunk).splitlines(keepends=True)
+        # the last line may continue in the next chunk, even if it ends with '\r' of a '\r\n'
+        rest = lines.pop() if lines and not lines[-1].endswith(b'\n') else b''
+        yield from lines
+    if rest:
+        yield rest
+
+
+def _parse(lines: list, rdf_format: str):
+    data = b''.join(lines).decode('utf-8')
+    (ConjunctiveGraph() if rdf_format == 'nquads' else Graph()).parse(data=data, format=rdf_format)
+
+
+def validate_lines(lines: Iterable[bytes], format_type: str,
+                   batch_size: int = VALIDATION_BATCH_SIZE) -> Iterator[bytes]:
+    """Pass through the lines of an N-Triples or N-Quads dump, validating them in batches of 'batch_size' lines.
+    Raises a ValueError with the number of the first invalid line, before any line of its batch is passed on."""
+    rdf_format = LINE_FORMATS[format_type]
+    batch = []
+    line_number = 0
+
+    def checked(batch: list, first_line: int) -> list:
+        try:
+            _parse(batch, rdf_format)
+        except Exception:
+            # find the invalid line of the batch
+            for i, line in enumerate(batch):
+                try:
+                    _parse([line], rdf_format)
+                except Exception as e:
+                    raise ValueError(f"Invalid {format_type} in line {first_line + i}: {e}") from e
+            raise
+        return batch
+
+    for line in lines:
+        line_number += 1
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield from checked(batch, line_number - len(batch) + 1)
+            batch = []
+    if batch:
+        yield from checked(batch, line_number - len(batch) + 1)
+
+
+def rdf_format(path: str) -> str:
+    """The rdflib format of a dump file, from its name without a '.gz' extension."""
+    if path.endswith('.gz'):
+        path = path[:-3]
+    return guess_format(path) or 'xml'
+
+
+def load_graph(path: str) -> Graph:
+    """Load a dump file into a Graph, decompressing it if needed. The triples of all graphs of an N-Quads dump are
+    loaded into the one graph."""
+    graph = Graph()
+    with open_source(path) as f:
+        if rdf_format(path) == 'nquads':
+            dataset = ConjunctiveGraph()
+            dataset.parse(f, format='nquads')
+            for triple in dataset.triples((None, None, None)):
+                graph.add(triple)
+        else:
+            graph.parse(f, format=rdf_format(path))
+    return graph
@@ -0,0 +1,81 @@
+import gzip
+import io
+import os
+import tempfile
+import unittest
+
+import rdf_stream
+
+NTRIPLES = (b'<urn:a> <urn:name> "J\xc3\xb3n" .\r\n'
+            b'<urn:a> <urn:knows> <urn:b> .\n'
+            b'<urn:b> <urn:name> "Gu\xc3\xb0r\xc3\xban" .\n')
+
+
+class TestRdfStream(unittest.TestCase):
+
+    def test_iter_lines(self):
+        # lines and '\r\n' line endings split across chunks
+        chunks = [NTRIPLES[i:i + 5] for i in range(0, len(NTRIPLES), 5)]
+        self.assertEqual(NTRIPLES.splitlines(keepends=True), list(rdf_stream.iter_lines(chunks)))
+        self.assertEqual([b'a\r\n', b'b'], list(rdf_stream.iter_lines([b'a\r', b'\nb'])))
+
+    def test_validate_lines(self):
+        lines = NTRIPLES.splitlines(keepends=True)
+        self.assertEqual(lines, list(rdf_stream.validate_lines(lines, 'ntriples', batch_size=2)))
+        quads = [b'<urn:a> <urn:name> "Anna" <urn:graph> .\n', b'<urn:a> <urn:name> "Anna" .\n']
+        self.assertEqual(quads, list(rdf_stream.validate_lines(quads, 'nquads')))
+
+    def test_validate_lines_invalid(self):
+        lines = NTRIPLES.splitlines(keepends=True) + [b'<urn:b> <urn:knows> .\n']
+        passed = []
+        with self.assertRaisesRegex(ValueError, 'line 4'):
+            for line in rdf_stream.validate_lines(lines, 'ntriples', batch_size=2):
+                passed.append(line)
+        # the lines of the invalid batch are not passed on
+        self.assertEqual(lines[:2], passed)
+
+    def test_open_source_gzip(self):
+        with rdf_stream.open_source(io.BytesIO(gzip.compress(NTRIPLES))) as f:
+            self.assertEqual(NTRIPLES, f.read())
+        with rdf_stream.open_source(io.BytesIO(NTRIPLES)) as f:
+            self.assertEqual(NTRIPLES, f.read())
+
+    def test_gzip_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'kb.nt.gz')
+            with rdf_stream.open_target(path) as f:
+                for chunk in rdf_stream.iter_chunks(io.BytesIO(NTRIPLES), chunk_size=7):
+                    f.write(chunk)
+            with open(path, 'rb') as f:
+                self.assertEqual(rdf_stream.GZIP_MAGIC, f.read(2))
+            with rdf_stream.open_source(path) as f:
+                self.assertEqual(NTRIPLES, f.read())
+            self.assertEqual(3, len(rdf_stream.load_graph(path)))
+
+    def test_open_target_replaces_file_when_complete(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'kb.nt')
+            with open(path, 'wb') as f:
+                f.write(NTRIPLES)
+            with self.assertRaises(ValueError):
+                with rdf_stream.open_target(path) as f:
+                    f.write(b'<urn:a> <urn:name> ')
+                    raise ValueError('Invalid ntriples in line 1')
+            # the previous file is kept and the temporary file removed
+            self.assertEqual(['kb.nt'], os.listdir(directory))
+            with open(path, 'rb') as f:
+                self.assertEqual(NTRIPLES, f.read())
+
+            with rdf_stream.open_target(path) as f:
+                f.write(NTRIPLES[:10])
+                with open(path, 'rb') as current:
+                    self.assertEqual(NTRIPLES, current.read())
+            with open(path, 'rb') as f:
+                self.assertEqual(NTRIPLES[:10], f.read())
+
+    def test_load_graph_nquads(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'kb.nq')
+            with open(path, 'wb') as f:
+                f.write(b'<urn:a> <urn:name> "Anna" <urn:graph> .\n<urn:b> <urn:name> "Bjarni" .\n')
+            self.assertEqual(2, len(rdf_stream.load_graph(path)))
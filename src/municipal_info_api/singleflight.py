@@ -0,0 +1,72 @@
+"""
+Coalescing of concurrent identical knowledge base lookups. While a lookup for a key is in flight, callers asking for
+the same key don't send another request but wait for the running one and receive its result, or its exception.
+Works for threads, e.g. the worker pool of the Fuseki client, and for coroutines of the action server.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time, see do() and ado(). 'shared' counts the callers that received the
+    result of a call made for another caller."""
+
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}        # key -> _Call of the running call
+        self._tasks = {}        # key -> asyncio.Task of the running coroutine
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable, *args) -> Any:
+        """Call 'func(*args)', unless a call for 'key' is already running in another thread. In that case, wait for
+        it and return its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, func: Callable[..., Awaitable], *args) -> Any:
+        """Async version of do(): await 'func(*args)', unless a coroutine for 'key' is already awaiting it. Must be
+        called from the event loop thread. The call runs in a task of its own, so a cancelled caller, e.g. of a
+        dropped request, doesn't cancel the call for the other callers."""
+        task = self._tasks.get(key)
+        if task is not None:
+            with self._lock:
+                self.shared += 1
+        else:
+            task = self._tasks[key] = asyncio.ensure_future(func(*args))
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # mark the exception as retrieved, in case all callers have been cancelled
+            task.exception()
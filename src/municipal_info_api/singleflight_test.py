@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import unittest
+
+from singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_are_coalesced(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def lookup():
+            calls.append(1)
+            release.wait(5)
+            return ['Jón Sigurðsson']
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('bæjarstjóri', lookup)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        while flight.shared < 4:
+            threading.Event().wait(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(1, len(calls))
+        self.assertEqual([['Jón Sigurðsson']] * 5, results)
+
+    def test_error_is_shared_and_not_kept(self):
+        flight = SingleFlight()
+
+        def failing():
+            raise ConnectionError('Fuseki is down')
+
+        with self.assertRaises(ConnectionError):
+            flight.do('bæjarstjóri', failing)
+        self.assertEqual(['Jón Sigurðsson'], flight.do('bæjarstjóri', lambda: ['Jón Sigurðsson']))
+
+    def test_async_calls_are_coalesced(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def lookup(title):
+            calls.append(title)
+            await asyncio.sleep(0.01)
+            return [title]
+
+        async def main():
+            return await asyncio.gather(*[flight.ado(('title', 'gjaldkeri'), lookup, 'gjaldkeri') for _ in range(5)],
+                                        flight.ado(('title', 'fulltrúi'), lookup, 'fulltrúi'))
+
+        results = asyncio.run(main())
+        self.assertEqual(['gjaldkeri', 'fulltrúi'], calls)
+        self.assertEqual([['gjaldkeri']] * 5 + [['fulltrúi']], results)
+        self.assertEqual(4, flight.shared)
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def lookup():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return ['Jón Sigurðsson']
+
+        async def main():
+            leader = asyncio.ensure_future(flight.ado('bæjarstjóri', lookup))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.ado('bæjarstjóri', lookup))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        self.assertEqual(['Jón Sigurðsson'], asyncio.run(main()))
+        self.assertEqual(1, len(calls))
+
+    def test_async_error_is_shared_and_not_kept(self):
+        flight = SingleFlight()
+
+        async def failing():
+            raise ConnectionError('Fuseki is down')
+
+        async def lookup():
+            return ['Jón Sigurðsson']
+
+        async def main():
+            results = await asyncio.gather(flight.ado('bæjarstjóri', failing), flight.ado('bæjarstjóri', failing),
+                                           return_exceptions=True)
+            return results, await flight.ado('bæjarstjóri', lookup)
+
+        errors, result = asyncio.run(main())
+        self.assertTrue(all(isinstance(e, ConnectionError) for e in errors))
+        self.assertEqual(['Jón Sigurðsson'], result)
+
+
+if __name__ == '__main__':
+    unittest.main()
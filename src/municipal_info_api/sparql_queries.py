@@ -1,9 +1,40 @@
 """
 SPARQL queries for the municipality RDF-knowledge base.
 Helper methods to prepare arguments, where needed, otherwise arguments are fed directly into the prepared
-queries.
+queries. Contacts and titles are looked up via the lookup keys materialized by 'lookup_keys.ru', which are matched
+exactly, arguments are converted into keys with lookup_key() and quoted as SPARQL strings. Titles, roles and names can
+also be searched in the full-text index of the dataset, see get_search_query(). The contact queries return the
+contact cards materialized by 'contact_cards.ru', see CONTACT_CARD.
 """
+import os
 import re
+import unicodedata
+from functools import lru_cache
+
+# SPARQL update materializing the lookup keys (key:name, key:firstName, key:givenName, key:familyName and key:title)
+LOOKUP_KEYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lookup_keys.ru')
+# SPARQL update materializing the contact cards (card:name, card:email, card:phone and card:title)
+CONTACT_CARDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'contact_cards.ru')
+# Updates applied whenever the data has been loaded or replaced, see get_materialization_update()
+MATERIALIZATION_FILES = (LOOKUP_KEYS_FILE, CONTACT_CARDS_FILE)
+# Namespaces of the materialized triples, which are derived from the data and not part of it
+MATERIALIZED_NAMESPACES = ('https://grammatek.com/munic/key#', 'https://grammatek.com/munic/card#')
+
+# Star pattern of the contact card of ?entity. All four values exist for each person, see 'contact_cards.ru'.
+CONTACT_CARD = """
+                ?entity card:name ?name ;
+                    card:email ?email ;
+                    card:phone ?phone ;
+                    card:title ?title ."""
+
+# Fields of the full-text index (see docker/fuseki/config.ttl) and their predicates
+SEARCH_FIELDS = {
+    'title': 'foaf:title',
+    'role': 'org:role',
+    'name': 'foaf:name',
+}
+# Query terms shorter than this only match exactly, longer ones also as a prefix and fuzzily, see lucene_query()
+MIN_FUZZY_LENGTH = 4
 
 
 def get_rdf_prefix() -> str:
@@ -18,38 +49,76 @@ def get_rdf_prefix() -> str:
             PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
             PREFIX dbo: <http://dbpedia.org/ontology/>
             PREFIX akranes: <https://grammatek.com/munic/akranes/>
+            PREFIX key: <https://grammatek.com/munic/key#>
+            PREFIX card: <https://grammatek.com/munic/card#>
+            PREFIX text: <http://jena.apache.org/text#>
             """
 
 
-def extract_names_for_query(contact: str) -> tuple:
-    """Extract first name, middle name (abbreviation) and family name (abbreviation) from the contact string.
-    The resulting first_name and family_name strings are ready for a SPARQL query. If the contact contains
-    an abbreviated middle name, it will be added to the first name without the abbreviation dot.
-    An abbreviated family name will also be returned without the dot, e.g. 'Sturlaugsd.' will be returned as
-    'Sturlaugsd'"""
+@lru_cache(maxsize=1)
+def get_materialization_update() -> str:
+    """The SPARQL update (re-)creating the lookup keys and the contact cards of all persons, see 'lookup_keys.ru'
+    and 'contact_cards.ru'. Sent as one request, so that Fuseki applies it in one transaction."""
+    updates = []
+    for path in MATERIALIZATION_FILES:
+        with open(path, encoding='utf-8') as f:
+            updates.append(f.read().strip())
+    return ' ;\n\n'.join(updates) + '\n'
+
+
+def lookup_key(value: str) -> str:
+    """Normalize 'value' like the lookup keys: NFC, lowercase and single spaces between words."""
+    return ' '.join(unicodedata.normalize('NFC', value).lower().split())
+
+
+def extract_name_keys(contact: str) -> tuple:
+    """Extract the keys of the first name (key:givenName) and of the family name (key:familyName) from a contact
+    with a missing or abbreviated middle or family name. If the contact contains an abbreviated middle name, its
+    initial is added to the first name, e.g. 'Lilja L. Sturlaugsdóttir' gives 'lilja l'. An abbreviated family name
+    is returned without the dot, e.g. 'Sturlaugsd.' gives 'sturlaugsd'. The family name key is None if the family name
+    is missing, e.g. for 'Lilja L.'"""
 
     arr = contact.split()
-    first_name = arr[0]
-    family_name = '.*'
+    given_name = arr[0]
+    family_name = None
     if len(arr) == 1:
-        # the contact string should be validated before calling this method, but we don't rely on that
-        family_name = 'none_valid'
+        # the contact string should be validated before calling this method, but we don't rely on that: the empty
+        # key matches no person
+        family_name = ''
     elif re.match('^[A-ZÁÉÍÓÚÝÞÆÖ]\\.?$', arr[1]):
-        # add the abbreviated middle name to first name, without the dot that might be added,
-        # e.g. 'Lilja L.' becomes 'Lilja L'
-        first_name = f"{first_name} {arr[1][0]}"
+        # add the initial of the abbreviated middle name to the first name, e.g. 'Lilja L.' becomes 'Lilja L'
+        given_name = f"{given_name} {arr[1][0]}"
         if len(arr) == 3:
             family_name = arr[-1]
     else:
-        # we need to add the regex for word boundary/EOS if we are not dealing with an abbreviated middle name
-        first_name = f"{first_name}( |$)"
         family_name = arr[-1]
 
     # delete a dot that might follow an abbreviated family name, like 'Sturlaugsd.'
-    if family_name.endswith('.'):
+    if family_name is not None and family_name.endswith('.'):
         family_name = family_name[:-1]
 
-    return first_name, family_name
+    return lookup_key(given_name), None if family_name is None else lookup_key(family_name)
+
+
+def sparql_string(value: str) -> str:
+    """Quote 'value' as a SPARQL string literal."""
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+    return f'"{escaped}"'
+
+
+def lucene_query(text: str) -> str:
+    """A Lucene query matching all words of 'text', e.g. for 'Verkefnastjórar':
+    '(verkefnastjórar^3 OR verkefnastjórar*^2 OR verkefnastjórar~)'. Exact matches of a word score highest, then
+    words starting with it, then words with at most two edits, which covers most inflections, e.g. 'verkefnastjóri'.
+    The words contain only letters and digits, so nothing needs to be escaped. Empty if 'text' has no words."""
+
+    clauses = []
+    for word in re.findall(r'[^\W_]+', lookup_key(text)):
+        if len(word) < MIN_FUZZY_LENGTH:
+            clauses.append(word)
+        else:
+            clauses.append(f"({word}^3 OR {word}*^2 OR {word}~)")
+    return ' AND '.join(clauses)
 
 
 def get_all_names_query() -> str:
@@ -99,20 +168,14 @@ def get_info_for_contact_query(contact: str) -> str:
     entity in a graph matching 'contact' either as a full name (foaf:name)
     or first name, where the match can be either an exact match or the first of two first names.
     Example: 'Lilja' will find 'Lilja Lind Sturlaugsdóttir', as will 'Lilja Lind'
-    Regex explanation: match any name or firstName that starts with 'contact' (^) and is either a full match (EOS: $)
-    or matches a whole word (ends with a space)."""
+    The keys key:name and key:firstName contain the first words of the full name and the first name(s), so
+    'contact' matches if it equals the beginning of one of them on a word boundary."""
 
     query = """
             SELECT DISTINCT ?email ?name ?phone ?title
             WHERE {
-                ?entity rdf:type foaf:Person .
-                ?entity foaf:name|foaf:firstName ?matching_name 
-                    FILTER regex(str(?matching_name), '^""" + contact + """( |$)') .
-                ?entity foaf:name ?name .
-                OPTIONAL {?entity foaf:mbox ?email .}
-                OPTIONAL {?entity vcard:hasTelephone [
-                    vcard:hasValue ?phone ] .}
-                OPTIONAL {?entity foaf:title ?title .}
+                VALUES ?key { """ + sparql_string(lookup_key(contact)) + """ }
+                ?entity key:name|key:firstName ?key .""" + CONTACT_CARD + """
             }
             """
     return get_rdf_prefix() + query
@@ -125,21 +188,16 @@ def get_info_for_contact_abbreviated_name_query(contact: str) -> str:
     All should return info for 'Lilja Lind Sturlaugsdóttir'.
    """
 
-    first_name, family_name = extract_names_for_query(contact)
+    given_key, family_key = extract_name_keys(contact)
+    family_value = 'UNDEF' if family_key is None else sparql_string(family_key)
 
     query = """
                     SELECT DISTINCT ?email ?name ?phone ?title
                     WHERE {
-                        ?entity rdf:type foaf:Person .
-                        ?entity foaf:firstName ?matching_name 
-                            FILTER regex(str(?matching_name), '^""" + first_name + """') .
-                        ?entity foaf:familyName ?famName 
-                            FILTER regex(str(?famName), '^""" + family_name + """') .
-                        ?entity foaf:name ?name .
-                        OPTIONAL {?entity foaf:mbox ?email .}
-                        OPTIONAL {?entity vcard:hasTelephone [
-                            vcard:hasValue ?phone ] .}
-                        OPTIONAL {?entity foaf:title ?title .}
+                        VALUES (?given_key ?family_key) { (""" + sparql_string(given_key) + """ """ + \
+            family_value + """) }
+                        ?entity key:givenName ?given_key .
+                        ?entity key:familyName ?family_key .""" + CONTACT_CARD + """
                     }
                     """
     return get_rdf_prefix() + query
@@ -149,17 +207,14 @@ def get_names_for_title_query(title: str) -> str:
     """A query to extract full name, and both email
     and phone number where possible, from a foaf:Person
     entity in a graph matching
-    'title' as a title (foaf:title)."""
+    'title' as a title (foaf:title): the whole title, consecutive words of it or the last part of a
+    compound word of it (key:title)."""
 
     query = """
-            SELECT DISTINCT ?name ?email ?name ?phone ?title
+            SELECT DISTINCT ?name ?email ?phone ?title
             WHERE {
-                ?entity rdf:type foaf:Person .
-                ?entity foaf:title ?title FILTER regex(str(?title), '""" + title + """') .
-                ?entity foaf:name ?name .
-                OPTIONAL {?entity foaf:mbox ?email .}
-                OPTIONAL {?entity vcard:hasTelephone [
-                    vcard:hasValue ?phone ] .}
+                VALUES ?key { """ + sparql_string(lookup_key(title)) + """ }
+                ?entity key:title ?key .""" + CONTACT_CARD + """
             }
             """
     return get_rdf_prefix() + query
@@ -174,13 +229,81 @@ def get_contact_from_subject_query(subject: str) -> str:
     query = """
             SELECT DISTINCT ?email ?name ?phone ?title
             WHERE {
-                ?entity rdf:type foaf:Person .
-                ?entity org:role ?role FILTER (?role = '""" + subject + """') .
-                ?entity foaf:name ?name .
-                OPTIONAL {?entity foaf:mbox ?email .}
-                OPTIONAL {?entity vcard:hasTelephone [
-                    vcard:hasValue ?phone ] .}
-                OPTIONAL {?entity foaf:title ?title .}
+                VALUES ?role { """ + sparql_string(subject) + """ }
+                ?entity org:role ?role .""" + CONTACT_CARD + """
+            }
+            """
+    return get_rdf_prefix() + query
+
+
+def get_info_for_contact_candidates_query(candidates: list) -> str:
+    """A query combining get_info_for_contact_query() and get_info_for_contact_abbreviated_name_query() for
+    all 'candidates' at once, e.g. all nominative forms of a declined name. Each result row is tagged with the
+    ?candidate it matches and the ?match_kind of the match:
+        'exact':        'candidate' matches the full name (foaf:name) or its beginning on a word boundary, as in
+                        get_info_for_contact_query()
+        'first_name':   'candidate' matches the first name(s) (foaf:firstName), as in get_info_for_contact_query()
+        'abbreviated':  'candidate' has a missing or abbreviated middle or family name, as in
+                        get_info_for_contact_abbreviated_name_query(). Only for candidates with more than one token.
+    """
+
+    exact_values = ''
+    abbreviated_values = ''
+    for candidate in candidates:
+        exact_values += f"({sparql_string(candidate)} {sparql_string(lookup_key(candidate))}) "
+        if len(candidate.split()) > 1:
+            given_key, family_key = extract_name_keys(candidate)
+            family_value = 'UNDEF' if family_key is None else sparql_string(family_key)
+            abbreviated_values += f"({sparql_string(candidate)} {sparql_string(given_key)} {family_value}) "
+
+    abbreviated_match = ''
+    if abbreviated_values:
+        abbreviated_match = """
+                UNION
+                {
+                    VALUES (?candidate ?given_key ?family_key) { """ + abbreviated_values + """}
+                    ?entity key:givenName ?given_key .
+                    ?entity key:familyName ?family_key .
+                    BIND('abbreviated' AS ?match_kind)
+                }"""
+
+    query = """
+            SELECT DISTINCT ?candidate ?match_kind ?email ?name ?phone ?title
+            WHERE {
+                {
+                    VALUES (?candidate ?key) { """ + exact_values + """}
+                    ?entity key:name ?key .
+                    BIND('exact' AS ?match_kind)
+                }
+                UNION
+                {
+                    VALUES (?candidate ?key) { """ + exact_values + """}
+                    ?entity key:firstName ?key .
+                    BIND('first_name' AS ?match_kind)
+                }""" + abbreviated_match + CONTACT_CARD + """
+            }
+            """
+    return get_rdf_prefix() + query
+
+
+def get_search_query(text: str, fields: list, limit: int) -> str:
+    """A query ranking the foaf:Person entities whose 'fields' (keys of SEARCH_FIELDS) match 'text' in the
+    full-text index, via the property function text:query of jena-text. At most 'limit' matches per field. Each
+    result row has the ?score of the match, the best matches come first."""
+
+    query_string = sparql_string(lucene_query(text))
+    matches = """
+                UNION
+""".join("""                {
+                    (?entity ?score) text:query (""" + SEARCH_FIELDS[field] + " " + query_string + " " +
+                   str(int(limit)) + """)
+                }""" for field in fields)
+
+    query = """
+            SELECT ?score ?name ?email ?phone ?title
+            WHERE {
+""" + matches + CONTACT_CARD + """
             }
+            ORDER BY DESC(?score)
             """
     return get_rdf_prefix() + query
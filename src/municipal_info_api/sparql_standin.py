@@ -0,0 +1,238 @@
+"""
+Local stand-in for the Fuseki server, e.g. for load tests or for running the tests of 'info_api' without Docker.
+The dataset is loaded into an rdflib Graph and served via the same endpoints as Fuseki:
+
+    /<dataset>/query    SPARQL queries (GET or POST), results as SPARQL JSON
+    /<dataset>/update   SPARQL updates (POST)
+    /<dataset>/data     Graph store protocol for the default graph (GET, PUT and POST)
+
+The stand-in has no named graphs: N-Quads are served as the triples of the default graph, and uploaded quads are all
+added to it. Uploads may use chunked transfer encoding, like those of info_api.import_db().
+
+Usage: python sparql_standin.py offices_staff.rdf --port 3030
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from pyparsing import ParseException
+from rdflib import ConjunctiveGraph, Graph
+
+from embedded_kb import _prepare, _to_binding, materialize
+from rdf_stream import load_graph
+
+logger = logging.getLogger(__name__)
+
+# Content types of the graph store protocol and the corresponding rdflib formats
+RDF_FORMATS = {
+    'application/rdf+xml': 'xml',
+    'text/turtle': 'turtle',
+    'application/n-triples': 'nt',
+    'application/ld+json': 'json-ld',
+    'application/n-quads': 'nquads',
+}
+SPARQL_RESULTS_JSON = 'application/sparql-results+json'
+
+
+class SparqlStandin:
+    """HTTP server answering SPARQL queries and updates for the graph loaded from 'rdf_file'. The lookup keys and
+    contact cards are materialized after loading the graph, like in the database of the Fuseki image (see
+    docker/fuseki/db_init.sh), and the full-text search text:query is evaluated by 'text_index'. 'latency' seconds
+    are added to each request, e.g. to simulate the network round-trip to Fuseki. Use port 0 for a free port."""
+
+    def __init__(self, rdf_file: str, host: str = 'localhost', port: int = 0, dataset: str = 'ds',
+                 latency: float = 0.0):
+        self.dataset = dataset
+        self.latency = latency
+        self.graph = load_graph(rdf_file)
+        materialize(self.graph)
+        # updates are applied to a copy of the graph, which then replaces the graph as a whole, so that queries
+        # running concurrently don't need a lock
+        self._update_lock = threading.Lock()
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                standin._handle(self, 'GET')
+
+            def do_POST(self):
+                standin._handle(self, 'POST')
+
+            def do_PUT(self):
+                standin._handle(self, 'PUT')
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/{self.dataset}'
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    @property
+    def query_endpoint(self) -> str:
+        return f'{self.url}/query'
+
+    @property
+    def data_endpoint(self) -> str:
+        return f'{self.url}/data?default'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='sparql-standin', daemon=True)
+        self._thread.start()
+        logger.info(f"SPARQL stand-in serving {len(self.graph)} triples at {self.url}")
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        logger.info(f"SPARQL stand-in serving {len(self.graph)} triples at {self.url}")
+        self._httpd.serve_forever()
+
+    def query(self, query: str) -> bytes:
+        """Answer a SELECT or ASK query in the SPARQL JSON results format."""
+        result = self.graph.query(_prepare(query))
+        if result.type == 'ASK':
+            return json.dumps({'head': {}, 'boolean': result.askAnswer}).encode('utf-8')
+        variables = [str(var) for var in result.vars]
+        bindings = []
+        for row in result:
+            bindings.append({str(var): _to_binding(row[var]) for var in result.vars if row[var] is not None})
+        return json.dumps({'head': {'vars': variables}, 'results': {'bindings': bindings}},
+                          ensure_ascii=False).encode('utf-8')
+
+    def update(self, update: str):
+        """Apply a SPARQL update to a copy of the graph, which then replaces the graph."""
+        with self._update_lock:
+            graph = Graph()
+            for triple in self.graph:
+                graph.add(triple)
+            graph.update(update)
+            self.graph = graph
+
+    def replace(self, data: bytes, content_type: str, append: bool = False):
+        """Replace the graph with 'data', or add 'data' to it if 'append' is set."""
+        with self._update_lock:
+            graph = Graph()
+            if append:
+                for triple in self.graph:
+                    graph.add(triple)
+            rdf_format = RDF_FORMATS[content_type]
+            if rdf_format == 'nquads':
+                dataset = ConjunctiveGraph()
+                dataset.parse(data=data, format=rdf_format)
+                for triple in dataset.triples((None, None, None)):
+                    graph.add(triple)
+            else:
+                graph.parse(data=data, format=rdf_format)
+            self.graph = graph
+
+    def _handle(self, request: BaseHTTPRequestHandler, method: str):
+        try:
+            self._answer(request, method)
+        except (BrokenPipeError, ConnectionResetError) as e:
+            # the client has given up, e.g. after its timeout, there is no one left to answer
+            logger.debug(f"Client disconnected from {method} {request.path}: {e}")
+            request.close_connection = True
+
+    def _answer(self, request: BaseHTTPRequestHandler, method: str):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(request.path)
+        params = parse_qs(url.query)
+        content_type = request.headers.get('Content-Type', '').split(';')[0].strip()
+        try:
+            body = self._read_body(request)
+            if url.path == f'/{self.dataset}/query' and method in ('GET', 'POST'):
+                if content_type == 'application/sparql-query':
+                    query = body.decode('utf-8')
+                else:
+                    query = (parse_qs(body.decode('utf-8')) if method == 'POST' else params)['query'][0]
+                self._respond(request, 200, SPARQL_RESULTS_JSON, self.query(query))
+            elif url.path == f'/{self.dataset}/update' and method == 'POST':
+                if content_type == 'application/sparql-update':
+                    update = body.decode('utf-8')
+                else:
+                    update = parse_qs(body.decode('utf-8'))['update'][0]
+                self.update(update)
+                self._respond(request, 200, 'text/plain', b'')
+            elif url.path == f'/{self.dataset}/data' and method == 'GET':
+                accept = request.headers.get('Accept', 'text/turtle').split(',')[0].split(';')[0].strip()
+                if accept not in RDF_FORMATS:
+                    accept = 'text/turtle'
+                # the quads of the default graph are its triples
+                rdf_format = 'nt' if RDF_FORMATS[accept] == 'nquads' else RDF_FORMATS[accept]
+                self._respond(request, 200, accept, self.graph.serialize(format=rdf_format, encoding='utf-8'))
+            elif url.path == f'/{self.dataset}/data' and method in ('PUT', 'POST'):
+                if content_type not in RDF_FORMATS:
+                    self._respond(request, 415, 'text/plain', f"Unsupported content type '{content_type}'\n".encode())
+                    return
+                self.replace(body, content_type, append=method == 'POST')
+                self._respond(request, 200, 'text/plain', b'')
+            else:
+                self._respond(request, 404, 'text/plain', b'Not found\n')
+        except (BrokenPipeError, ConnectionResetError):
+            raise
+        except (KeyError, ValueError, SyntaxError, ParseException) as e:
+            self._respond(request, 400, 'text/plain', f"Bad request: {e}\n".encode('utf-8'))
+        except Exception as e:
+            logger.exception(f"Error answering {method} {request.path}")
+            self._respond(request, 500, 'text/plain', f"{e}\n".encode('utf-8'))
+
+    @staticmethod
+    def _read_body(request: BaseHTTPRequestHandler) -> bytes:
+        if request.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                line = request.rfile.readline()
+                if not line:
+                    raise ConnectionResetError("Client disconnected during a chunked request body")
+                size = int(line.split(b';')[0].strip(), 16)
+                chunk = request.rfile.read(size)
+                if len(chunk) < size:
+                    raise ValueError("Incomplete chunked request body")
+                # the line break after the chunk, or the trailer after the last chunk
+                request.rfile.readline()
+                if not size:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+        length = int(request.headers.get('Content-Length', 0))
+        return request.rfile.read(length) if length else b''
+
+    @staticmethod
+    def _respond(request: BaseHTTPRequestHandler, status: int, content_type: str = None, body: bytes = b''):
+        request.send_response(status)
+        if content_type:
+            request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve an RDF file via the SPARQL endpoints of Fuseki.')
+    parser.add_argument('rdf_file')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=3030)
+    parser.add_argument('--dataset', default='ds')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to each request')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    SparqlStandin(args.rdf_file, args.host, args.port, args.dataset, args.latency).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
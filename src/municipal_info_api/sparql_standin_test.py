@@ -0,0 +1,81 @@
+import os
+import time
+import unittest
+
+import requests
+
+import sparql_queries
+from fuseki_client import FusekiClient
+from sparql_standin import SparqlStandin
+
+
+class TestSparqlStandin(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.standin = SparqlStandin(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'offices_staff.rdf'))
+        cls.standin.start()
+        cls.client = FusekiClient(cls.standin.query_endpoint, cls.standin.data_endpoint)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.close()
+        cls.standin.stop()
+
+    def test_query(self):
+        results = self.client.query(sparql_queries.get_names_for_title_query('matráður'))
+        self.assertEqual(['Guðbjörg Helgadóttir'], [r['name']['value'] for r in results])
+
+    def test_query_via_get(self):
+        query = sparql_queries.get_all_names_query()
+        response = requests.get(self.standin.query_endpoint, params={'query': query})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(len(self.client.query(query)), len(response.json()['results']['bindings']))
+
+    def test_invalid_query(self):
+        with self.assertRaises(requests.HTTPError):
+            self.client.query('SELECT WHERE')
+
+    def test_data_round_trip(self):
+        response = self.client.get(self.standin.data_endpoint, headers={'Accept': 'text/turtle'})
+        self.assertEqual(200, response.status_code)
+        data = response.content
+        triples = len(self.standin.graph)
+        response = self.client.put(self.standin.data_endpoint, headers={'Content-Type': 'text/turtle'}, data=data)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(triples, len(self.standin.graph))
+
+    def test_update(self):
+        endpoint = f'{self.standin.url}/update'
+        triple = '<http://example.org/a> <http://example.org/b> "c"'
+        response = requests.post(endpoint, data={'update': f'INSERT DATA {{ {triple} }}'})
+        self.assertEqual(200, response.status_code)
+        ask = requests.post(self.standin.query_endpoint, data={'query': f'ASK {{ {triple} }}'})
+        self.assertTrue(ask.json()['boolean'])
+        requests.post(endpoint, data={'update': f'DELETE DATA {{ {triple} }}'})
+        ask = requests.post(self.standin.query_endpoint, data={'query': f'ASK {{ {triple} }}'})
+        self.assertFalse(ask.json()['boolean'])
+
+
+class TestSparqlStandinDisconnect(unittest.TestCase):
+
+    def test_client_disconnects(self):
+        """A client giving up before the answer is ready is no error of the stand-in."""
+        standin = SparqlStandin(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'offices_staff.rdf'),
+                                latency=0.2)
+        errors = []
+        standin._httpd.handle_error = lambda request, address: errors.append(address)
+        standin.start()
+        try:
+            with self.assertNoLogs('sparql_standin', level='ERROR'):
+                with self.assertRaises(requests.Timeout):
+                    requests.get(standin.query_endpoint, params={'query': sparql_queries.get_all_names_query()},
+                                 timeout=0.05)
+                time.sleep(0.4)
+            self.assertEqual([], errors)
+        finally:
+            standin.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,32 @@
+import gzip
+import io
+import os
+import tempfile
+import time
 import info_api
+import sparql_queries
 import unittest
 
+from rdflib import Graph, Literal
+from rdflib.namespace import FOAF
+
+
+def changed_db(name: str, predicate, value) -> str:
+    """The current db with 'predicate' of the person 'name' set to 'value', as turtle."""
+    graph = Graph()
+    graph.parse(data=info_api.get_db('turtle'), format='turtle')
+    person = graph.value(predicate=FOAF.name, object=Literal(name))
+    graph.set((person, predicate, Literal(value)))
+    return graph.serialize(format='turtle')
+
 class TestSparql(unittest.TestCase):
+    DUMMY_DATA = """
+        @prefix ex: <http://example.org/> .
+        @prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
+
+        ex:subject1 rdf:type ex:Class1 .
+        ex:subject1 ex:property1 "Value1" .
+        """
 
     @classmethod
     def setup_class(cls):
@@ -76,6 +101,23 @@ class TestSparql(unittest.TestCase):
         result = info_api.get_info_for_contact('Guðm')
         self.assertEqual(0, len(result))
 
+    def test_resolve_contact(self):
+        """The first candidate with a match wins, exact matches before abbreviated ones."""
+        result = info_api.resolve_contact(['Björn Jónsson', 'Anna Árnadóttir', 'Hildur'])
+        self.assertEqual(1, len(result))
+        self.assertEqual('Anna Jóna Árnadóttir', result[0].name)
+        self.assertEqual('abbreviated', result[0].match_kind)
+
+        result = info_api.resolve_contact(['Anna Árnadóttir', 'Anna'])
+        self.assertEqual('abbreviated', result[0].match_kind)
+
+        result = info_api.resolve_contact(['Anna Jóna', 'Anna'])
+        self.assertEqual(1, len(result))
+        self.assertEqual('exact', result[0].match_kind)
+
+        result = info_api.resolve_contact(['Birnir Jónsson', 'Björn Jónsson'])
+        self.assertEqual(0, len(result))
+
     def test_contact_from_subject(self):
         result = info_api.get_contact_from_subject('Velferðarmál')
         self.assertEqual(1, len(result))
@@ -92,6 +134,42 @@ class TestSparql(unittest.TestCase):
         result = info_api.get_name_for_title('gjaldkeri')
         self.assertEqual('Ingibjörg Stefánsdóttir', result[0].name)
 
+    def test_name_from_title_compound(self):
+        """A title matches the last part of compound words, e.g. 'launafulltrúi' and 'þjónustufulltrúi'."""
+        result = info_api.get_name_for_title('fulltrúi')
+        self.assertEqual(6, len(result))
+
+    def test_lookup_keys_ignore_case(self):
+        result = info_api.get_info_for_contact('hildur hallsdóttir')
+        self.assertEqual(1, len(result))
+        result = info_api.get_name_for_title('Matráður')
+        self.assertEqual('Guðbjörg Helgadóttir', result[0].name)
+
+    def test_quoted_arguments(self):
+        """Arguments are quoted in the queries and only matched as keys, or by their words in the full-text search."""
+        self.assertEqual([], info_api.get_info_for_contact("Hildur' } #"))
+        result = info_api.get_name_for_title("matráður' } #")
+        self.assertEqual(['Guðbjörg Helgadóttir'], [r.name for r in result])
+        result = info_api.get_contact_from_subject('Velferðarmál" } #')
+        self.assertEqual(['María Jóhannsdóttir'], [r.name for r in result])
+
+    def test_search_titles_and_roles(self):
+        """The full-text search ranks shorter titles first and tolerates inflections."""
+        result = info_api.search_titles_and_roles('Verkefnastjórar')
+        self.assertEqual(['Sigrún Magnúsdóttir', 'Ásta Halldórsdóttir'], [r.name for r in result])
+        self.assertGreater(result[0].score, result[1].score)
+        result = info_api.search_titles_and_roles('velferðarmálum', fields=('role',))
+        self.assertEqual(['María Jóhannsdóttir'], [r.name for r in result])
+        self.assertEqual([], info_api.search_titles_and_roles('geimfari'))
+        self.assertEqual([], info_api.search_titles_and_roles(' - '))
+
+    def test_name_from_title_inflected(self):
+        """Titles without matching lookup keys are searched in the full-text index."""
+        result = info_api.get_name_for_title('sviðsstjóra')
+        self.assertEqual(4, len(result))
+        result = info_api.get_contact_from_subject('Velferðarmálum')
+        self.assertEqual('María Jóhannsdóttir', result[0].name)
+
     def test_valid_roles(self):
         result = info_api.get_valid_subjects()
         self.assertTrue(len(result) > 3)
@@ -101,6 +179,19 @@ class TestSparql(unittest.TestCase):
                 found_subject = True
         self.assertTrue(found_subject)
 
+    def test_contact_cards(self):
+        """Contacts without a phone number get the phone number of the main office, a missing email or title is
+        None."""
+        result = info_api.get_info_for_contact('Hildur Hallsdóttir')
+        self.assertEqual('499 1000', result[0].phone)
+        result = info_api.get_info_for_contact('Erla Jónsdóttir')
+        self.assertEqual('499 1104', result[0].phone)
+        result = info_api.get_info_for_contact('Jón Sigurðsson')
+        self.assertIsNone(result[0].email)
+        self.assertEqual('bæjarstjóri', result[0].title)
+        result = info_api.get_info_for_contact('Sigurður Guðmundsson')
+        self.assertIsNone(result[0].title)
+
     def test_get_office_contact_info(self):
         result = info_api.get_office_contact_info()
         self.assertTrue(len(result) == 1)
@@ -132,20 +223,203 @@ class TestSparql(unittest.TestCase):
         # update db with some dummy data, this will erase everything in the db,
         # but make sure that we have saved the data beforehand and restore it here
         # and in the teardown() method of the test class
-        data_string = """
-        @prefix ex: <http://example.org/> .
-        @prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
-
-        ex:subject1 rdf:type ex:Class1 .
-        ex:subject1 ex:property1 "Value1" .
-        """
-
-        info_api.update_db(data_string, data_type)
+        info_api.update_db(self.DUMMY_DATA, data_type)
         db_new = info_api.get_db(data_type)
         self.assertTrue(len(db_new) < len(db))
 
         # restore db with original data
         info_api.update_db(db, data_type)
 
+    def test_export_import_db(self):
+        """ Test a gzip-compressed backup and restore in small chunks """
+        triples = info_api.get_db('ntriples').count(b'\n')
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                for fmt, name in [('ntriples', 'kb.nt.gz'), ('nquads', 'kb.nq')]:
+                    path = os.path.join(directory, name)
+                    size = info_api.export_db(path, fmt, validate=True, chunk_size=1024)
+                    self.assertTrue(size > os.path.getsize(path) if name.endswith('.gz') else size > 1)
+
+                    info_api.update_db(self.DUMMY_DATA, 'turtle')
+                    self.assertEqual(2, info_api.get_db('ntriples').count(b'\n'))
+                    info_api.import_db(path, fmt, chunk_size=1024)
+                    self.assertEqual(triples, info_api.get_db('ntriples').count(b'\n'))
+            finally:
+                info_api.update_db(TestSparql.db_content, 'rdf')
+
+    def test_update_db_delta(self):
+        """ Test updating only the changes of the db """
+        db = info_api.get_db('turtle')
+        try:
+            data_string = changed_db('Hildur Hallsdóttir', FOAF.mbox, 'hildur.hallsdottir@andabaer.is')
+            self.assertEqual(['Hildur Hallsdóttir'], info_api.update_db_delta(data_string, 'turtle'))
+            self.assertIn(b'hildur.hallsdottir@andabaer.is', info_api.get_db('ntriples'))
+            self.assertEqual([], info_api.update_db_delta(data_string, 'turtle'))
+        finally:
+            self.assertEqual(['Hildur Hallsdóttir'], info_api.update_db_delta(db, 'turtle'))
+        self.assertEqual(db.count(b'\n'), info_api.get_db('turtle').count(b'\n'))
+
+    def test_import_db_invalid(self):
+        """ An invalid line aborts the import and leaves the db unchanged """
+        dump = io.BytesIO()
+        info_api.export_db(dump)
+        data = dump.getvalue() + b'<urn:a> <urn:b> .\n'
+        with self.assertRaisesRegex(ValueError, 'line'):
+            info_api.import_db(io.BytesIO(gzip.compress(data)), 'ntriples', chunk_size=1024)
+        self.assertEqual(dump.getvalue().count(b'\n'), info_api.get_db('ntriples').count(b'\n'))
+
+
+class TestLookupKeys(unittest.TestCase):
+
+    def test_extract_name_keys(self):
+        self.assertEqual(('lilja l', 'sturlaugsdóttir'), sparql_queries.extract_name_keys('Lilja L. Sturlaugsdóttir'))
+        self.assertEqual(('lilja l', None), sparql_queries.extract_name_keys('Lilja L.'))
+        self.assertEqual(('lilja', 'sturlaugsd'), sparql_queries.extract_name_keys('Lilja Lind Sturlaugsd.'))
+        self.assertEqual(('lilja', ''), sparql_queries.extract_name_keys('Lilja'))
+
+    def test_lookup_key(self):
+        self.assertEqual('anna jóna', sparql_queries.lookup_key(' Anna  Jo\u0301na '))
+
+    def test_lucene_query(self):
+        self.assertEqual('(matráður^3 OR matráður*^2 OR matráður~) AND í',
+                         sparql_queries.lucene_query('Matráður  í'))
+        self.assertEqual('(skóli^3 OR skóli*^2 OR skóli~)', sparql_queries.lucene_query('"Skóli" } #'))
+        self.assertEqual('', sparql_queries.lucene_query('" } #'))
+
+
+@unittest.skipIf(info_api.KB_BACKEND != 'fuseki', "round-trips are only counted for the Fuseki backend")
+class TestRoundTrips(unittest.TestCase):
+    """Regression benchmark for the number of requests each lookup sends to Fuseki. Each lookup needs one
+    round-trip, also for contacts without a phone number, whose contact cards contain the phone number of the main
+    office. Repeated lookups are served from the result cache."""
+
+    def setUp(self):
+        info_api.invalidate_caches()
+
+    def assertRoundTrips(self, expected, lookup, *args):
+        client = info_api.get_client()
+        before = client.round_trips
+        lookup(*args)
+        self.assertEqual(expected, client.round_trips - before)
+
+    def test_contact_with_phone(self):
+        self.assertRoundTrips(1, info_api.get_info_for_contact, 'Erla Jónsdóttir')
+
+    def test_contact_without_phone(self):
+        self.assertRoundTrips(1, info_api.get_info_for_contact, 'Hildur Hallsdóttir')
+        self.assertRoundTrips(1, info_api.get_info_for_contact, 'Hildur')
+        self.assertRoundTrips(0, info_api.get_info_for_contact, 'Hildur Hallsdóttir')
+
+    def test_abbreviated_name(self):
+        self.assertRoundTrips(1, info_api.get_info_for_contact, 'Anna J. Árnadóttir')
+        self.assertRoundTrips(0, info_api.get_info_for_contact, ' Anna J.  Árnadóttir')
+
+    def test_declension_candidates(self):
+        """All nominative candidates of a declined name are resolved with one query."""
+        self.assertRoundTrips(1, info_api.resolve_contact, ['Björn Jónsson', 'Birnir Jónsson', 'Erla Jónsdóttir'])
+
+    def test_title_with_many_contacts_without_phone(self):
+        """All four 'sviðsstjóri' contacts lack a phone number."""
+        self.assertRoundTrips(1, info_api.get_name_for_title, 'sviðsstjóri')
+
+    def test_subject(self):
+        self.assertRoundTrips(1, info_api.get_contact_from_subject, 'Velferðarmál')
+
+    def test_negative_results(self):
+        """A title without matching lookup keys is searched in the full-text index as well."""
+        self.assertRoundTrips(2, info_api.get_name_for_title, 'geimfari')
+        self.assertRoundTrips(0, info_api.get_name_for_title, 'geimfari')
+
+    def test_update_invalidates_results(self):
+        self.assertRoundTrips(1, info_api.get_info_for_contact, 'Erla Jónsdóttir')
+        info_api.update_db(info_api.get_db('turtle'), 'turtle')
+        self.assertRoundTrips(1, info_api.get_info_for_contact, 'Erla Jónsdóttir')
+
+    def test_update_delta_invalidates_changed_persons(self):
+        """A changed email only invalidates the cached results of that person, a changed title all results."""
+        db = info_api.get_db('turtle')
+        try:
+            self.assertRoundTrips(1, info_api.get_info_for_contact, 'Erla Jónsdóttir')
+            self.assertRoundTrips(1, info_api.get_info_for_contact, 'Hildur Hallsdóttir')
+            info_api.update_db_delta(changed_db('Hildur Hallsdóttir', FOAF.mbox, 'hildur.h@andabaer.is'), 'turtle')
+            self.assertRoundTrips(0, info_api.get_info_for_contact, 'Erla Jónsdóttir')
+            self.assertRoundTrips(1, info_api.get_info_for_contact, 'Hildur Hallsdóttir')
+            self.assertEqual('hildur.h@andabaer.is', info_api.get_info_for_contact('Hildur Hallsdóttir')[0].email)
+
+            info_api.update_db_delta(changed_db('Hildur Hallsdóttir', FOAF.title, 'leikskólastjóri'), 'turtle')
+            self.assertRoundTrips(1, info_api.get_info_for_contact, 'Erla Jónsdóttir')
+        finally:
+            info_api.update_db_delta(db, 'turtle')
+
+    def test_lists(self):
+        self.assertRoundTrips(1, info_api.get_all_names)
+        self.assertRoundTrips(0, info_api.get_all_names)
+        self.assertRoundTrips(1, info_api.get_valid_subjects)
+        self.assertRoundTrips(0, info_api.get_valid_subjects)
+        self.assertRoundTrips(1, info_api.get_office_contact_info)
+        self.assertRoundTrips(0, info_api.get_office_contact_info)
+
+
+
+@unittest.skipIf(info_api.KB_BACKEND != 'fuseki', "the fallbacks are only used with the Fuseki backend")
+class TestFallback(unittest.TestCase):
+    """While Fuseki is unavailable, lookups are answered from the cache or the snapshot of the knowledge base."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        info_api.KB_DUMP_FILE = os.path.join(self.directory.name, 'kb.nt.gz')
+        info_api._snapshot = None
+        info_api.save_snapshot()
+        info_api.invalidate_caches()
+        self.breaker = info_api.get_client().breaker
+        self.breaker.opened_at = time.monotonic()
+
+    def tearDown(self):
+        self.breaker.record_success()
+        info_api.KB_DUMP_FILE = ''
+        info_api._snapshot = None
+        self.directory.cleanup()
+
+    def test_snapshot(self):
+        result = info_api.get_info_for_contact('Hildur Hallsdóttir')
+        self.assertEqual('hildur@andabaer.is', result[0].email)
+        self.assertEqual('499 1000', result[0].phone)
+        self.assertEqual('499 1000', info_api.get_office_phone_number())
+
+    def test_snapshot_after_update(self):
+        """The snapshot is written to KB_DUMP_FILE after each change and answers with the current data."""
+        self.breaker.record_success()
+        db = info_api.get_db('rdf')
+        try:
+            info_api.update_db(changed_db('Hildur Hallsdóttir', FOAF.mbox, 'hildur.h@andabaer.is'), 'turtle')
+            info_api.get_snapshot().reload_if_changed(force=True)
+            self.breaker.opened_at = time.monotonic()
+            self.assertEqual('hildur.h@andabaer.is', info_api.get_info_for_contact('Hildur Hallsdóttir')[0].email)
+        finally:
+            self.breaker.record_success()
+            info_api.update_db(db, 'rdf')
+
+    def test_no_snapshot_after_update(self):
+        """Without KB_DUMP_FILE, the snapshot of KB_SOURCE_FILE isn't used anymore once the data has been changed."""
+        info_api.KB_DUMP_FILE = ''
+        info_api._snapshot = None
+        self.breaker.record_success()
+        db = info_api.get_db('rdf')
+        try:
+            info_api.update_db(db, 'rdf')
+            self.assertIsNone(info_api.get_snapshot())
+            self.breaker.opened_at = time.monotonic()
+            with self.assertRaises(info_api.FusekiUnavailable):
+                info_api.get_info_for_contact('Hildur Hallsdóttir')
+        finally:
+            info_api._snapshot_outdated = False
+
+    def test_cached_result(self):
+        self.breaker.record_success()
+        info_api.get_name_for_title('bæjarstjóri')
+        self.breaker.opened_at = time.monotonic()
+        self.assertEqual('Jón Sigurðsson', info_api.get_name_for_title('bæjarstjóri')[0].name)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+Small HTTP server for status endpoints of the action server, e.g. readiness, running in a background thread next to
+the Sanic server of rasa_sdk. Routes are registered as functions returning (HTTP status, content type, body).
+"""
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+Route = Callable[[], Tuple[int, str, str]]
+
+
+class StatusServer:
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 5056):
+        self.routes = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                route = server.routes.get(self.path.split('?')[0])
+                if route is None:
+                    status, content_type, body = 404, 'text/plain', 'not found\n'
+                else:
+                    status, content_type, body = route()
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    def add_route(self, path: str, route: Route):
+        self.routes[path] = route
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='status-server', daemon=True)
+        self._thread.start()
+        logger.info(f"Status server listening on port {self.port}")
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,188 @@
+"""
+Full-text search of the titles, roles and names of the knowledge base. Fuseki answers it from the Lucene index of
+its dataset (see docker/fuseki/config.ttl) via the property function text:query of jena-text, e.g.:
+
+    (?entity ?score) text:query (foaf:title "(verkefnastjórar^3 OR verkefnastjórar*^2 OR verkefnastjórar~)" 10)
+
+For rdflib graphs, i.e. the embedded knowledge base and the SPARQL stand-in, register() adds an evaluation of
+text:query that ranks the literals of the graph in Python. It approximates the Lucene queries built by
+sparql_queries.lucene_query(): all terms have to match, exactly, as a prefix of a word or with at most
+MAX_EDITS edits, and matches in shorter literals score higher.
+"""
+import math
+import re
+import unicodedata
+
+from rdflib import Literal, Namespace, URIRef, Variable
+from rdflib.namespace import FOAF, RDF
+from rdflib.plugins.sparql import CUSTOM_EVALS
+from rdflib.plugins.sparql.algebra import BGP
+from rdflib.plugins.sparql.evaluate import evalPart
+
+TEXT = Namespace('http://jena.apache.org/text#')
+
+# Indexed fields and their predicates, as in the entity map of docker/fuseki/config.ttl. Note the org: prefix of
+# 'offices_staff.rdf' without a trailing '#'.
+FIELDS = {
+    'title': FOAF.title,
+    'role': URIRef('https://www.w3.org/TR/vocab-orgrole'),
+    'name': FOAF.name,
+}
+DEFAULT_FIELD = 'title'
+
+# Terms shorter than this only match exactly, longer ones also as a prefix and with up to MAX_EDITS edits
+MIN_FUZZY_LENGTH = 4
+MAX_EDITS = 2
+
+# Scores of a term matching a word of a literal
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.7
+FUZZY_SCORE = 0.5
+
+_OPERATORS = {'AND', 'OR', 'NOT', 'TO'}
+# rdflib can't parse collections as subjects, like the (?entity ?score) of text:query
+_SUBJECT_LIST = re.compile(r'\(\s*(\?\w+)\s+(\?\w+)\s*\)\s+text:query\b')
+
+
+def words(value: str) -> list:
+    """The lowercased words of 'value', like the tokens of the StandardAnalyzer of the index."""
+    return re.findall(r'[^\W_]+', unicodedata.normalize('NFC', value).lower())
+
+
+def query_terms(query: str) -> list:
+    """The distinct terms of a Lucene query, without operators, boosts, fuzziness and wildcards."""
+    query = re.sub(r'[~^][\d.]*|\*', ' ', query)
+    terms = []
+    for word in re.findall(r'[^\W_]+', unicodedata.normalize('NFC', query)):
+        if word in _OPERATORS:
+            continue
+        word = word.lower()
+        if word not in terms:
+            terms.append(word)
+    return terms
+
+
+def edit_distance(a: str, b: str, limit: int = MAX_EDITS) -> int:
+    """Levenshtein distance of 'a' and 'b', or 'limit' + 1 if it exceeds 'limit'."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _term_score(term: str, value_words: list) -> float:
+    best = 0.0
+    for word in value_words:
+        if word == term:
+            return EXACT_SCORE
+        if len(term) < MIN_FUZZY_LENGTH:
+            continue
+        if word.startswith(term):
+            best = max(best, PREFIX_SCORE)
+        elif best < FUZZY_SCORE and edit_distance(term, word) <= MAX_EDITS:
+            best = FUZZY_SCORE
+    return best
+
+
+def score(terms: list, value: str) -> float:
+    """Score of 'value' for the query 'terms', 0 if any of the terms doesn't match."""
+    value_words = words(value)
+    if not terms or not value_words:
+        return 0.0
+    total = 0.0
+    for term in terms:
+        term_score = _term_score(term, value_words)
+        if not term_score:
+            return 0.0
+        total += term_score
+    return total / len(terms) / math.sqrt(len(value_words))
+
+
+def search(graph, predicate: URIRef, query: str, limit: int = None) -> list:
+    """(entity, score, literal) of the best matching literal of each entity for 'predicate', the best first."""
+    terms = query_terms(query)
+    best = {}
+    for entity, value in graph.subject_objects(predicate):
+        value_score = score(terms, str(value))
+        if value_score and value_score > best.get(entity, (0.0, None))[0]:
+            best[entity] = (value_score, value)
+    ranked = sorted(((entity, s, value) for entity, (s, value) in best.items()), key=lambda r: (-r[1], str(r[0])))
+    return ranked[:limit] if limit else ranked
+
+
+def rdflib_query(query: str) -> str:
+    """Rewrite '(?entity ?score) text:query ...' into '?entity text:score ?score ; text:query ...', which rdflib
+    can parse and the evaluation of register() understands."""
+    return _SUBJECT_LIST.sub(r'\1 text:score \2 ; text:query', query)
+
+
+def _collection(node, triples: list) -> tuple:
+    """Items of the collection 'node' in the triple patterns 'triples', and the triples of the collection."""
+    items = []
+    used = []
+    while node != RDF.nil:
+        first = [t for t in triples if t[0] == node and t[1] == RDF.first]
+        rest = [t for t in triples if t[0] == node and t[1] == RDF.rest]
+        if not first or not rest:
+            raise ValueError(f"Invalid collection in text:query: {node}")
+        items.append(first[0][2])
+        used += [first[0], rest[0]]
+        node = rest[0][2]
+    return items, used
+
+
+def _arguments(ctx, node, triples: list) -> tuple:
+    """Predicate, query string and limit of the object of text:query: either the query string or a collection of an
+    optional predicate, the query string and an optional limit."""
+    if isinstance(node, (Literal, Variable)):
+        return FIELDS[DEFAULT_FIELD], str(ctx[node]), None, []
+    items, used = _collection(node, triples)
+    items = [ctx[item] if isinstance(item, Variable) else item for item in items]
+    predicate = FIELDS[DEFAULT_FIELD]
+    if items and isinstance(items[0], URIRef):
+        predicate = items.pop(0)
+    if not items:
+        raise ValueError("text:query needs a query string")
+    limit = int(items[1]) if len(items) > 1 else None
+    return predicate, str(items[0]), limit, used
+
+
+def _evaluate(ctx, part):
+    """Custom evaluation of a basic graph pattern containing text:query, see register()."""
+    if part.name != 'BGP':
+        raise NotImplementedError()
+    text_triples = [t for t in part.triples if t[1] == TEXT.query]
+    if not text_triples:
+        raise NotImplementedError()
+
+    entity_var, _, argument = text_triples[0]
+    score_triples = [t for t in part.triples if t[0] == entity_var and t[1] == TEXT.score]
+    score_var = score_triples[0][2] if score_triples else None
+    predicate, query, limit, used = _arguments(ctx, argument, part.triples)
+    remaining = [t for t in part.triples if t is not text_triples[0] and t not in score_triples and t not in used]
+    matches = search(ctx.graph, predicate, query, limit)
+
+    def solutions():
+        for entity, entity_score, _ in matches:
+            if ctx[entity_var] is not None and ctx[entity_var] != entity:
+                continue
+            c = ctx.push()
+            c[entity_var] = entity
+            if score_var is not None:
+                c[score_var] = Literal(entity_score)
+            # further text:query patterns of the group are evaluated by another call of _evaluate()
+            yield from evalPart(c, BGP(remaining))
+
+    return solutions()
+
+
+def register():
+    """Let rdflib evaluate text:query, see rdflib_query() for the queries it can parse."""
+    CUSTOM_EVALS['text_query'] = _evaluate
@@ -0,0 +1,55 @@
+import os
+import unittest
+
+from rdflib import Graph
+
+import embedded_kb
+import sparql_queries
+import text_index
+
+
+class TestTextIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.graph = Graph()
+        cls.graph.parse(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'offices_staff.rdf'))
+        embedded_kb.materialize(cls.graph)
+
+    def query(self, text: str, fields: list, limit: int = 10) -> list:
+        results = self.graph.query(embedded_kb._prepare(sparql_queries.get_search_query(text, fields, limit)))
+        return [(str(r.name), float(r.score)) for r in results]
+
+    def test_query_terms(self):
+        query = sparql_queries.lucene_query('Verkefnastjóri skjalamála')
+        self.assertEqual(['verkefnastjóri', 'skjalamála'], text_index.query_terms(query))
+
+    def test_edit_distance(self):
+        self.assertEqual(2, text_index.edit_distance('verkefnastjórar', 'verkefnastjóri'))
+        self.assertEqual(3, text_index.edit_distance('ruslakarl', 'matráður'))
+
+    def test_score(self):
+        terms = ['verkefnastjóri']
+        self.assertGreater(text_index.score(terms, 'verkefnastjóri'),
+                           text_index.score(terms, 'verkefnastjóri skjalamála'))
+        self.assertGreater(text_index.score(terms, 'verkefnastjóri'), text_index.score(['verkefnastjórar'],
+                                                                                         'verkefnastjóri'))
+        self.assertEqual(0, text_index.score(['verkefnastjóri', 'launa'], 'verkefnastjóri skjalamála'))
+        self.assertEqual(0, text_index.score(['í'], 'innheimtufulltrúi'))
+
+    def test_rdflib_query(self):
+        self.assertEqual('?entity text:score ?score ; text:query (foaf:name "anna")',
+                         text_index.rdflib_query('(?entity ?score) text:query (foaf:name "anna")'))
+
+    def test_search_query(self):
+        results = self.query('Verkefnastjórar', ['title'])
+        self.assertEqual(['Sigrún Magnúsdóttir', 'Ásta Halldórsdóttir'], [name for name, _ in results])
+        self.assertEqual(sorted(results, key=lambda r: -r[1]), results)
+
+    def test_search_query_limit(self):
+        self.assertEqual(1, len(self.query('sviðsstjóri', ['title'], limit=1)))
+
+    def test_search_query_fields(self):
+        self.assertEqual(['María Jóhannsdóttir'], [name for name, _ in self.query('velferðarmálum', ['role'])])
+        self.assertEqual(['Hildur Hallsdóttir'], [name for name, _ in self.query('Hallsdóttur', ['name'])])
+        self.assertEqual([], self.query('ruslakarl', ['title', 'role', 'name']))
@@ -0,0 +1,116 @@
+"""
+Warm-up of the action server. Before the first conversation, the cold paths of the lookups are run once: the snapshot
+of the knowledge graph, which is written to KB_DUMP_FILE first, the office contact, the lists of contacts and
+subjects, the BÍN dictionary with the declension caches and the name indexes, and the MOTD index. The action server reports itself as ready via the status server
+(GET /ready) only after the warm-up has finished, so that a new replica doesn't get traffic before. The status server
+also serves the metrics (GET /metrics), with or without the warm-up.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date
+
+import declension
+import info_api
+import metrics
+import motd
+import name_index
+from status_server import StatusServer
+
+logger = logging.getLogger(__name__)
+
+# Run the warm-up when the actions are loaded, see start(). Without it, the action server is ready right away.
+ACTION_SERVER_WARMUP = os.environ.get('ACTION_SERVER_WARMUP', 'false').lower() in ('true', '1', 'yes')
+# Start the status server with /ready and /metrics when the actions are loaded
+STATUS_SERVER = os.environ.get('STATUS_SERVER', 'true').lower() in ('true', '1', 'yes')
+STATUS_PORT = int(os.environ.get('STATUS_PORT', '5056'))
+
+_ready = threading.Event()
+# name of each warm-up step -> seconds it took, or the error it failed with
+_steps = {}
+_status_server = None
+_started = False
+
+
+def _warm_snapshot():
+    if info_api.KB_BACKEND == 'fuseki':
+        info_api.save_snapshot()
+        info_api.get_snapshot()
+
+
+def _warm_declension():
+    names = info_api.get_all_names()
+    name_index.get_inflection_index(names)
+    name_index.get_token_index(names)
+    for name in names:
+        declension.get_nominative_name(name)
+
+
+def _warm_motd():
+    motd.get_motd(date.today(), 'is-IS')
+
+
+WARMUP_STEPS = [
+    ('snapshot', _warm_snapshot),
+    ('office_contact', info_api.get_office_contact_info),
+    ('contacts', info_api.get_all_names),
+    ('subjects', info_api.get_valid_subjects),
+    ('declension', _warm_declension),
+    ('motd', _warm_motd),
+]
+
+
+def warm_up():
+    """Run all warm-up steps. A failing step is logged and doesn't stop the others, the action server is ready
+    afterwards in any case, as the lookups fall back or retry on their own."""
+    start = time.monotonic()
+    for name, step in WARMUP_STEPS:
+        step_start = time.monotonic()
+        try:
+            step()
+            _steps[name] = round(time.monotonic() - step_start, 3)
+        except Exception as e:
+            logger.error(f"Warm-up step '{name}' failed: {e}")
+            _steps[name] = f"failed: {e}"
+    _ready.set()
+    logger.info(f"Warm-up finished in {time.monotonic() - start:.2f}s")
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def ready_route() -> tuple:
+    body = json.dumps({'ready': is_ready(), 'steps': _steps}, ensure_ascii=False) + '\n'
+    return (200 if is_ready() else 503), 'application/json', body
+
+
+def get_status_server() -> StatusServer:
+    """The status server of the action server with the routes /ready and /metrics, created on first use."""
+    global _status_server
+    if _status_server is None:
+        _status_server = StatusServer(port=STATUS_PORT)
+        _status_server.add_route('/ready', ready_route)
+        _status_server.add_route('/metrics', metrics.metrics_route)
+        _status_server.start()
+    return _status_server
+
+
+def start():
+    """Start the status server, if enabled via STATUS_SERVER, and run the warm-up in a background thread, if enabled
+    via ACTION_SERVER_WARMUP."""
+    global _started
+    if _started:
+        return
+    _started = True
+    if not ACTION_SERVER_WARMUP:
+        _ready.set()
+    if STATUS_SERVER:
+        try:
+            get_status_server()
+        except OSError as e:
+            logger.error(f"Could not start the status server on port {STATUS_PORT}: {e}")
+    if ACTION_SERVER_WARMUP:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
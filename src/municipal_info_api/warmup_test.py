@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+import warmup
+from status_server import StatusServer
+
+
+class TestWarmup(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StatusServer(host='localhost', port=0)
+        self.server.add_route('/ready', warmup.ready_route)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(f'http://localhost:{self.server.port}{path}') as response:
+                return response.status, response.read().decode('utf-8')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8')
+
+    def test_ready_after_warmup(self):
+        warmup._ready.clear()
+        status, body = self.get('/ready')
+        self.assertEqual(503, status)
+        self.assertFalse(json.loads(body)['ready'])
+
+        # the MOTD file path is relative to the project root
+        cwd = os.getcwd()
+        os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+        try:
+            warmup.warm_up()
+        finally:
+            os.chdir(cwd)
+        self.assertTrue(warmup.is_ready())
+        status, body = self.get('/ready')
+        self.assertEqual(200, status)
+        steps = json.loads(body)['steps']
+        self.assertEqual([name for name, step in warmup.WARMUP_STEPS], list(steps))
+        for name, duration in steps.items():
+            self.assertIsInstance(duration, float, f"warm-up step '{name}' failed: {duration}")
+
+    def test_unknown_path(self):
+        self.assertEqual(404, self.get('/unknown')[0])
+
+
+class TestStart(unittest.TestCase):
+
+    def setUp(self):
+        warmup.STATUS_PORT = 0
+        warmup._ready.clear()
+
+    def tearDown(self):
+        warmup.get_status_server().stop()
+        warmup._status_server = None
+        warmup._started = False
+        warmup.ACTION_SERVER_WARMUP = False
+
+    def get(self, path):
+        with urllib.request.urlopen(f'http://localhost:{warmup.get_status_server().port}{path}') as response:
+            return response.status, response.read().decode('utf-8')
+
+    def test_without_warmup(self):
+        """The metrics are served without the warm-up, and the action server is ready right away."""
+        warmup.ACTION_SERVER_WARMUP = False
+        warmup.start()
+        status, body = self.get('/metrics')
+        self.assertEqual(200, status)
+        self.assertIn('fuseki_requests_total', body)
+        self.assertEqual(200, self.get('/ready')[0])
+        self.assertNotIn('warm-up', [thread.name for thread in threading.enumerate()])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+"""
+Load test of the custom actions without a Docker stack. A local stand-in for Fuseki (see sparql_standin.py) serves
+the knowledge base from offices_staff.rdf, and the actions are run concurrently on recorded tracker states, e.g.
+tests/data/initial_tracker.json, with the slots of the SCENARIOS below. Reports the throughput and the p50/p95/p99
+latencies per action, e.g. to plan the number of action server replicas.
+
+Usage, from the project root:
+
+    python -m tests.load.harness --concurrency 20 --requests 2000
+    python -m tests.load.harness --latency 0.005 --no-cache --json
+"""
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import math
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+INFO_API_DIR = os.path.join(ROOT, 'src', 'municipal_info_api')
+# the modules of the info api are imported as top level modules, as on the PYTHONPATH of the action server
+if INFO_API_DIR not in sys.path:
+    sys.path.insert(0, INFO_API_DIR)
+
+DEFAULT_TRACKER = os.path.join(ROOT, 'tests', 'data', 'initial_tracker.json')
+DEFAULT_RDF_FILE = os.path.join(INFO_API_DIR, 'offices_staff.rdf')
+
+# Actions run for each tracker state, with the slots set on top of the recorded slots
+SCENARIOS = [
+    ('action_get_contact_info', {'contact': 'Hildur Hallsdóttir'}),
+    ('action_get_contact_info', {'contact': 'Anna Árnadóttir', 'email_or_phone': 'phone'}),
+    ('action_get_contact_info', {'subject': 'Velferðarmál', 'email_or_phone': 'email'}),
+    ('action_get_whois', {'title': 'matráður'}),
+    ('action_get_whois', {'title': 'ruslakarl'}),
+    ('action_get_whois', {'title': 'sviðsstjóra'}),
+    ('action_get_whois', {'contact': 'Hildi Hallsdóttur'}),
+    ('action_get_whois', {'subject': 'Velferðarmál'}),
+    ('action_get_operator', {}),
+    ('action_get_motd', {'language': 'is-IS'}),
+]
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile 'p' (0-100) of 'sorted_values'."""
+    if not sorted_values:
+        return math.nan
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def load_trackers(paths: list) -> list:
+    trackers = []
+    for path in paths:
+        with open(path) as json_file:
+            trackers.append(json.load(json_file))
+    return trackers
+
+
+def create_jobs(trackers: list, scenarios: list, count: int) -> list:
+    """'count' (action name, tracker state) pairs, cycling through all trackers and scenarios."""
+    jobs = []
+    for tracker, (action_name, slots) in itertools.islice(itertools.cycle(itertools.product(trackers, scenarios)),
+                                                         count):
+        state = dict(tracker)
+        state['slots'] = {**tracker.get('slots', {}), **slots}
+        jobs.append((action_name, state))
+    return jobs
+
+
+async def run_jobs(actions_by_name: dict, domain: dict, jobs: list, concurrency: int) -> tuple:
+    """Run 'jobs' with at most 'concurrency' actions at a time. Returns the latencies in seconds and the number of
+    errors by action name, and the total duration in seconds."""
+    from rasa_sdk import Tracker
+    from rasa_sdk.executor import CollectingDispatcher
+
+    latencies = {}
+    errors = {}
+    pending = iter(jobs)
+
+    async def worker():
+        for action_name, state in pending:
+            action = actions_by_name[action_name]
+            tracker = Tracker.from_dict(state)
+            start = time.perf_counter()
+            try:
+                events = action.run(dispatcher=CollectingDispatcher(), tracker=tracker, domain=domain)
+                if inspect.isawaitable(events):
+                    await events
+            except Exception:
+                errors[action_name] = errors.get(action_name, 0) + 1
+            latencies.setdefault(action_name, []).append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def create_report(latencies: dict, errors: dict, duration: float) -> dict:
+    report = {}
+    all_latencies = []
+    for action_name in sorted(latencies):
+        values = sorted(latencies[action_name])
+        all_latencies.extend(values)
+        report[action_name] = summarize(values, errors.get(action_name, 0), duration)
+    report['total'] = summarize(sorted(all_latencies), sum(errors.values()), duration)
+    return report
+
+
+def summarize(sorted_values: list, error_count: int, duration: float) -> dict:
+    return {
+        'requests': len(sorted_values),
+        'errors': error_count,
+        'throughput': len(sorted_values) / duration if duration else math.nan,
+        'p50_ms': percentile(sorted_values, 50) * 1000,
+        'p95_ms': percentile(sorted_values, 95) * 1000,
+        'p99_ms': percentile(sorted_values, 99) * 1000,
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'action':<28} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"]
+    for action_name, r in report.items():
+        lines.append(f"{action_name:<28} {r['requests']:>9} {r['errors']:>7} {r['throughput']:>9.1f} "
+                     f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the custom actions against a local SPARQL stand-in.')
+    parser.add_argument('--concurrency', type=int, default=10, help='number of actions running at the same time')
+    parser.add_argument('--requests', type=int, default=1000, help='number of measured action runs')
+    parser.add_argument('--warmup', type=int, default=None,
+                        help='number of action runs before measuring, default: one per tracker and scenario')
+    parser.add_argument('--tracker', action='append', help=f'tracker state as JSON, default: {DEFAULT_TRACKER}')
+    parser.add_argument('--rdf-file', default=DEFAULT_RDF_FILE, help='knowledge base served by the stand-in')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the stand-in adds to each request')
+    parser.add_argument('--fuseki', metavar='HOST:PORT', help='use a running Fuseki server instead of the stand-in')
+    parser.add_argument('--no-cache', action='store_true', help='disable the caches of the lookup results')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    standin = None
+    if args.fuseki:
+        host, port = args.fuseki.rsplit(':', 1)
+    else:
+        from sparql_standin import SparqlStandin
+        standin = SparqlStandin(args.rdf_file, latency=args.latency)
+        standin.start()
+        host, port = 'localhost', str(standin.port)
+
+    # the settings are read when info_api is imported by the actions
+    os.environ['FUSEKI_NETWORK_HOST'] = host
+    os.environ['FUSEKI_NETWORK_PORT'] = port
+    os.environ['KB_BACKEND'] = 'fuseki'
+    os.environ['ACTION_SERVER_WARMUP'] = 'false'
+    os.environ['STATUS_SERVER'] = 'false'
+    if args.no_cache:
+        for setting in ('KB_LIST_CACHE_TTL', 'KB_RESULT_CACHE_TTL', 'KB_NEGATIVE_CACHE_TTL'):
+            os.environ[setting] = '0'
+    # the MOTD file and the domain are read relative to the project root
+    os.chdir(ROOT)
+
+    import yaml
+    from rasa_sdk import Action
+    from actions import actions
+    import info_api
+
+    actions_by_name = {}
+    for action_class in vars(actions).values():
+        if inspect.isclass(action_class) and issubclass(action_class, Action) and \
+                action_class.__module__ == actions.__name__:
+            action = action_class()
+            actions_by_name[action.name()] = action
+    with open('domain.yml') as domain_file:
+        domain = yaml.safe_load(domain_file)
+
+    trackers = load_trackers(args.tracker or [DEFAULT_TRACKER])
+    warmup = len(trackers) * len(SCENARIOS) if args.warmup is None else args.warmup
+    try:
+        asyncio.run(run_jobs(actions_by_name, domain, create_jobs(trackers, SCENARIOS, warmup), args.concurrency))
+        round_trips = info_api.get_client().round_trips
+        latencies, errors, duration = asyncio.run(run_jobs(actions_by_name, domain,
+                                                           create_jobs(trackers, SCENARIOS, args.requests),
+                                                           args.concurrency))
+        round_trips = info_api.get_client().round_trips - round_trips
+    finally:
+        if standin is not None:
+            standin.stop()
+
+    report = create_report(latencies, errors, duration)
+    if args.json:
+        print(json.dumps({'concurrency': args.concurrency, 'duration_s': duration, 'fuseki_round_trips': round_trips,
+                          'actions': report}, indent=2))
+    else:
+        print(f"{args.requests} action runs with concurrency {args.concurrency} in {duration:.2f}s, "
+              f"{round_trips} Fuseki round-trips")
+        print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
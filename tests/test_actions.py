@@ -1,4 +1,5 @@
 """Unit tests for custom actions."""
+import time
 import pytest
 from freezegun import freeze_time
 from typing import Text, Any
@@ -23,7 +24,8 @@ import info_api
          [SlotSet("contact", "Guðbjörg Helgadóttir"), SlotSet("title", None)])
     ]
 )
-def test_get_who_is(
+@pytest.mark.asyncio
+async def test_get_who_is(
     tracker: Tracker,
     dispatcher: CollectingDispatcher,
     domain: DomainDict,
@@ -32,7 +34,7 @@ def test_get_who_is(
 ):
     tracker.slots["title"] = title
     action = actions.ActionGetWhoIs()
-    actual_events = action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
+    actual_events = await action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
 
     assert actual_events == expected_events
 
@@ -46,7 +48,8 @@ def test_get_who_is(
          [SlotSet("contact", "María Jóhannsdóttir"), SlotSet("title", None)])
     ]
 )
-def test_get_who_is_from_subject(
+@pytest.mark.asyncio
+async def test_get_who_is_from_subject(
     tracker: Tracker,
     dispatcher: CollectingDispatcher,
     domain: DomainDict,
@@ -55,7 +58,7 @@ def test_get_who_is_from_subject(
 ):
     tracker.slots["subject"] = subject
     action = actions.ActionGetWhoIs()
-    actual_events = action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
+    actual_events = await action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
 
     assert actual_events == expected_events
 
@@ -70,7 +73,8 @@ def test_get_who_is_from_subject(
           SlotSet("subject", None), SlotSet("pronoun", None)])
     ]
 )
-def test_get_info_for_contact_from_subject(
+@pytest.mark.asyncio
+async def test_get_info_for_contact_from_subject(
     tracker: Tracker,
     dispatcher: CollectingDispatcher,
     domain: DomainDict,
@@ -79,7 +83,7 @@ def test_get_info_for_contact_from_subject(
 ):
     tracker.slots["subject"] = subject
     action = actions.ActionGetInfoForContact()
-    actual_events = action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
+    actual_events = await action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
 
     assert actual_events == expected_events
 
@@ -94,7 +98,8 @@ def test_get_info_for_contact_from_subject(
           SlotSet("subject", None), SlotSet("pronoun", None)])
     ]
 )
-def test_get_info_for_contact(
+@pytest.mark.asyncio
+async def test_get_info_for_contact(
     tracker: Tracker,
     dispatcher: CollectingDispatcher,
     domain: DomainDict,
@@ -103,18 +108,39 @@ def test_get_info_for_contact(
 ):
     tracker.slots["contact"] = contact
     action = actions.ActionGetInfoForContact()
-    actual_events = action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
+    actual_events = await action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
 
     assert actual_events == expected_events
 
 
-def test_get_operator(
+@pytest.mark.asyncio
+async def test_get_operator(
     tracker: Tracker,
     dispatcher: CollectingDispatcher,
     domain: DomainDict,
 ):
     action = actions.ActionGetOperator()
-    actual_events = action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
+    actual_events = await action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
+
+    assert actual_events == []
+    assert dispatcher.messages[0]['response'] == 'utter_operator'
+
+
+@pytest.mark.asyncio
+async def test_get_operator_fuseki_unavailable(
+    tracker: Tracker,
+    dispatcher: CollectingDispatcher,
+    domain: DomainDict,
+):
+    # With an open circuit breaker, the office contact is answered from the snapshot of the knowledge base
+    info_api.invalidate_caches()
+    breaker = info_api.get_client().breaker
+    breaker.opened_at = time.monotonic()
+    try:
+        action = actions.ActionGetOperator()
+        actual_events = await action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
+    finally:
+        breaker.record_success()
 
     assert actual_events == []
     assert dispatcher.messages[0]['response'] == 'utter_operator'
@@ -143,7 +169,8 @@ test_string_no_phone = """
 """
 
 
-def test_get_operator_no_info(
+@pytest.mark.asyncio
+async def test_get_operator_no_info(
     tracker: Tracker,
     dispatcher: CollectingDispatcher,
     domain: DomainDict,
@@ -152,7 +179,7 @@ def test_get_operator_no_info(
     # the information it should.
     info_api.update_db(data_string=test_string_no_info, data_type='RDF')
     action = actions.ActionGetOperator()
-    actual_events = action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
+    actual_events = await action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
 
     assert actual_events == []
     assert dispatcher.messages[0]['response'] == 'utter_operator_no_info'
@@ -164,14 +191,15 @@ def test_get_operator_no_info(
     info_api.update_db(data_string=data, data_type='RDF')
 
 
-def test_get_operator_no_phone(
+@pytest.mark.asyncio
+async def test_get_operator_no_phone(
     tracker: Tracker,
     dispatcher: CollectingDispatcher,
     domain: DomainDict,
 ):
     info_api.update_db(data_string=test_string_no_phone, data_type='RDF')
     action = actions.ActionGetOperator()
-    actual_events = action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
+    actual_events = await action.run(dispatcher=dispatcher, tracker=tracker, domain=domain)
 
     assert actual_events == []
     assert dispatcher.messages[0]['response'] == 'utter_operator_no_phone'